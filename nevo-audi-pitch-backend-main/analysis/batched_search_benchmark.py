@@ -0,0 +1,111 @@
+"""
+Benchmarks batched vector search: throughput of `VectorDB.search_many` with 1, 8 and 64 queries per batch against
+the same queries searched one at a time, and of the async `SearchBatcher` with that many concurrent sessions.
+
+The knowledge base is synthetic (random unit vectors, five vehicle models), so no API access is needed. Run from the
+backend root:
+
+    python analysis/batched_search_benchmark.py --size 5000
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+# the OpenAI client is created on import, but not used
+os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+
+import numpy as np
+
+from nevo_framework.retrieval.batched_search import SearchBatcher
+from vectordb.knowledge_base_model import ContentSnippet, KnowledgeBase
+from vectordb.vectordb_audi import EmbeddingComputer, VectorDB
+
+DIMENSIONS = 1536
+MODELS = ["Audi A1", "Audi A3", "Audi A6", "Audi Q3", "Audi Q6"]
+BATCH_SIZES = [1, 8, 64]
+NUM_RESULTS = 5
+
+
+def build_index(size: int, rng: np.random.Generator) -> VectorDB:
+    documents = KnowledgeBase(
+        content=[
+            ContentSnippet(
+                vehicle_model=MODELS[i % len(MODELS)],
+                category="overview",
+                question=f"question {i}",
+                timestamp=datetime.datetime(2025, 1, 1),
+                response=f"response {i}",
+            )
+            for i in range(size)
+        ]
+    )
+    embeddings = rng.standard_normal((size, DIMENSIONS)).astype(np.float32)
+    return VectorDB.from_embeddings(documents, embeddings, EmbeddingComputer())
+
+
+def queries_per_second(run, queries: np.ndarray, batch_size: int, car_model: str | None) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        run(queries[i : i + batch_size], car_model)
+    return len(queries) / (time.perf_counter() - start)
+
+
+async def batcher_queries_per_second(index: VectorDB, queries: np.ndarray, sessions: int) -> tuple[float, float]:
+    """`sessions` concurrent sessions, each searching its share of the queries one after the other."""
+    batcher = SearchBatcher(lambda: index, max_batch_size=64, max_batch_delay_seconds=0.002)
+
+    async def session(session_queries: np.ndarray):
+        for query in session_queries:
+            await batcher.search(query, num_results=NUM_RESULTS, car_model="Audi A6")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(queries[i::sessions]) for i in range(sessions)))
+    return len(queries) / (time.perf_counter() - start), batcher.mean_batch_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of batched vector search.")
+    parser.add_argument("--size", type=int, default=5000, help="Number of snippets.")
+    parser.add_argument("--queries", type=int, default=512)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    index = build_index(args.size, rng)
+    queries = rng.standard_normal((args.queries, DIMENSIONS)).astype(np.float32)
+
+    def one_at_a_time(batch, car_model):
+        for query in batch:
+            list(index.search_with_embedding(query, num_results=NUM_RESULTS, car_model=car_model))
+
+    def batched(batch, car_model):
+        index.search_many(batch, num_results=NUM_RESULTS, car_model=car_model)
+
+    same = all(
+        [doc.question for doc, _ in index.search_with_embedding(query, num_results=NUM_RESULTS)]
+        == [doc.question for doc, _ in results]
+        for query, results in zip(queries[:64], index.search_many(queries[:64], num_results=NUM_RESULTS))
+    )
+    print(f"{args.size} snippets, {DIMENSIONS} dimensions, {args.queries} queries, top {NUM_RESULTS}")
+    print(f"search_many returns the same results as one search per query: {same}")
+    print(f"{'batch':>5} {'filter':>8} {'one at a time q/s':>18} {'search_many q/s':>16} {'speedup':>8}")
+    for car_model in [None, "Audi A6"]:
+        for batch_size in BATCH_SIZES:
+            single = queries_per_second(one_at_a_time, queries, batch_size, car_model)
+            many = queries_per_second(batched, queries, batch_size, car_model)
+            print(f"{batch_size:>5} {car_model or 'none':>8} {single:>18.0f} {many:>16.0f} {many / single:>7.1f}x")
+
+    print(f"\n{'sessions':>8} {'SearchBatcher q/s':>18} {'mean batch':>11}")
+    for sessions in BATCH_SIZES:
+        throughput, mean_batch_size = asyncio.run(batcher_queries_per_second(index, queries, sessions))
+        print(f"{sessions:>8} {throughput:>18.0f} {mean_batch_size:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
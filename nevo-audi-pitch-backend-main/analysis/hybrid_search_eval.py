@@ -0,0 +1,181 @@
+"""
+Evaluates lexical (BM25), vector and hybrid retrieval, and the lexical fast path of
+`recommendation_and_details.retrieve`, on the knowledge base question set: each snippet's `question` is a query, answered if the snippet is among the top 5
+(with the car model filter of the snippet, as the CarDetailAgent searches). Reported are the answer hit rate and the
+search time per query in the process; lookups on the fast path additionally skip the query rewrite and the query
+embedding, two network round trips.
+
+The questions are verbatim copies of the snippets, which favours lexical search; `--drop` also evaluates them with a
+share of their words dropped at random, closer to a short spoken question. Conversational follow-ups ("yes", "is it
+safe", "what about the price") need the dialog to be understood and must not take the fast path: reported is the share
+of `FOLLOW_UPS` (searched with the filter of every car model) on which it would answer.
+
+The query embeddings are cached in `--query-cache` (shared with `prefix_search_benchmark.py`), so the embedding API is
+only called on the first run; `--offline` evaluates the lexical search only. The thresholds default to the
+MasterConfig. Run from the backend root:
+
+    python analysis/hybrid_search_eval.py --min-score 0.6 --min-margin 1.5 --min-terms 2
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+os.chdir(BACKEND_ROOT)
+if "--offline" in sys.argv:
+    # the OpenAI client is created on import, but not used
+    os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+
+import numpy as np
+
+from nevo_framework.config.master_config import get_master_config
+from llm.constants import AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH
+from llm.recommendation_and_details import lexical_fast_path
+from vectordb.vectordb_audi import VectorDB
+
+NUM_RESULTS = 5
+CANDIDATES = 20
+# user turns that only make sense in the dialog; the fast path must leave them to the query rewrite
+FOLLOW_UPS = [
+    "yes",
+    "no",
+    "okay",
+    "sounds good",
+    "tell me more",
+    "is it safe",
+    "is it fast",
+    "how much is it",
+    "what about the price",
+    "what about the trunk",
+    "and the interior?",
+    "how about the A6",
+    "does it have that too",
+    "which one is faster",
+    "can you show me that",
+    "what does it cost",
+    "is that standard",
+    "and the other one?",
+    "what else does it have",
+    "are they expensive",
+    "what's the price",
+    "I'd like a test drive",
+    "how safe is the car",
+    "is the car good for families",
+    "price?",
+    "safety",
+    "yes, show me the trunk",
+]
+
+
+def question_embeddings(index: VectorDB, questions: list[str], cache_path: Path) -> np.ndarray:
+    if cache_path.exists():
+        return np.load(cache_path)
+    embeddings = np.array(index.embedding_computer.get_embeddings(questions), dtype=np.float32)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(cache_path, embeddings)
+    return embeddings
+
+
+def drop_words(question: str, share: float, rng: np.random.Generator) -> str:
+    words = question.split()
+    kept = [word for word in words if rng.random() >= share]
+    return " ".join(kept or words[:1])
+
+
+def evaluate(name: str, search, expected: list, filters: list[dict]) -> list:
+    start = time.perf_counter()
+    results = [search(i, **query_filters) for i, query_filters in enumerate(filters)]
+    milliseconds = 1000 * (time.perf_counter() - start) / len(filters)
+    hits = np.mean([any(document is snippet for document, _ in result) for snippet, result in zip(expected, results)])
+    print(f"{name:>22} {hits:>9.3f} {milliseconds:>9.3f}")
+    return results
+
+
+def main():
+    config = get_master_config()
+    parser = argparse.ArgumentParser(description="Hit rate of lexical, vector and hybrid retrieval.")
+    parser.add_argument("--min-score", type=float, default=config.lexical_fast_path_min_score or 0.6)
+    parser.add_argument("--min-margin", type=float, default=config.lexical_fast_path_min_margin)
+    parser.add_argument("--min-terms", type=int, default=config.lexical_fast_path_min_terms)
+    parser.add_argument("--drop", type=float, default=0.5, help="Share of question words dropped in the second run.")
+    parser.add_argument("--offline", action="store_true", help="Evaluate the lexical search only.")
+    parser.add_argument("--query-cache", default="temp/question_embeddings", help="Directory for query embeddings.")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for path, filter_by_model in [(AUDI_MODEL_VECTOR_INDEX_PATH, True), (SAFETY_FEATURE_VECTOR_INDEX_PATH, False)]:
+        index = VectorDB.load_from_disk(path)
+        if not index.has_lexical_index:
+            index.build_lexical_index()
+        snippets = index.documents.content
+        filters = [{"car_model": snippet.vehicle_model} if filter_by_model else {} for snippet in snippets]
+        questions = [snippet.question for snippet in snippets]
+        thresholds = {"min_score": args.min_score, "min_margin": args.min_margin, "min_terms": args.min_terms}
+
+        model_filters = [{"car_model": model} for model in sorted({s.vehicle_model for s in snippets})]
+        fast_follow_ups = [
+            (follow_up, query_filters.get("car_model"), results[0][0].question)
+            for follow_up in FOLLOW_UPS
+            for query_filters in (model_filters if filter_by_model else [{}])
+            if (results := lexical_fast_path(index, follow_up, num_results=NUM_RESULTS, **thresholds, **query_filters))
+        ]
+        lookups = len(FOLLOW_UPS) * (len(model_filters) if filter_by_model else 1)
+        print(f"\n{os.path.basename(path)}: {len(fast_follow_ups)} of {lookups} follow-up lookups on the fast path")
+        for follow_up, car_model, question in fast_follow_ups:
+            print(f"    {follow_up!r} ({car_model}): {question!r}")
+        embeddings = None
+        if not args.offline:
+            embeddings = question_embeddings(index, questions, Path(args.query_cache) / f"{os.path.basename(path)}.npy")
+
+        for label, queries in [("verbatim", questions), (f"{args.drop:.0%} dropped", None)]:
+            if queries is None:
+                if not args.drop:
+                    continue
+                queries = [drop_words(question, args.drop, rng) for question in questions]
+            print(f"\n{os.path.basename(path)}: {len(snippets)} questions ({label}), top {NUM_RESULTS}")
+            print(f"{'retrieval':>22} {'hit rate':>9} {'ms/query':>9}")
+
+            def lexical(i, **query_filters):
+                return index.search_lexical(queries[i], num_results=NUM_RESULTS, **query_filters)
+
+            def fast_path(i, **query_filters):
+                return lexical_fast_path(index, queries[i], num_results=NUM_RESULTS, **thresholds, **query_filters)
+
+            lexical_results = evaluate("lexical", lexical, snippets, filters)
+            fast_results = [fast_path(i, **query_filters) for i, query_filters in enumerate(filters)]
+            confident = [results is not None for results in fast_results]
+            fast_hits = [
+                any(document is snippets[i] for document, _ in fast_results[i]) for i in np.flatnonzero(confident)
+            ]
+            print(
+                f"{'fast path':>22} {np.mean(fast_hits) if fast_hits else float('nan'):>9.3f} "
+                f"{'':>9}  {np.mean(confident):.0%} of the lookups skip rewrite and embedding"
+            )
+            if embeddings is None:
+                continue
+            # the dropped-words queries are searched with the embeddings of the full questions: the embedding API
+            # is only called once, and the rewrite step would restore much of the question anyway
+
+            def vector(i, **query_filters):
+                return index.search_many(embeddings[i : i + 1], num_results=NUM_RESULTS, **query_filters)[0]
+
+            def hybrid(i, **query_filters):
+                vector_results = index.search_many(embeddings[i : i + 1], num_results=CANDIDATES, **query_filters)[0]
+                lexical_results = index.search_lexical(queries[i], num_results=CANDIDATES, **query_filters)
+                return index.fuse([vector_results, lexical_results], num_results=NUM_RESULTS)
+
+            def pipeline(i, **query_filters):
+                return fast_path(i, **query_filters) or hybrid(i, **query_filters)
+
+            evaluate("vector", vector, snippets, filters)
+            evaluate("hybrid", hybrid, snippets, filters)
+            evaluate("fast path, else hybrid", pipeline, snippets, filters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares how soon the image of a safety feature appears with the in-process word overlap matcher of
+`ImageFromResponse` against one LLM call per sentence, and how often the matcher picks the right image.
+
+For each safety feature snippet, the candidates are the top 5 of a lexical search for its question (as the
+SafetyFeatureAgent retrieves them), and the spoken answer is a short opener ("Great question.") followed by the first
+sentences of the snippet response. The sentences are handled one after the other, as the `SentenceWatcher` awaits
+the callback. The LLM call is simulated with `--llm-latency-ms` and assumed to pick the right image; the matcher is
+run for real. The delay is counted from the start of the audio, when the first sentence is complete. The sentences
+are verbatim from the snippets, so the accuracy is an upper bound for paraphrased answers.
+
+No API access is needed. Run from the backend root:
+
+    python analysis/image_match_benchmark.py --llm-latency-ms 700
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+# the OpenAI client is created on import, but not used
+os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+os.chdir(BACKEND_ROOT)
+
+import numpy as np
+
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.retrieval.text_match import TextMatcher
+from llm.constants import SAFETY_FEATURE_VECTOR_INDEX_PATH
+from vectordb.vectordb_audi import VectorDB
+
+OPENER = "Great question."
+NUM_CANDIDATES = 5
+
+
+def spoken_sentences(response: str, count: int) -> list[str]:
+    # the responses start with the question as a heading
+    body = response.split("\n\n", 1)[-1]
+    return [OPENER] + re.split(r"(?<=[.!?])\s+", body.strip())[:count]
+
+
+def main():
+    config = get_master_config()
+    parser = argparse.ArgumentParser(description="Image delay and accuracy of the in-process image matcher.")
+    parser.add_argument("--llm-latency-ms", type=float, default=700, help="Simulated latency of one LLM call.")
+    parser.add_argument("--sentences", type=int, default=2, help="Sentences of the response spoken per answer.")
+    parser.add_argument("--min-score", type=float, nargs="+", default=[config.image_match_min_score])
+    parser.add_argument("--min-margin", type=float, nargs="+", default=[config.image_match_min_margin])
+    args = parser.parse_args()
+
+    index = VectorDB.load_from_disk(SAFETY_FEATURE_VECTOR_INDEX_PATH)
+    if not index.has_lexical_index:
+        index.build_lexical_index()
+    cases = []
+    for snippet in index.documents.content:
+        candidates = [document for document, _ in index.search_lexical(snippet.question, NUM_CANDIDATES)]
+        if snippet not in candidates:
+            candidates = [snippet] + candidates[: NUM_CANDIDATES - 1]
+        cases.append((candidates, candidates.index(snippet), spoken_sentences(snippet.response, args.sentences)))
+
+    # one LLM call per sentence until a sentence is about a feature, i.e. the first after the opener
+    llm_delays = [2 * args.llm_latency_ms for _ in cases]
+    print(
+        f"{len(cases)} answers, {NUM_CANDIDATES} candidates each, LLM call {args.llm_latency_ms:.0f} ms; "
+        f"LLM per sentence: image after {np.mean(llm_delays):.0f} ms, {len(cases) * 2} LLM calls"
+    )
+    print(
+        f"{'min score':>9} {'margin':>6} {'local':>6} {'LLM':>6} {'none':>6} {'correct':>8} "
+        f"{'delay ms':>9} {'p95 ms':>7} {'match ms':>9}"
+    )
+    for min_score in args.min_score:
+        for min_margin in args.min_margin:
+            delays, outcomes, correct, match_seconds = [], [], [], []
+            for candidates, target, sentences in cases:
+                matcher = TextMatcher([f"{document.question}\n{document.response}" for document in candidates])
+                delay, outcome = 0.0, "none"
+                for sentence in sentences:
+                    start = time.perf_counter()
+                    match = matcher.match(sentence)
+                    match_seconds.append(time.perf_counter() - start)
+                    delay += 1000 * match_seconds[-1]
+                    if match.is_clear(min_score, min_margin):
+                        outcome = "local"
+                        correct.append(match.index == target)
+                        break
+                    if match.index is not None:
+                        outcome = "LLM"
+                        delay += args.llm_latency_ms
+                        break
+                delays.append(delay)
+                outcomes.append(outcome)
+            shares = {outcome: outcomes.count(outcome) / len(outcomes) for outcome in ["local", "LLM", "none"]}
+            print(
+                f"{min_score:>9.2f} {min_margin:>6.1f} {shares['local']:>6.0%} {shares['LLM']:>6.0%} "
+                f"{shares['none']:>6.0%} {np.mean(correct) if correct else float('nan'):>8.1%} "
+                f"{np.mean(delays):>9.1f} {np.percentile(delays, 95):>7.1f} {1000 * max(match_seconds):>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
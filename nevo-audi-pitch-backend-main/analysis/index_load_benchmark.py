@@ -0,0 +1,121 @@
+"""
+Benchmarks loading a vector index from disk: the pickled `VectorDB` against the index directory with the memory-mapped
+matrix (`nevo_framework.retrieval.index_format`).
+
+Each load runs in a fresh process, as at server startup, and reports the load time, the time of the first query, and
+the anonymous memory of the process after the query. Anonymous memory is private to each worker process; the pages of
+a memory-mapped matrix are file-backed and shared by all workers through the page cache. The file is in the page cache
+in both cases (it was just written), so the timings are those of a warm start.
+
+The knowledge bases are synthetic (random unit vectors), so no API access is needed. Run from the backend root:
+
+    python analysis/index_load_benchmark.py --sizes 1000 10000 50000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+# the OpenAI client is created on import, but not used
+os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+
+import numpy as np
+
+from vectordb.knowledge_base_model import ContentSnippet, KnowledgeBase
+from vectordb.vectordb_audi import EmbeddingComputer, VectorDB
+
+DIMENSIONS = 1536
+MODELS = ["Audi A1", "Audi A3", "Audi A6", "Audi Q3", "Audi Q6"]
+
+
+def build_index(size: int) -> VectorDB:
+    rng = np.random.default_rng(0)
+    index = VectorDB.__new__(VectorDB)
+    index.embedding_computer = EmbeddingComputer()
+    documents = KnowledgeBase(
+        content=[
+            ContentSnippet(
+                vehicle_model=MODELS[i % len(MODELS)],
+                category="overview",
+                question=f"question {i}",
+                timestamp=datetime.datetime(2025, 1, 1),
+                response=f"response {i}",
+            )
+            for i in range(size)
+        ]
+    )
+    index._build_index(documents, rng.standard_normal((size, DIMENSIONS)).astype(np.float32))
+    return index
+
+
+def anonymous_mb() -> float:
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def worker(path: str):
+    """Loads the index and runs one query, printing the measurements as JSON."""
+    start = time.perf_counter()
+    index = VectorDB.load_from_disk(path)
+    loaded = time.perf_counter()
+    list(index.search_with_embedding(np.ones(DIMENSIONS, dtype=np.float32), num_results=5, car_model="Audi A6"))
+    queried = time.perf_counter()
+    result = {"load_ms": 1000 * (loaded - start), "query_ms": 1000 * (queried - loaded), "anon_mb": anonymous_mb()}
+    print(json.dumps(result))
+
+
+def measure(path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", path], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector index load time and memory, pickle vs memory-mapped.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker)
+        return
+
+    print(f"{DIMENSIONS} dimensions, each load in a fresh process")
+    print(f"{'snippets':>8} {'format':>9} {'disk MB':>8} {'load ms':>9} {'1st query ms':>13} {'anon MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            index = build_index(size)
+            pickle_path = os.path.join(directory, f"index_{size}.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(index, f)
+            index_path = os.path.join(directory, f"index_{size}")
+            index.store_to_disk(index_path)
+            del index
+
+            sizes = {
+                "pickle": os.path.getsize(pickle_path),
+                "mmap": sum(entry.stat().st_size for entry in os.scandir(index_path)),
+            }
+            for name, path in [("pickle", pickle_path), ("mmap", index_path)]:
+                result = measure(path)
+                print(
+                    f"{size:>8} {name:>9} {sizes[name] / 1024**2:>8.1f} {result['load_ms']:>9.1f} "
+                    f"{result['query_ms']:>13.2f} {result['anon_mb']:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
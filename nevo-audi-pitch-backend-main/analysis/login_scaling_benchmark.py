@@ -0,0 +1,74 @@
+"""
+Measures how login latency and process memory scale with the number of concurrent sessions.
+
+Each "login" creates a DialogManager (and with it the Audi agent orchestrator and all its agents), which is
+what the /login endpoint does. Since the RAG indexes are shared by all sessions, only the first login should
+pay for loading them and memory should grow only by the per-session agent state.
+
+Run from the backend root:
+
+    python analysis/login_scaling_benchmark.py
+"""
+
+import asyncio
+import gc
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from nevo_framework.llm.dialog_manager import DialogManager
+
+SESSION_COUNTS = [1, 10, 50, 100, 500]
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (Linux only)."""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+async def login(sessions: list[DialogManager]) -> float:
+    start = time.perf_counter()
+    sessions.append(DialogManager(output_queue=asyncio.Queue(), chat_modality="audio"))
+    return time.perf_counter() - start
+
+
+async def main():
+    sessions: list[DialogManager] = []
+    first_login = await login(sessions)
+    baseline_rss = rss_mb()
+    print(f"First login (includes loading shared indexes): {first_login * 1000:.1f} ms, RSS {baseline_rss:.1f} MB")
+
+    print(f"{'sessions':>8} {'median ms':>10} {'p95 ms':>8} {'max ms':>8} {'RSS MB':>8} {'MB/session':>11}")
+    for count in SESSION_COUNTS:
+        latencies = []
+        while len(sessions) < count:
+            latencies.append(await login(sessions))
+        gc.collect()
+        rss = rss_mb()
+        if latencies:
+            latencies.sort()
+            median = statistics.median(latencies) * 1000
+            p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+            maximum = latencies[-1] * 1000
+        else:
+            median = p95 = maximum = first_login * 1000
+        print(
+            f"{count:>8} {median:>10.2f} {p95:>8.2f} {maximum:>8.2f} {rss:>8.1f} "
+            f"{(rss - baseline_rss) / max(len(sessions) - 1, 1):>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Benchmarks the truncated-dimension coarse search (`VectorDB.quantize(dimensions=...)`): recall@5 against the exact
+search and latency per query, for several prefix sizes.
+
+The queries are the questions of the knowledge base snippets (`ContentSnippet.question`), embedded with the model of
+the index; the embeddings are cached in `--query-cache`, so the API is only called on the first run. With `--offline`
+the snippet embeddings are used as queries instead (leave-one-out), which needs no API access.
+
+Latency is measured on `--latency-size` rows, made by repeating the index rows with a little noise, because the
+Audi indexes are too small for the coarse stage to matter. Run from the backend root:
+
+    python analysis/prefix_search_benchmark.py --prefixes 64 128 256 512
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+os.chdir(BACKEND_ROOT)
+if "--offline" in sys.argv:
+    # the OpenAI client is created on import, but not used
+    os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+
+import numpy as np
+
+from llm.constants import AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH
+from vectordb.knowledge_base_model import KnowledgeBase
+from vectordb.vectordb_audi import VectorDB
+
+NUM_RESULTS = 5
+
+
+def question_embeddings(index: VectorDB, cache_path: Path) -> np.ndarray:
+    if cache_path.exists():
+        return np.load(cache_path)
+    questions = [document.question for document in index.documents.content]
+    embeddings = np.array(index.embedding_computer.get_embeddings(questions), dtype=np.float32)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(cache_path, embeddings)
+    return embeddings
+
+
+def top_rows(index: VectorDB, queries: np.ndarray, exclude_self: bool) -> list[list[int]]:
+    rows = {id(document): row for row, document in enumerate(index.documents.content)}
+    results = index.search_many(queries, num_results=NUM_RESULTS + int(exclude_self))
+    top = [[rows[id(document)] for document, _ in result] for result in results]
+    if exclude_self:
+        top = [[row for row in result if row != query_row][:NUM_RESULTS] for query_row, result in enumerate(top)]
+    return top
+
+
+def scaled_index(index: VectorDB, size: int, rng: np.random.Generator) -> VectorDB:
+    repeats = -(-size // len(index.embeddings))
+    embeddings = np.tile(index.embeddings, (repeats, 1))[:size]
+    embeddings = embeddings + 0.01 * rng.standard_normal(embeddings.shape).astype(np.float32)
+    documents = KnowledgeBase(content=(index.documents.content * repeats)[:size])
+    return VectorDB.from_embeddings(documents, embeddings, index.embedding_computer)
+
+
+def milliseconds_per_query(index: VectorDB, queries: np.ndarray) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        list(index.search_with_embedding(query, num_results=NUM_RESULTS))
+    return 1000 * (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@5 and latency of the truncated-dimension coarse search.")
+    parser.add_argument("--prefixes", type=int, nargs="+", default=[64, 128, 256, 512])
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--offline", action="store_true", help="Use the snippet embeddings as queries.")
+    parser.add_argument("--query-cache", default="temp/question_embeddings", help="Directory for query embeddings.")
+    parser.add_argument("--latency-size", type=int, default=20000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for path in [AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH]:
+        index = VectorDB.load_from_disk(path)
+        name = os.path.basename(path)
+        if args.offline:
+            queries, source = np.asarray(index.embeddings), "snippet embeddings, leave-one-out"
+        else:
+            queries = question_embeddings(index, Path(args.query_cache) / f"{name}.npy")
+            source = "snippet questions"
+        exact = top_rows(index, queries, args.offline)
+        large = scaled_index(index, args.latency_size, rng)
+        latency_queries = queries[:50]
+
+        print(f"\n{name}: {len(index.embeddings)} snippets, {len(queries)} queries ({source})")
+        print(f"latency on {args.latency_size} rows; exact: {milliseconds_per_query(large, latency_queries):.2f} ms")
+        print(f"{'prefix':>6} {'rerank':>6} {'recall@5':>9} {'ms/query':>9} {'coarse MB':>10}")
+        for dimensions in args.prefixes:
+            for rerank_factor in args.rerank_factors:
+                index.quantize(None, rerank_factor=rerank_factor, dimensions=dimensions)
+                found = top_rows(index, queries, args.offline)
+                recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact, found) if a])
+                large.quantize(None, rerank_factor=rerank_factor, dimensions=dimensions)
+                print(
+                    f"{dimensions:>6} {rerank_factor:>6} {recall:>9.3f} "
+                    f"{milliseconds_per_query(large, latency_queries):>9.2f} {large._quantized.nbytes / 1024**2:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
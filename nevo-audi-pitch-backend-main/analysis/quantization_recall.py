@@ -0,0 +1,112 @@
+"""
+Measures recall@k of the quantized vector search (float16, int8) against the exact search, and the memory of the
+quantized embeddings.
+
+The indexes are those built from the knowledge base JSON files (llm.constants). The queries are the snippet
+embeddings themselves (leave-one-out: the snippet itself is not counted), plus a synthetic index with clustered
+random vectors to show the effect at catalogue scale. Recall@k is the share of the exact top k which the quantized
+search returns in its top k. No API access is needed. Run from the backend root:
+
+    python analysis/quantization_recall.py --synthetic-size 50000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+# the OpenAI client is created on import, but not used
+os.environ.setdefault("OPENAI_API_KEY", "not-needed")
+os.chdir(BACKEND_ROOT)
+
+import numpy as np
+
+from llm.constants import AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH
+from vectordb.knowledge_base_model import ContentSnippet, KnowledgeBase
+from vectordb.vectordb_audi import EmbeddingComputer, VectorDB
+
+K_VALUES = [1, 5, 10]
+
+
+def synthetic_index(size: int, rng: np.random.Generator) -> VectorDB:
+    """Random vectors around 200 cluster centres, closer to real embeddings than uniform noise."""
+    centres = rng.standard_normal((200, 1536)).astype(np.float32)
+    embeddings = centres[rng.integers(0, len(centres), size)] + 0.7 * rng.standard_normal((size, 1536)).astype(
+        np.float32
+    )
+    documents = KnowledgeBase(
+        content=[
+            ContentSnippet(
+                vehicle_model="Audi A6",
+                category="overview",
+                question=f"question {i}",
+                timestamp=datetime.datetime(2025, 1, 1),
+                response=f"response {i}",
+            )
+            for i in range(size)
+        ]
+    )
+    return VectorDB.from_embeddings(documents, embeddings, EmbeddingComputer())
+
+
+def neighbours(index: VectorDB, query_rows: np.ndarray, k: int) -> list[list[int]]:
+    """The top k rows for each query row, without the row itself."""
+    rows = {id(document): row for row, document in enumerate(index.documents.content)}
+    results = index.search_many(np.asarray(index.embeddings[query_rows]), num_results=k + 1)
+    return [
+        [rows[id(document)] for document, _ in result if rows[id(document)] != query_row][:k]
+        for query_row, result in zip(query_rows, results)
+    ]
+
+
+def evaluate(name: str, index: VectorDB, query_rows: np.ndarray):
+    exact = {k: neighbours(index, query_rows, k) for k in K_VALUES}
+    start = time.perf_counter()
+    neighbours(index, query_rows, max(K_VALUES))
+    exact_ms = 1000 * (time.perf_counter() - start) / len(query_rows)
+    print(
+        f"\n{name}: {len(index.embeddings)} snippets, {len(query_rows)} queries, "
+        f"float32 {index.embeddings.nbytes / 1024**2:.1f} MB, {exact_ms:.2f} ms/query exact"
+    )
+    recall_columns = " ".join(f"{f'recall@{k}':>9}" for k in K_VALUES)
+    print(f"{'quantization':>12} {'rerank':>6} {'MB':>7} {recall_columns} {'ms/query':>9}")
+    for kind in ["float16", "int8"]:
+        for rerank_factor in [1, 4]:
+            index.quantize(kind, rerank_factor)
+            recalls = []
+            for k in K_VALUES:
+                found = neighbours(index, query_rows, k)
+                recalls.append(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact[k], found) if a]))
+            start = time.perf_counter()
+            neighbours(index, query_rows, max(K_VALUES))
+            milliseconds = 1000 * (time.perf_counter() - start) / len(query_rows)
+            print(
+                f"{kind:>12} {rerank_factor:>6} {index._quantized.nbytes / 1024**2:>7.2f} "
+                + " ".join(f"{recall:>9.3f}" for recall in recalls)
+                + f" {milliseconds:>9.2f}"
+            )
+    index.quantize(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and memory of quantized vector search.")
+    parser.add_argument("--synthetic-size", type=int, default=50000, help="Snippets of the synthetic index (0: skip).")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for the synthetic index.")
+    args = parser.parse_args()
+
+    for path in [AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH]:
+        index = VectorDB.load_from_disk(path)
+        evaluate(os.path.basename(path), index, np.arange(len(index.embeddings)))
+    if args.synthetic_size:
+        rng = np.random.default_rng(0)
+        index = synthetic_index(args.synthetic_size, rng)
+        evaluate("synthetic", index, rng.choice(args.synthetic_size, args.queries, replace=False))
+
+
+if __name__ == "__main__":
+    main()
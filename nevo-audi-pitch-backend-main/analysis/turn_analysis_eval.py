@@ -0,0 +1,78 @@
+"""
+Compares the two ways the AudiAgentOrchestrator analyzes a user turn (`turn_analysis_mode`): "fanout" (router, model
+selector and a speculative safety feature lookup concurrently, then the car detail lookup with its own query rewrite)
+and "fused" (one TurnAnalyzer request, then the lookup the route needs with the analyzer's query).
+
+For each labelled dialog of `--cases`, each mode runs on a fresh orchestrator. Reported are the accuracy of route
+and car model against the labels, and the p50/p95 latency from the user's message until the speaking agent could
+start: the turn analysis plus the RAG lookup of the route. The LLM and embedding requests go to the configured
+deployments, so an API key is needed; the requests are sent one turn at a time, so the latencies are not affected by
+the other mode. Run from the backend root:
+
+    python analysis/turn_analysis_eval.py --repeats 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+os.chdir(BACKEND_ROOT)
+
+import numpy as np
+
+from llm.audi_orchestrator import AudiAgentOrchestrator
+
+MODES = ["fanout", "fused"]
+
+
+async def analyze(mode: str, dialog: list[dict[str, str]]) -> tuple[str, str, float]:
+    orchestrator = AudiAgentOrchestrator(asyncio.Queue(), "audio")
+    orchestrator.config = orchestrator.config.model_copy(update={"turn_analysis_mode": mode})
+    start = time.perf_counter()
+    routing, model_choice, search_query = await orchestrator.analyze_turn(dialog)
+    if routing.conversation_topic == "car_model_details":
+        await orchestrator.car_detail_agent.rag_lookup(
+            dialog=dialog, car_model=model_choice.user_selected_model, rewritten_query=search_query
+        )
+    return routing.conversation_topic, model_choice.user_selected_model, time.perf_counter() - start
+
+
+async def evaluate(cases: list[dict], repeats: int):
+    print(f"{len(cases)} dialogs, {repeats} repeats")
+    print(f"{'mode':>7} {'route':>6} {'model':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    results = {mode: {"route": [], "model": [], "seconds": []} for mode in MODES}
+    for _ in range(repeats):
+        for case in cases:
+            # alternate the modes per dialog, so both see the same API conditions
+            for mode in MODES:
+                route, model, seconds = await analyze(mode, case["dialog"])
+                results[mode]["route"].append(route == case["route"])
+                results[mode]["model"].append(model == case["model"])
+                results[mode]["seconds"].append(seconds)
+    for mode in MODES:
+        milliseconds = 1000 * np.array(results[mode]["seconds"])
+        print(
+            f"{mode:>7} {np.mean(results[mode]['route']):>6.0%} {np.mean(results[mode]['model']):>6.0%} "
+            f"{np.percentile(milliseconds, 50):>7.0f} {np.percentile(milliseconds, 95):>7.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and latency of fan-out and fused turn analysis.")
+    parser.add_argument("--cases", default=str(BACKEND_ROOT / "analysis" / "data" / "turn_analysis_cases.json"))
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+    with open(args.cases, "r") as file:
+        cases = json.load(file)
+    asyncio.run(evaluate(cases, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
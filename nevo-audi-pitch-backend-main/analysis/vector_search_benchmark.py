@@ -0,0 +1,154 @@
+"""
+Benchmarks the RAG vector search against knowledge base size: query latency and memory of the index, comparing the
+previous `VectorDB` layout (embeddings as Python lists in the snippets, matrix rebuilt and fully sorted per query)
+with the contiguous float32 matrix and per-model row ranges.
+
+The knowledge bases are synthetic (random unit vectors, five vehicle models, three categories), so no API access is
+needed. Memory is the Python/numpy allocation of the index as reported by tracemalloc. The results of both layouts are
+compared, also with a category filter; filter values the index does not contain must give no results.
+
+Run from the backend root:
+
+    python analysis/vector_search_benchmark.py --sizes 100 1000 5000
+"""
+
+import argparse
+import datetime
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT / "src"))
+sys.path.insert(0, str(BACKEND_ROOT.parent / "nevo-backend-framework-main" / "src"))
+
+import numpy as np
+
+from vectordb.knowledge_base_model import ContentSnippet, KnowledgeBase
+from vectordb.vectordb_audi import VectorDB
+
+DIMENSIONS = 1536
+MODELS = ["Audi A1", "Audi A3", "Audi A6", "Audi Q3", "Audi Q6"]
+CATEGORIES = ["overview", "interior", "technology"]
+# filters with values the knowledge base does not contain
+UNKNOWN_FILTERS = [
+    {"category": "nonexistent"},
+    {"subcategory": "nonexistent"},
+    {"car_model": "Audi A6", "subcategory": "nonexistent"},
+    {"car_model": "Audi A6", "category": "nonexistent"},
+    {"car_model": "Audi", "category": "nonexistent"},
+    {"car_model": "Audi Z9", "category": "overview"},
+]
+QUERIES = 200
+NUM_RESULTS = 5
+
+
+def legacy_search(
+    documents: KnowledgeBase, query_embedding: list[float], car_model: str | None, category: str | None = None
+):
+    """The search as it was before."""
+    if car_model is None:
+        filtered_documents = [doc for doc in documents.content]
+    else:
+        filtered_documents = [doc for doc in documents.content if car_model in doc.vehicle_model]
+    if category is not None:
+        filtered_documents = [doc for doc in filtered_documents if doc.category == category]
+    embeddings = np.array([doc.embedding for doc in filtered_documents])
+    scores = np.dot(embeddings, np.array(query_embedding))
+    top_indices = np.argsort(scores)[::-1][:NUM_RESULTS]
+    return [(filtered_documents[i], scores[i]) for i in top_indices]
+
+
+def knowledge_base(size: int, embeddings: np.ndarray) -> KnowledgeBase:
+    return KnowledgeBase(
+        content=[
+            ContentSnippet(
+                vehicle_model=MODELS[i % len(MODELS)],
+                category=CATEGORIES[i % len(CATEGORIES)],
+                question=f"question {i}",
+                timestamp=datetime.datetime(2025, 1, 1),
+                response=f"response {i}",
+                embedding=embeddings[i].tolist(),
+            )
+            for i in range(size)
+        ]
+    )
+
+
+def allocated_mb(build):
+    """Builds an object and returns it with the memory allocated for it."""
+    tracemalloc.start()
+    built = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, current / 1024**2
+
+
+def median_ms(search, queries, car_model, category=None) -> float:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        list(search(query, car_model, category))
+        timings.append(time.perf_counter() - start)
+    return 1000 * statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector search latency and memory against knowledge base size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{DIMENSIONS} dimensions, median of {QUERIES} queries, top {NUM_RESULTS}")
+    print(
+        f"{'snippets':>8} {'layout':>7} {'index MB':>9} {'all models ms':>14} {'one model ms':>13} "
+        f"{'model+category ms':>18} {'same results':>13} {'unknown filters empty':>22}"
+    )
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, DIMENSIONS)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        queries = [rng.standard_normal(DIMENSIONS) for _ in range(QUERIES)]
+
+        legacy, legacy_mb = allocated_mb(lambda: knowledge_base(size, embeddings))
+
+        def build_index():
+            index = VectorDB.__new__(VectorDB)
+            index.embedding_computer = None
+            index._build_index(knowledge_base(size, embeddings), embeddings)
+            return index
+
+        index, index_mb = allocated_mb(build_index)
+
+        def legacy_query(query, car_model, category=None):
+            return legacy_search(legacy, query.tolist(), car_model, category)
+
+        def index_query(query, car_model, category=None):
+            return index.search_with_embedding(
+                query, num_results=NUM_RESULTS, car_model=car_model, category=category
+            )
+
+        same = all(
+            [doc.question for doc, _ in legacy_query(query, car_model, category)]
+            == [doc.question for doc, _ in index_query(query, car_model, category)]
+            for query in queries[:20]
+            for car_model in [None, "Audi A6"]
+            for category in [None, "interior"]
+        )
+        unknown_empty = all(
+            not list(index.search_with_embedding(queries[0], num_results=NUM_RESULTS, **filters))
+            for filters in UNKNOWN_FILTERS
+        )
+        for name, search, megabytes in [("before", legacy_query, legacy_mb), ("after", index_query, index_mb)]:
+            after = name == "after"
+            print(
+                f"{size:>8} {name:>7} {megabytes:>9.1f} {median_ms(search, queries, None):>14.3f} "
+                f"{median_ms(search, queries, 'Audi A6'):>13.3f} "
+                f"{median_ms(search, queries, 'Audi A6', 'interior'):>18.3f} "
+                f"{str(same) if after else '':>13} {str(unknown_empty) if after else '':>22}"
+            )
+
+
+if __name__ == "__main__":
+    main()
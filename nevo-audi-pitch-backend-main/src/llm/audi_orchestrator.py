@@ -7,7 +7,9 @@ from nevo_framework.config.master_config import load_json_config
 from nevo_framework.helpers.logging_helpers import LogAi
 from nevo_framework.llm.agent_orchestrator import AbstractAgentOrchestrator
 from nevo_framework.llm.agents import TimedWebElementMessage, VoiceAgentResponse
+from nevo_framework.llm.dialog_context import DialogContextWindow
 from nevo_framework.llm.llm_tools import maybe_get, trim_prompt
+from nevo_framework.llm.speculation import Speculation, SpeculativeExecutor
 
 import llm.data as data
 import llm.messages as server_messages
@@ -21,6 +23,11 @@ from llm.recommendation_and_details import ConversationRoutes, RecommendationsWi
 from salesforce_connector.salesforce_connector import SalesforceConnector
 
 
+# branches of the recommender / detail state whose preparatory work is started before the turn is routed, most
+# likely first
+SPECULATIVE_BRANCHES = ["car_model_details", "image_intent"]
+
+
 def _message_list_for_generic_image(model: str, time_delta: float = 2) -> list[TimedWebElementMessage]:
     """
     Returns a message with a generic image for the given car model.
@@ -42,16 +49,20 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
         self.user_profile: str = None
         self.customer_name: str = None
         self.first_time_showing_car: bool = True
+        self.config = load_json_config()
 
         # we start with the UserProfileVoiceAgent to get the user profile in a conversation
         self.speaking_agent = user_profile.UserProfileVoiceAgent()
-        # we create this here as it loads RAG data and we don't want to do this on every call
+        # the recent dialog, rendered once for all tracker agents of the session
+        self.dialog_context = DialogContextWindow(max_tokens=self.config.dialog_context_max_tokens)
+        # the RAG indexes of these agents are shared by all sessions, see recommendation.AUDI_MODEL_INDEX
         self.car_detail_agent = recommendation.CarDetailAgent()
-        self.safety_feature_agent = recommendation.SafetyFeatureAgent()
+        self.safety_feature_agent = recommendation.SafetyFeatureAgent(context=self.dialog_context)
 
         self.recommendations: RecommendationsWithImages = None
         self.model_selector = recommendation.UserModelChoiceSelector()
-        self.router = recommendation.ConversationRouter()
+        self.router = recommendation.ConversationRouter(context=self.dialog_context)
+        self.turn_analyzer = recommendation.TurnAnalyzer()
         self.car_walkaround_tracker = image_intent.CarModelWalkaroundTracker()
         
         # Initialize Salesforce connector only if credentials are available
@@ -69,7 +80,7 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
             logging.info("Salesforce credentials not found. Running without Salesforce integration.")
             self.salesforce_connector = None
 
-        self.test_drive_tracker = test_drive.TestDriveDetailsTracker()
+        self.test_drive_tracker = test_drive.TestDriveDetailsTracker(context=self.dialog_context)
         self.keyword_extractor = recommendation.KeywordExtractor()
         self.tour_keyword_extractor = recommendation.TourKeywordExtractor(
             keywords=[
@@ -84,8 +95,12 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
             ]
         )
 
-        self.config = load_json_config()
         self.selected_image = None
+        # car model of the previous turn, for the work started before the car model of this turn is known
+        self.last_model_choice: str | None = None
+        self.speculation = SpeculativeExecutor(
+            max_branches=self.config.speculative_branches, default_order=SPECULATIVE_BRANCHES
+        )
 
         self.debug_start_on_stage = None
         if self.config.has_debug_flag("recommendation"):
@@ -185,16 +200,26 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
             # nothing to comment on: send empty response
             return VoiceAgentResponse(agent_name="no agent")
 
-    async def chat_step__recommender_and_details_state(
-        self, dialog: list[dict[str, str]], web_element_message: dict[str, Any] | None
-    ) -> VoiceAgentResponse:
-        assert self.user_profile is not None, "Missing user profile!"
+    async def analyze_turn(
+        self, dialog: list[dict[str, str]]
+    ) -> tuple[ConversationRoutes, UserModelChoice, str | None]:
+        """
+        Returns the route, the car model the user is talking about and, with the fused analysis, the rewritten query
+        for the RAG lookups (see `turn_analysis_mode`). The safety features are looked up as well, so that the
+        SafetyFeatureAgent is ready if the route is "driver_assistance_features".
 
-        # handle the frontend message indicating that the user click the "next / previous" image button when looking at a car model
-        if walkaround_message := maybe_get(web_element_message, server_messages.CarWalkaroundResponse):
-            return await self.handle_walkaround_click(walkaround_message, dialog)
+        "fanout" asks the router and the model selector and looks up the safety features concurrently, for every
+        turn. "fused" asks the TurnAnalyzer once and looks up the safety features only if the route needs them; if
+        the analysis fails, the turn is analyzed with the fan-out.
+        """
+        if self.config.turn_analysis_mode == "fused":
+            analysis = await self.turn_analyzer.extract_output(dialog=dialog)
+            if analysis is not None:
+                if analysis.conversation_topic == "driver_assistance_features":
+                    await self.safety_feature_agent.rag_lookup(dialog=dialog, rewritten_query=analysis.search_query)
+                return analysis, analysis, analysis.search_query
+            logging.warning(LogAi("Turn analysis failed, falling back to separate routing and model selection."))
 
-        # If its not the first time, we perform dynamic routing to decide what to do next.
         async_routings = asyncio.gather(
             self.router.extract_output(dialog=dialog),
             self.model_selector.extract_output(dialog=dialog),
@@ -203,11 +228,54 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
 
         route_and_model: tuple[ConversationRoutes, UserModelChoice, None] = await async_routings
         routing, model_choice, _ = route_and_model
+        return routing, model_choice, None
+
+    async def chat_step__recommender_and_details_state(
+        self, dialog: list[dict[str, str]], web_element_message: dict[str, Any] | None
+    ) -> VoiceAgentResponse:
+        assert self.user_profile is not None, "Missing user profile!"
+
+        # handle the frontend message indicating that the user click the "next / previous" image button when looking at a car model
+        if walkaround_message := maybe_get(web_element_message, server_messages.CarWalkaroundResponse):
+            return await self.handle_walkaround_click(walkaround_message, dialog)
+
+        # The preparatory work of the likely branches starts while the turn is routed, for the previous car model.
+        guessed_model = self.last_model_choice
+        speculative_work = {
+            "image_intent": (
+                guessed_model,
+                lambda: image_intent.ImageLookupAgent().image_lookup(dialog=dialog, car_model=guessed_model),
+            ),
+        }
+        if self.config.turn_analysis_mode != "fused":
+            # the fused analysis rewrites the query itself; a speculative lookup would rewrite it a second time, and
+            # the lexical fast path alone takes no time worth speculating on
+            speculative_work["car_model_details"] = (
+                guessed_model,
+                lambda: self.car_detail_agent.rag_system_message(dialog=dialog, car_model=guessed_model),
+            )
+        speculation = self.speculation.start(speculative_work)
+        try:
+            return await self._recommender_and_details_branch(dialog, web_element_message, speculation)
+        finally:
+            speculation.cancel()
+            if self.speculation.max_branches:
+                self.speculation.log_metrics("recommender_and_details")
+
+    async def _recommender_and_details_branch(
+        self, dialog: list[dict[str, str]], web_element_message: dict[str, Any] | None, speculation: Speculation
+    ) -> VoiceAgentResponse:
+        # If its not the first time, we perform dynamic routing to decide what to do next.
+        routing, model_choice, search_query = await self.analyze_turn(dialog)
 
         assert routing is not None, "Missing routing!"
         logging.info(LogAi(f"Recommender / detail - route: {routing}, user speaking about model: {model_choice}"))
         self.send_status_message(f"Routing: {routing}, model: {model_choice}")
         # self.current_car_model = model_choice.user_selected_model
+        self.last_model_choice = model_choice.user_selected_model
+        if routing.conversation_topic not in SPECULATIVE_BRANCHES:
+            # no preparatory work in this branch; cancels the speculative work and records the route
+            await speculation.commit(routing.conversation_topic)
 
         if routing.conversation_topic == "car_model_comparison":
             # We are back to comparing car models, and we compute a new recommendation as the user
@@ -226,7 +294,13 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
 
             timed_messages = _message_list_for_generic_image(model_choice.user_selected_model)
 
-            await self.speaking_agent.rag_lookup(dialog=dialog, car_model=model_choice.user_selected_model)
+            self.speaking_agent.default_system_message = await speculation.commit(
+                "car_model_details",
+                key=model_choice.user_selected_model,
+                work=lambda: self.car_detail_agent.rag_system_message(
+                    dialog=dialog, car_model=model_choice.user_selected_model, rewritten_query=search_query
+                ),
+            )
             l2_response = await self.speaking_agent.dialog_step(
                 dialog=dialog, timed_web_element_messages=timed_messages
             )
@@ -266,12 +340,17 @@ class AudiAgentOrchestrator(AbstractAgentOrchestrator):
                 )
 
                 uses_web_interface = True
+                await speculation.commit("image_intent")
 
             else:
                 # Here we selected the image from a list using an LLM based on what the user has asked
-                self.selected_image = await image_intent.ImageLookupAgent().image_lookup(
-                    dialog=dialog,
-                    car_model=model_choice.user_selected_model,
+                self.selected_image = await speculation.commit(
+                    "image_intent",
+                    key=model_choice.user_selected_model,
+                    work=lambda: image_intent.ImageLookupAgent().image_lookup(
+                        dialog=dialog,
+                        car_model=model_choice.user_selected_model,
+                    ),
                 )
 
             self.speaking_agent = image_intent.ImageIntentAgent(
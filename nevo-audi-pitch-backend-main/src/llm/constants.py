@@ -1,6 +1,6 @@
 """Constants for the project."""
 
 AUDI_MODEL_DATA_FILE = "documents/audi_documents/knowledge_base_2025-02-24_11-28-19 LARGE_FIXED.json"
-AUDI_MODEL_VECTOR_INDEX_PATH = "documents/audi_documents/audi_model_vector_index.pkl"
+AUDI_MODEL_VECTOR_INDEX_PATH = "documents/audi_documents/audi_model_vector_index"
 SAFETY_FEATURES_DATA_FILE = "documents/audi_documents/knowledgebase_assistance.json"
-SAFETY_FEATURE_VECTOR_INDEX_PATH = "documents/audi_documents/safety_feature_vector_index.pkl"
+SAFETY_FEATURE_VECTOR_INDEX_PATH = "documents/audi_documents/safety_feature_vector_index"
@@ -8,6 +8,7 @@ import llm.messages as server_messages
 from nevo_framework.config.master_config import load_json_config
 from nevo_framework.helpers.logging_helpers import LogAi
 from nevo_framework.llm.agents import GeneralAgentAsync, StructuredOutputAgent, VoiceAgent
+from nevo_framework.llm.dialog_context import DialogContextView, DialogContextWindow
 from nevo_framework.llm.llm_tools import trim_prompt
 
 CONFIG = load_json_config()
@@ -213,7 +214,7 @@ class ImageViewingIntent(BaseModel):
 
 class ImageIntentTracker(StructuredOutputAgent):
 
-    def __init__(self):
+    def __init__(self, context: DialogContextWindow | None = None):
         sys_prompt = trim_prompt(
             """You are given lines of a dialogue between the user and the assistant.
             Your task is to determine if the customer has explicitly asked be be shown a view of the car of a part of a car.
@@ -230,16 +231,13 @@ class ImageIntentTracker(StructuredOutputAgent):
             openai_async_client=CONFIG.language_model_config.client["text"],
             system_prompt=sys_prompt,
         )
-        self.dialog = []
-
-    def _append_to_dialog(self, dialog: dict[str, dict[str, str]]):
-        assert len(dialog) >= 2
-        self.dialog.append(f"{dialog[-2]['role']}: {dialog[-2]['content']}")
-        self.dialog.append(f"{dialog[-1]['role']}: {dialog[-1]['content']}")
+        # the dialog from the first tracked turn on, bounded by the (session's) context window
+        self.context = DialogContextView(context or DialogContextWindow(CONFIG.dialog_context_max_tokens))
 
     def _get_dialog(self, dialog: dict[str, dict[str, str]]) -> str:
-        self._append_to_dialog(dialog)
-        return "\n".join(self.dialog)
+        assert len(dialog) >= 2
+        self.context.update(dialog)
+        return self.context.render()
 
     async def extract_output(self, dialog: dict[str, dict[str, str]]) -> ImageViewingIntent:
         dialog = self._get_dialog(dialog)
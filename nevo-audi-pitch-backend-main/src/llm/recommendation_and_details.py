@@ -11,18 +11,119 @@ import llm.messages as server_messages
 from nevo_framework.config.master_config import load_json_config
 from nevo_framework.helpers.logging_helpers import LogAi
 from nevo_framework.llm.agents import GeneralAgentAsync, StructuredOutputAgent, VoiceAgent
-from llm.constants import (
-    AUDI_MODEL_DATA_FILE,
-    AUDI_MODEL_VECTOR_INDEX_PATH,
-    SAFETY_FEATURE_VECTOR_INDEX_PATH,
-    SAFETY_FEATURES_DATA_FILE,
-)
+from nevo_framework.llm.dialog_context import DialogContextView, DialogContextWindow
+from llm.constants import AUDI_MODEL_VECTOR_INDEX_PATH, SAFETY_FEATURE_VECTOR_INDEX_PATH
 from nevo_framework.llm.llm_tools import TimedWebElementMessage, rewrite_query, trim_prompt
-from vectordb.vectordb_audi import EmbeddingComputer, VectorDB
+from nevo_framework.retrieval import bm25, index_registry
+from nevo_framework.retrieval.batched_search import SearchBatcher, get_search_batcher
+from nevo_framework.retrieval.embedding_service import get_embedding_service
+from nevo_framework.retrieval.text_match import TextMatcher
+from vectordb.knowledge_base_model import ContentSnippet
+from vectordb.vectordb_audi import VectorDB
 
 CONFIG = load_json_config()
 
 
+def _load_vector_index(index_path: str) -> VectorDB:
+    """Loads the vector index from disk. Indexes are built offline, never while serving a request."""
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"Vector index {index_path} is missing, build it with `python -m vectordb.build_index`")
+    vectordb = VectorDB.load_from_disk(index_path)
+    name = os.path.basename(os.path.normpath(index_path))
+    vectordb.quantize(
+        CONFIG.vector_index_quantization.get(name),
+        rerank_factor=CONFIG.vector_index_rerank_factor,
+        dimensions=CONFIG.vector_index_prefix_dimensions.get(name),
+    )
+    vectordb.nprobe = CONFIG.vector_index_nprobe.get(name, vectordb.nprobe)
+    return vectordb
+
+
+# The indexes are loaded once per process and shared by the agents of all sessions.
+AUDI_MODEL_INDEX = index_registry.get_shared_index(AUDI_MODEL_VECTOR_INDEX_PATH, loader=_load_vector_index)
+SAFETY_FEATURE_INDEX = index_registry.get_shared_index(SAFETY_FEATURE_VECTOR_INDEX_PATH, loader=_load_vector_index)
+# Searches of concurrent sessions are scored together, one matrix product per batch.
+AUDI_MODEL_SEARCH = get_search_batcher(AUDI_MODEL_INDEX)
+SAFETY_FEATURE_SEARCH = get_search_batcher(SAFETY_FEATURE_INDEX)
+# Query embeddings are computed asynchronously, cached and batched across sessions; same model as the indexes.
+QUERY_EMBEDDINGS = get_embedding_service("text-embedding-3-small")
+# candidates of the vector and of the lexical search fused by hybrid retrieval
+HYBRID_CANDIDATES = 20
+
+
+def _last_user_message(dialog: list[dict[str, str]]) -> str | None:
+    return next((message["content"] for message in reversed(dialog) if message.get("role") == "user"), None)
+
+
+# words by which a question refers back to the dialog ("is it safe", "what about the price", "is the car safe")
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|one|ones|same|other|else|the (car|model|vehicle))\b"
+    r"|^\W*(and|also|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(question: str, min_terms: int = CONFIG.lexical_fast_path_min_terms) -> bool:
+    """Whether the question needs the dialog to be understood: too few content words, or a reference back."""
+    return len(set(bm25.tokenize(question))) < min_terms or FOLLOW_UP_PATTERN.search(question) is not None
+
+
+def lexical_fast_path(
+    vectordb: VectorDB,
+    question: str,
+    num_results: int = 5,
+    min_score: float | None = CONFIG.lexical_fast_path_min_score,
+    min_margin: float = CONFIG.lexical_fast_path_min_margin,
+    min_terms: int = CONFIG.lexical_fast_path_min_terms,
+    **filters,
+) -> list[tuple[ContentSnippet, float]] | None:
+    """Returns the lexical results for the question if they clearly answer it, else None, see
+    `lexical_fast_path_min_score` in the MasterConfig. The thresholds default to the MasterConfig."""
+    if min_score is None or is_follow_up(question, min_terms):
+        return None
+    results = vectordb.search_lexical(question, num_results=num_results, **filters)
+    if not results or results[0][1] < min_score:
+        return None
+    # without a second result, the best one still has to reach min_score
+    second_score = results[1][1] if len(results) > 1 else 0.0
+    if results[0][1] < min_margin * second_score:
+        return None
+    if vectordb.lexical_matched_terms(question, [results[0][0]])[0] < min_terms:
+        return None
+    return results
+
+
+async def retrieve(
+    vectordb: VectorDB,
+    search: SearchBatcher,
+    dialog: list[dict[str, str]],
+    num_results: int = 5,
+    car_model: str | None = None,
+    rewritten_query: str | None = None,
+) -> list[tuple[ContentSnippet, float]]:
+    """Retrieves the snippets for the last user message of the dialog.
+
+    A self-contained keyword lookup the lexical index answers confidently is answered from it directly, skipping the
+    query rewrite and the query embedding (two network round trips), see `lexical_fast_path`. Otherwise the rewritten
+    query is searched by vector and, with `hybrid_search`, lexically in the same version of the index, and the
+    rankings are fused. The query is rewritten here unless `rewritten_query` is given, e.g. by the TurnAnalyzer.
+    """
+    filters = {"car_model": car_model} if car_model is not None else {}
+    question = _last_user_message(dialog)
+    if question and (results := lexical_fast_path(vectordb, question, num_results=num_results, **filters)):
+        logging.debug(f"Lexical fast path for {question!r}")
+        return results
+
+    rewritten_query = rewritten_query or await rewrite_query(dialog)
+    query_embedding = await QUERY_EMBEDDINGS.embed(rewritten_query)
+    if not CONFIG.hybrid_search or not vectordb.has_lexical_index:
+        return await search.search(query_embedding, num_results=num_results, **filters)
+    # both searches on `vectordb`: the shared index may be reloaded meanwhile, and fusion is by row id
+    vector_results = await search.search(query_embedding, num_results=HYBRID_CANDIDATES, index=vectordb, **filters)
+    lexical_results = vectordb.search_lexical(rewritten_query, num_results=HYBRID_CANDIDATES, **filters)
+    return vectordb.fuse([vector_results, lexical_results], num_results=num_results)
+
+
 class RecommendationsWithImages(BaseModel):
 
     recommended_cars: list[Literal["Audi A3", "Audi A6", "Audi Q3", "Audi A1", "Audi Q6"]]
@@ -120,7 +221,7 @@ class ConversationRoutes(BaseModel):
 
 class ConversationRouter(StructuredOutputAgent):
 
-    def __init__(self):
+    def __init__(self, context: DialogContextWindow | None = None):
         system_prompt = trim_prompt(
             """You are given lines of a dialogue between a customer (USER) and a car dealer (ASSISTANT). 
             Your goal is to determine whether the user is interested in comparing two models of cars, whether they want
@@ -149,7 +250,8 @@ class ConversationRouter(StructuredOutputAgent):
             * The customer would like a tour of the car
             """
         )
-        self.dialog = []
+        # the dialog from the first routed turn on, bounded by the (session's) context window
+        self.context = DialogContextView(context or DialogContextWindow(CONFIG.dialog_context_max_tokens))
 
         super().__init__(
             model=CONFIG.language_model_config.model_deployment_name["mini"],
@@ -158,14 +260,9 @@ class ConversationRouter(StructuredOutputAgent):
             system_prompt=system_prompt,
         )
 
-    def _append_to_dialog(self, dialog: dict[str, dict[str, str]]):
-        if len(dialog) >= 2:
-            self.dialog.append(f"{dialog[-2]['role']}: {dialog[-2]['content']}")
-            self.dialog.append(f"{dialog[-1]['role']}: {dialog[-1]['content']}")
-
     def _get_dialog(self, dialog: dict[str, dict[str, str]]) -> str:
-        self._append_to_dialog(dialog)
-        return "\n".join(self.dialog)
+        self.context.update(dialog)
+        return self.context.render()
 
     async def extract_output(self, dialog: dict[str, dict[str, str]]):
         dialog = self._get_dialog(dialog)
@@ -173,6 +270,66 @@ class ConversationRouter(StructuredOutputAgent):
         return output
 
 
+class TurnAnalysis(UserModelChoice, ConversationRoutes):
+
+    search_query: str = Field(
+        description=(
+            "The customer's final message rewritten so it is maximally clear and specific for a knowledge base search: "
+            "references like 'it' or 'the other one' are resolved with the dialog, the intent is preserved. "
+            "If the final message is already clear and specific, it is returned unchanged."
+        )
+    )
+
+
+class TurnAnalyzer(StructuredOutputAgent):
+    """Routes a turn, selects the car model and rewrites the query for the RAG lookups in one request, instead of
+    the ConversationRouter, the UserModelChoiceSelector and one `rewrite_query` per lookup (see `turn_analysis_mode`).
+    """
+
+    def __init__(self, steps_back: int = 20):
+        system_prompt = trim_prompt(
+            """You are a helpful assistant, tasked with analyzing a dialog between a car salesman and a customer
+            and extrating information from it. For the current situation of the conversation you determine:
+
+            * the intent of the customer (conversation_topic),
+
+            * the model of Audi the customer is currently interested in, talking or asking about; if several models
+              are discussed, the model the customer and the salesman have been discussing about most recently,
+
+            * the customer's final message rewritten as a query for a knowledge base search, using only information
+              present in the dialog to resolve references or ambiguities.
+            """
+        )
+        self.steps_back = steps_back
+        # like the UserModelChoiceSelector, on the standard model: gpt-4o-mini does not get references to models
+        super().__init__(
+            model=CONFIG.language_model_config.model_deployment_name["standard"],
+            response_format=TurnAnalysis,
+            openai_async_client=CONFIG.language_model_config.client["text"],
+            system_prompt=system_prompt,
+        )
+
+    def _get_dialog(self, dialog: list[dict[str, str]]) -> str:
+        start = max(0, len(dialog) - self.steps_back)
+        role_map = {"assistant": "Salesman", "user": "Customer"}
+        return "\n".join(
+            [f"{role_map[dialog[i]['role']]}: {dialog[i]['content'].strip()}" for i in range(start, len(dialog))]
+        )
+
+    async def extract_output(self, dialog: list[dict[str, str]]) -> TurnAnalysis | None:
+        dialog_context = self._get_dialog(dialog)
+        prompt = trim_prompt(
+            f"""Below you are given part of a dialog between a car salesman and a customer.
+            Analyze the customer's final message in the context of the dialog.
+
+            DIALOG:
+
+            {dialog_context}
+            """
+        )
+        return await self.extract_with_structured_output(prompt)
+
+
 class CarRecommendationAgent(VoiceAgent):
     def __init__(self, user_profile: str):
 
@@ -222,13 +379,6 @@ class CarRecommendationAgent(VoiceAgent):
 class CarDetailAgent(VoiceAgent):
 
     def __init__(self):
-        if os.path.exists(AUDI_MODEL_VECTOR_INDEX_PATH):
-            self.vectordb = VectorDB.load_from_disk(AUDI_MODEL_VECTOR_INDEX_PATH)
-        else:
-            embedding_computer = EmbeddingComputer(model="text-embedding-3-small")
-            self.vectordb = VectorDB(AUDI_MODEL_DATA_FILE, embedding_computer=embedding_computer)
-            self.vectordb.store_to_disk(AUDI_MODEL_VECTOR_INDEX_PATH)
-
         super().__init__(
             name="CarDetailAgent",
             default_system_message=None,
@@ -236,9 +386,23 @@ class CarDetailAgent(VoiceAgent):
             model=CONFIG.language_model_config.model_deployment_name["audio"],
         )
 
-    async def rag_lookup(self, dialog: list[dict[str, str]], car_model: str = "Audi A6"):
-        rewritten_query = await rewrite_query(dialog)
-        results = self.vectordb.search_with_query(rewritten_query, car_model=car_model)
+    @property
+    def vectordb(self) -> VectorDB:
+        return AUDI_MODEL_INDEX.get()
+
+    async def rag_lookup(
+        self, dialog: list[dict[str, str]], car_model: str = "Audi A6", rewritten_query: str | None = None
+    ):
+        self.default_system_message = await self.rag_system_message(dialog, car_model, rewritten_query)
+
+    async def rag_system_message(
+        self, dialog: list[dict[str, str]], car_model: str = "Audi A6", rewritten_query: str | None = None
+    ) -> str:
+        """Returns the system message with the snippets retrieved for the dialog, without changing the agent, so
+        that it can be prepared speculatively."""
+        results = await retrieve(
+            self.vectordb, AUDI_MODEL_SEARCH, dialog, num_results=5, car_model=car_model, rewritten_query=rewritten_query
+        )
         rag_information = ""
         for doc, _ in results:
             rag_information += doc.response + "\n\n"
@@ -265,23 +429,19 @@ class CarDetailAgent(VoiceAgent):
             """
         )
 
-        self.default_system_message = SYS_PROMPT
+        return SYS_PROMPT
 
 
 class SafetyFeatureAgent(VoiceAgent):
 
-    def __init__(self):
-        self.dialog = []
+    def __init__(self, context: DialogContextWindow | None = None):
+        # the last 6 messages
+        self.context = DialogContextView(
+            context or DialogContextWindow(CONFIG.dialog_context_max_tokens), max_messages=6
+        )
         self.selected_rag_docs = []
         self.rag_information = ""
 
-        if os.path.exists(SAFETY_FEATURE_VECTOR_INDEX_PATH):
-            self.vectordb = VectorDB.load_from_disk(SAFETY_FEATURE_VECTOR_INDEX_PATH)
-        else:
-            embedding_computer = EmbeddingComputer(model="text-embedding-3-small")
-            self.vectordb = VectorDB(SAFETY_FEATURES_DATA_FILE, embedding_computer=embedding_computer)
-            self.vectordb.store_to_disk(SAFETY_FEATURE_VECTOR_INDEX_PATH)
-
         super().__init__(
             name="SafetyFeatureAgent",
             default_system_message=None,
@@ -289,13 +449,18 @@ class SafetyFeatureAgent(VoiceAgent):
             model=CONFIG.language_model_config.model_deployment_name["audio"],
         )
 
-    async def rag_lookup(self, dialog: list[dict[str, str]]):
+    @property
+    def vectordb(self) -> VectorDB:
+        return SAFETY_FEATURE_INDEX.get()
+
+    async def rag_lookup(self, dialog: list[dict[str, str]], rewritten_query: str | None = None):
 
         rag_information = ""
         retrieved_documents = []
 
-        rewritten_query = await rewrite_query(dialog)
-        results = self.vectordb.search_with_query(rewritten_query)
+        results = await retrieve(
+            self.vectordb, SAFETY_FEATURE_SEARCH, dialog, num_results=5, rewritten_query=rewritten_query
+        )
 
         for i, (doc, _) in enumerate(results):
             rag_information += f"{i} - " + doc.response + "\n\n"
@@ -331,25 +496,48 @@ class SafetyFeatureAgent(VoiceAgent):
 
         self.default_system_message = SYS_PROMPT
 
-    def _append_to_dialog(self, dialog: dict[str, dict[str, str]]):
-        if len(dialog) >= 2:
-            self.dialog.append(f"{dialog[-2]['role']}: {dialog[-2]['content']}")
-            self.dialog.append(f"{dialog[-1]['role']}: {dialog[-1]['content']}")
-        # Limit the length of the dialog to the last 6 messages
-        if len(self.dialog) > 6:
-            self.dialog = self.dialog[-6:]
-
     def _get_dialog(self, dialog: dict[str, dict[str, str]]) -> str:
-        self._append_to_dialog(dialog)
-        return "\n".join(self.dialog)
+        self.context.update(dialog)
+        return self.context.render()
 
 
 class ImageFromResponse:
+    """Shows the image of the safety feature the agent talks about, as soon as a spoken sentence identifies it.
+
+    Each sentence is matched against the retrieved snippets by word overlap in the process (`TextMatcher`); only if
+    the best snippet does not clearly stand out (`image_match_min_score`, `image_match_min_margin`) the LLM is asked.
+    """
+
     def __init__(self, rag_information: str, selected_rag_docs: list):
         self.rag_information = rag_information
         self.selected_rag_docs = selected_rag_docs
+        self.matcher = TextMatcher([f"{doc.question}\n{doc.response}" for doc in selected_rag_docs])
 
     async def sentence_callback(self, sentence: str, sentences: list[str], output_queue: asyncio.Queue) -> bool:
+        match = self.matcher.match(sentence)
+        if match.is_clear(CONFIG.image_match_min_score, CONFIG.image_match_min_margin):
+            index = match.index
+            logging.info(LogAi(f"IDX: {index} (word overlap {match.score:.2f}, margin {match.margin:.1f})"))
+        elif match.index is not None and CONFIG.image_match_llm_fallback:
+            # the sentence is about one of the features, but which one is ambiguous
+            index = await self._select_with_llm(sentence)
+            if index is None:
+                return False
+        else:
+            return True
+
+        if 0 <= index < len(self.selected_rag_docs):
+            logging.info(LogAi(f"IDX: {index}; SELECTED IMAGE: {self.selected_rag_docs[index].images[0]}"))
+            await output_queue.put(
+                server_messages.ShowImage(image="audi/safety_features/" + self.selected_rag_docs[index].images[0])
+            )
+            return False
+        else:
+            logging.info(LogAi(f"IDX: {index}; Returning none"))
+            return True
+
+    async def _select_with_llm(self, sentence: str) -> int | None:
+        """Asks the LLM which snippet the sentence is about; -1 for none, None if the answer is not an index."""
         system_prompt = trim_prompt(
             """Based on the list of descriptions below, indicated by DESCRIPTIONS and the response of the Assistant indicated by 
             ASSISTANT, you must select the index of the safety feature that best matches the ASSISTANT response. You must return the
@@ -376,18 +564,8 @@ class ImageFromResponse:
         response = await image_selection_agent(user_prompt=user_prompt)
 
         if isinstance(response, str) and response.lstrip("-").isdigit():
-            response = int(response)
-            if response >= 0:
-                logging.info(LogAi(f"IDX: {response}; SELECTED IMAGE: {self.selected_rag_docs[response].images[0]}"))
-                output_queue.put_nowait(
-                    server_messages.ShowImage(
-                        image="audi/safety_features/" + self.selected_rag_docs[response].images[0]
-                    )
-                )
-                return False
-            else:
-                logging.info(LogAi(f"IDX: {response}; Returning none"))
-                return True
+            return int(response)
+        return None
 
     async def extract_data(self, bot_response: str) -> server_messages.ShowImage:
         raise DeprecationWarning()
@@ -456,7 +634,7 @@ class KeywordExtractor:
         Calls self.maybe_create_image_message, but this method is for use with the stream watching system.
         """
         if image_message := self.maybe_create_image_message(sentence):
-            output_queue.put_nowait(image_message)
+            await output_queue.put(image_message)
             return False
         else:
             return True
@@ -526,7 +704,7 @@ class TourKeywordExtractor:
         """
         if image_messages := self.maybe_create_image_message(bot_response=sentence, bot_responses=sentences):
             for message in image_messages:
-                output_queue.put_nowait(message)
+                await output_queue.put(message)
 
         return True
 
@@ -5,6 +5,7 @@ import datetime
 from pydantic import BaseModel, Field
 
 from nevo_framework.llm.agents import VoiceAgent, StructuredOutputAgent
+from nevo_framework.llm.dialog_context import DialogContextView, DialogContextWindow
 from llm import data
 from nevo_framework.llm.llm_tools import trim_prompt
 from nevo_framework.config.master_config import load_json_config
@@ -45,7 +46,7 @@ class TestDriveDetails(BaseModel):
 
 class TestDriveDetailsTracker(StructuredOutputAgent):
 
-    def __init__(self):
+    def __init__(self, context: DialogContextWindow | None = None):
         system_prompt = trim_prompt(
             """You are given lines of a dialogue between a customer (user) and a car dealer (assistant). 
             The dealer has collected information to schedule a test drive with the customer. Your task is to track the information collected.
@@ -57,7 +58,8 @@ class TestDriveDetailsTracker(StructuredOutputAgent):
             openai_async_client=CONFIG.language_model_config.client["text"],
             system_prompt=system_prompt,
         )
-        self.dialog = []
+        # the dialog from the first turn of the test drive scheduling on, bounded by the (session's) context window
+        self.context = DialogContextView(context or DialogContextWindow(CONFIG.dialog_context_max_tokens))
         self.last_test_drive_details: TestDriveDetails = TestDriveDetails(
             preferred_date=None, preferred_time=None, zip_code=None
         )
@@ -66,14 +68,13 @@ class TestDriveDetailsTracker(StructuredOutputAgent):
         if len(dialog) >= 2:
             assert dialog[-2]["role"] == "assistant"
             assert dialog[-1]["role"] == "user"
-            self.dialog.append(f"{dialog[-2]['role']}: {dialog[-2]['content']}")
-            self.dialog.append(f"{dialog[-1]['role']}: {dialog[-1]['content']}")
+            self.context.update(dialog)
 
     def get_dialog(self) -> str:
-        return "\n".join(self.dialog)
+        return self.context.render()
 
     async def extract_test_drive_details(self):
-        if self.dialog:
+        if self.context.started:
             # only extract if we have collected some dialog
             dialog_str = self.get_dialog()
             logging.info(LogAi(f"Extracting test drive details from dialog: {dialog_str}"))
@@ -0,0 +1,127 @@
+"""
+Builds the vector indexes of the knowledge bases offline. The server only loads them.
+
+Run from the backend root after changing a knowledge base file:
+
+    PYTHONPATH=src python -m vectordb.build_index                     # all indexes in llm.constants
+    PYTHONPATH=src python -m vectordb.build_index --data-file kb.json --index documents/kb_index
+
+Only snippets whose response changed since the previous index are embedded. The embedding requests are batched and
+run concurrently; embedded batches are checkpointed next to the index (`<index>.checkpoint.sqlite`), so an interrupted
+build continues where it stopped when run again. The new index replaces the previous one atomically, a running server
+picks it up through the index registry.
+
+Each index also gets a lexical (BM25) index of the snippets (see `nevo_framework.retrieval.bm25`). For large
+catalogues, `--ivf` also builds an approximate nearest-neighbour index (see `nevo_framework.retrieval.ivf`).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+import numpy as np
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.retrieval import index_builder, index_format
+
+from llm.constants import (
+    AUDI_MODEL_DATA_FILE,
+    AUDI_MODEL_VECTOR_INDEX_PATH,
+    SAFETY_FEATURE_VECTOR_INDEX_PATH,
+    SAFETY_FEATURES_DATA_FILE,
+)
+from vectordb.knowledge_base_model import KnowledgeBase
+from vectordb.vectordb_audi import EmbeddingComputer, VectorDB
+
+INDEXES = [
+    (AUDI_MODEL_DATA_FILE, AUDI_MODEL_VECTOR_INDEX_PATH),
+    (SAFETY_FEATURES_DATA_FILE, SAFETY_FEATURE_VECTOR_INDEX_PATH),
+]
+
+
+def previous_embeddings(index_path: str, model: str) -> dict[str, np.ndarray]:
+    """Returns the embeddings of the current index by hash of the snippet response, if it was built with `model`."""
+    if not os.path.exists(index_path):
+        return {}
+    if index_format.read_header(index_path).embedding_model != model:
+        print(f"{index_path} was built with another embedding model, embedding all snippets")
+        return {}
+    vectordb = VectorDB.load_from_disk(index_path)
+    return {
+        index_builder.text_hash(document.response): np.array(vectordb.embeddings[row])
+        for row, document in enumerate(vectordb.documents.content)
+    }
+
+
+async def build(
+    data_file: str,
+    index_path: str,
+    model: str,
+    rebuild: bool,
+    batch_size: int,
+    max_concurrency: int,
+    ivf_clusters: int | None = None,
+):
+    with open(data_file, "r") as file:
+        documents = KnowledgeBase(**json.load(file))
+    checkpoint_path = f"{index_path}.checkpoint.sqlite"
+    embeddings, stats = await index_builder.embed_incrementally(
+        [document.response for document in documents.content],
+        client=get_master_config().language_model_config.client["embedding"],
+        model=model,
+        previous=None if rebuild else previous_embeddings(index_path, model),
+        checkpoint_path=checkpoint_path,
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
+    )
+    vectordb = VectorDB.from_embeddings(documents, embeddings, EmbeddingComputer(model=model))
+    vectordb.build_lexical_index()
+    if ivf_clusters is not None:
+        vectordb.build_ivf(ivf_clusters or None)
+
+    if os.path.exists(index_path) and not stats.embedded and not stats.resumed:
+        header = index_format.read_header(index_path)
+        same_arrays = set(header.arrays) == set(vectordb.arrays())
+        if header.content_hash == index_format.content_hash(vectordb.records()) and same_arrays:
+            print(f"{index_path} is up to date ({stats})")
+            index_builder.remove_checkpoint(checkpoint_path)
+            return
+    vectordb.store_to_disk(index_path)
+    index_builder.remove_checkpoint(checkpoint_path)
+    print(f"{index_path} written ({stats})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-file", help="Knowledge base JSON file; default: all indexes in llm.constants.")
+    parser.add_argument("--index", help="Index directory to write (with --data-file).")
+    parser.add_argument("--model", default="text-embedding-3-small", help="Embedding model.")
+    parser.add_argument("--rebuild", action="store_true", help="Embed all snippets, not only the changed ones.")
+    parser.add_argument("--batch-size", type=int, default=index_builder.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Embedding requests in flight.")
+    parser.add_argument(
+        "--ivf",
+        type=int,
+        nargs="?",
+        const=0,
+        metavar="CLUSTERS",
+        help="Also build an IVF index with this many clusters (default about 4 * sqrt(snippets)).",
+    )
+    args = parser.parse_args()
+    if bool(args.data_file) != bool(args.index):
+        parser.error("--data-file and --index must be given together.")
+
+    indexes = [(args.data_file, args.index)] if args.data_file else INDEXES
+
+    async def build_all():
+        # one event loop for all builds, the clients share its HTTP connection pool
+        for data_file, index_path in indexes:
+            await build(
+                data_file, index_path, args.model, args.rebuild, args.batch_size, args.max_concurrency, args.ivf
+            )
+
+    asyncio.run(build_all())
+
+
+if __name__ == "__main__":
+    main()
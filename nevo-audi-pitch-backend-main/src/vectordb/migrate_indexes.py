@@ -0,0 +1,62 @@
+"""
+Converts pickled vector indexes (`VectorDB` or `VectorDB2` stored with pickle by earlier versions) to index
+directories (see `nevo_framework.retrieval.index_format`).
+
+Run from the backend root, e.g.
+
+    PYTHONPATH=src python -m vectordb.migrate_indexes documents/audi_documents/audi_model_vector_index.pkl
+
+Each `<name>.pkl` is written to the directory `<name>` next to it, or to `--output`. The pickle files are kept;
+delete them once the code points to the new directories.
+"""
+
+import argparse
+import os
+import pickle
+
+from nevo_framework.retrieval import index_format
+
+from vectordb.vectordb import VectorDB2
+from vectordb.vectordb_audi import VectorDB
+
+
+class _Unpickler(pickle.Unpickler):
+    """Resolves classes pickled under their old module paths, e.g. `src.vectordb.vectordb`."""
+
+    def find_class(self, module: str, name: str):
+        if module.startswith("src."):
+            module = module.removeprefix("src.")
+        return super().find_class(module, name)
+
+
+def migrate(pickle_path: str, index_path: str | None = None) -> str:
+    """
+    Converts one pickled index and returns the path of the index directory.
+    """
+    index_path = index_path or os.path.splitext(pickle_path)[0]
+    if os.path.exists(index_path) and not os.path.exists(os.path.join(index_path, index_format.HEADER_FILE)):
+        raise FileExistsError(f"{index_path} exists and is not an index directory, pass another path.")
+    with open(pickle_path, "rb") as f:
+        vectordb = _Unpickler(f).load()
+    if not isinstance(vectordb, (VectorDB, VectorDB2)):
+        raise TypeError(f"{pickle_path} contains a {type(vectordb).__name__}, not a vector index.")
+    vectordb.store_to_disk(index_path)
+    migrated = type(vectordb).load_from_disk(index_path)
+    count = len(migrated.documents.content) if isinstance(migrated, VectorDB) else len(migrated.documents)
+    print(f"{pickle_path} -> {index_path} ({type(vectordb).__name__}, {count} documents)")
+    return index_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pickle_paths", nargs="+", help="Pickled vector indexes (.pkl) to convert.")
+    parser.add_argument("--output", help="Index directory to write (only with a single pickle file).")
+    args = parser.parse_args()
+    if args.output and len(args.pickle_paths) > 1:
+        parser.error("--output can only be used with a single pickle file.")
+    for pickle_path in args.pickle_paths:
+        migrate(pickle_path, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,23 @@
 A simple numpy based vector store for small datasets, storing and searching embeddings.
 """
 from typing import Iterator
+import logging
 import numpy as np
 import openai
 import os
 import pickle
 
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.llm import http_pool
+from nevo_framework.retrieval import index_format
+
 # async_openai_client = openai.AsyncOpenAI(
 #     api_key=os.getenv("OPENAI_API_KEY"),
 # )
 
 openai_client = openai.OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=http_pool.shared_http_client(get_master_config().http_pool),
 )
 
 
@@ -100,6 +106,27 @@ class VectorDB2:
         result_docs = [self.documents[i] for i in indices]
         return zip(result_docs, scores)
 
+    def search_many(
+        self, query_embeddings: list[list[float]] | np.ndarray, num_results: int = 9, result_offset: int = 0
+    ) -> list[list[tuple[str, float]]]:
+        """Performs a vector search for a batch of query embeddings, scoring all of them with one matrix product.
+
+        Parameters
+            query_embeddings (list[list[float]]): Embeddings of the queries, one row per query.
+            num_results (int): The number of results to return per query.
+            result_offset (int): The number of results to skip, for pagination.
+
+        Returns
+            (list[list[tuple[str, float]]]): Documents and similarity scores per query.
+        """
+        scores = np.atleast_2d(np.asarray(query_embeddings)) @ self.embedding_matrix.T
+        top_indices = np.argsort(-scores, axis=1, kind="stable")[:, result_offset : result_offset + num_results]
+        top_scores = np.take_along_axis(scores, top_indices, axis=1)
+        return [
+            [(self.documents[i], score) for i, score in zip(query_indices, query_scores)]
+            for query_indices, query_scores in zip(top_indices.tolist(), top_scores)
+        ]
+
     def search_with_query(
         self, query: str, num_results: int = 9, result_offset: int = 0
     ) -> Iterator[tuple[str, float]]:
@@ -117,26 +144,40 @@ class VectorDB2:
         return self.search_with_embedding(query_embedding, num_results=num_results, result_offset=result_offset)
 
     def store_to_disk(self, path: str) -> None:
-        """Store the VectorDB to disk using pickle.
+        """Store the VectorDB to disk as an index directory (see `nevo_framework.retrieval.index_format`).
 
         Parameters
-            path (str): Path to store the VectorDB.
+            path (str): Directory to store the VectorDB in.
         """
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        index_format.write_index(
+            path, self.embedding_matrix, list(self.documents), self.embedding_computer.model, normalized=False
+        )
 
     @staticmethod
     def load_from_disk(path: str) -> "VectorDB2":
-        """Load the VectorDB from disk.
+        """Load the VectorDB from disk. The embedding matrix is memory-mapped, not read.
+
+        Indexes pickled by earlier versions (`.pkl` files) are still loaded, convert them with
+        `python -m vectordb.migrate_indexes`.
 
         Parameters
-            path (str): Path to load the VectorDB.
+            path (str): Index directory (or pickle file) to load the VectorDB from.
 
         Returns
             (VectorDB2): The loaded VectorDB.
         """
-        with open(path, "rb") as f:
-            return pickle.load(f)
+        if path.endswith(".pkl"):
+            logging.warning(
+                f"Loading pickled vector index {path}, convert it with `python -m vectordb.migrate_indexes`."
+            )
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        header, vectors, records = index_format.read_index(path)
+        vectordb = VectorDB2.__new__(VectorDB2)
+        vectordb.documents = records
+        vectordb.embedding_computer = EmbeddingComputer(model=header.embedding_model)
+        vectordb.embedding_matrix = vectors
+        return vectordb
 
 
 def main():
@@ -162,9 +203,9 @@ def main():
         print(f"Document: {doc}, Score: {score}")
 
     print("Storing and loading from disk...")
-    with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
-        vectordb.store_to_disk(f.name)
-        vectordb_loaded = VectorDB2.load_from_disk(f.name)
+    with tempfile.TemporaryDirectory() as directory:
+        vectordb.store_to_disk(os.path.join(directory, "index"))
+        vectordb_loaded = VectorDB2.load_from_disk(os.path.join(directory, "index"))
         results_loaded = vectordb_loaded.search_with_query(query)
         for doc, score in results_loaded:
             print(f"Document: {doc}, Score: {score}")
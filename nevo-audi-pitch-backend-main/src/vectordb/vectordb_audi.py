@@ -2,12 +2,17 @@
 A simple numpy based vector store for small datasets, storing and searching embeddings.
 """
 from typing import Iterator
+import logging
 import numpy as np
 import openai
 import os
 import pickle
 import json
 
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.llm import http_pool
+from nevo_framework.retrieval import bm25, index_format, ivf, quantization
+
 from vectordb.knowledge_base_model import KnowledgeBase, ContentSnippet
 
 # async_openai_client = openai.AsyncOpenAI(
@@ -24,6 +29,7 @@ Loading a file
 
 openai_client = openai.OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=http_pool.shared_http_client(get_master_config().http_pool),
 )
 
 
@@ -44,34 +50,93 @@ class EmbeddingComputer:
         return [embedding.embedding for embedding in response.data]
 
 
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns the rows scaled to unit length as a contiguous float32 matrix, so dot products are cosine similarities."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
 def _vector_search(
-    query_embedding: np.ndarray, embeddings_matrix: np.ndarray, num_results: int = 9, result_offset: int = 0
-) -> tuple[list[int], list[float]]:
-    """Perform a vector search with a query embedding and an embedding matrix.
+    query_embeddings: np.ndarray,
+    embeddings_matrix: np.ndarray,
+    num_results: int = 9,
+    result_offset: int = 0,
+    quantized: quantization.QuantizedMatrix | None = None,
+    rerank_factor: int = 4,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Perform a vector search for a batch of query embeddings with an embedding matrix.
+
+    All queries are scored with one matrix product. Only the best `result_offset + num_results` rows per query are
+    selected (`argpartition`) and sorted, not the whole matrix.
+
+    With a quantized copy of the matrix, the rows are scored on the copy, and the best `rerank_factor` times as many
+    rows as needed are re-ranked exactly on `embeddings_matrix`.
 
     Parameters
-        query_embedding (np.ndarray): Embedding of the query to be searched.
+        query_embeddings (np.ndarray): Embeddings of the queries to be searched, one row per query.
         embeddings_matrix (np.ndarray): Matrix of embeddings representing the database.
-        num_results (int): The number of results to return.
+        num_results (int): The number of results to return per query.
         result_offset (int): The number of results to skip.
+        quantized (QuantizedMatrix): Quantized copy of `embeddings_matrix` for the coarse stage, or None.
+        rerank_factor (int): Number of candidates re-ranked exactly, per result.
 
     Returns
-        A list of tuples with the index and the similarity score.
+        Row indices and similarity scores of the results, one row per query.
     """
 
-    scores = np.dot(embeddings_matrix, query_embedding)
-    top_indices = np.argsort(scores)[::-1][result_offset : result_offset + num_results]
-    top_scores = scores[top_indices]
-    assert len(top_indices) == len(top_scores)
-
-    return list(top_indices), list(top_scores)
+    num_rows = len(embeddings_matrix)
+    k = min(result_offset + num_results, num_rows)
+    if k <= 0:
+        empty = np.zeros((len(query_embeddings), 0))
+        return empty.astype(int), empty
+    if quantized is None:
+        scores = query_embeddings @ embeddings_matrix.T
+        num_candidates = k
+    else:
+        scores = quantized.scores(query_embeddings)
+        num_candidates = min(k * rerank_factor, num_rows)
+    if num_candidates < num_rows:
+        candidates = np.argpartition(-scores, num_candidates - 1, axis=1)[:, :num_candidates]
+    else:
+        candidates = np.broadcast_to(np.arange(num_rows), scores.shape)
+    if quantized is None:
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    else:
+        candidate_scores = quantization.rerank(query_embeddings, embeddings_matrix, candidates)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, result_offset:k]
+    top_indices = np.take_along_axis(candidates, order, axis=1)
+    top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return top_indices, top_scores
 
 
 class VectorDB:
     """
     Simple numpy based vector store for small datasets, storing and searching embeddings.
+
+    The embeddings are kept in one contiguous, normalized float32 matrix (`embeddings`), not in the snippets. The
+    rows are ordered by vehicle model, so the rows of one model are a contiguous range and can be searched without
+    copying; rows per category and subcategory are precomputed.
+
+    Optionally (`quantize`), searches score a quantized or truncated copy of the matrix and re-rank the best
+    candidates exactly. For large catalogues, an approximate nearest-neighbour index (`build_ivf`) restricts each
+    search to the rows of the `nprobe` closest clusters; it takes precedence over the quantized copy.
+
+    A lexical index (BM25, `build_lexical_index`) over the snippet questions and responses answers keyword lookups
+    without a query embedding (`search_lexical`); `fuse` combines its ranking with the vector ranking.
     """
 
+    # set by quantize()
+    _quantized: quantization.QuantizedMatrix | None = None
+    rerank_factor: int = 4
+    # set by build_ivf() or loaded with the index
+    _ivf: ivf.IvfIndex | None = None
+    nprobe: int = 8
+    # set by build_lexical_index() or loaded with the index
+    _bm25: bm25.Bm25Index | None = None
+
     def __init__(self, documents: list[str], embedding_computer: EmbeddingComputer, batch_call: bool = True) -> None:
         """
         Initialize the VectorDB.
@@ -97,48 +162,299 @@ class VectorDB:
                     responses.append(document.response)
         
         embeddings = embedding_computer.get_embeddings(responses)
-                    
-        for i,document in enumerate(documents.content):            
-            document.embedding = embeddings[i]
 
+        self._build_index(documents, np.array(embeddings, dtype=np.float32))
+
+    def _build_index(self, documents: KnowledgeBase, embeddings: np.ndarray, normalized: bool = False) -> None:
+        """Orders the snippets by vehicle model and builds the embedding matrix and the row indexes.
+
+        If the snippets are already ordered and the embeddings `normalized` (as in a stored index), the matrix is used
+        as is, so a memory-mapped matrix is not copied.
+        """
+        order = sorted(range(len(documents.content)), key=lambda i: documents.content[i].vehicle_model)
+        if order != list(range(len(order))):
+            documents = KnowledgeBase(content=[documents.content[i] for i in order])
+            embeddings = embeddings[order]
         self.documents = documents
+        for document in self.documents.content:
+            document.embedding = None
+        if not len(order):
+            self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.embeddings = embeddings if normalized else _normalize_rows(embeddings)
+
+        self._model_rows: dict[str, tuple[int, int]] = {}
+        category_rows: dict[str, list[int]] = {}
+        subcategory_rows: dict[str, list[int]] = {}
+        for row, document in enumerate(self.documents.content):
+            start, _ = self._model_rows.get(document.vehicle_model, (row, row))
+            self._model_rows[document.vehicle_model] = (start, row + 1)
+            category_rows.setdefault(document.category, []).append(row)
+            if document.subcategory is not None:
+                subcategory_rows.setdefault(document.subcategory, []).append(row)
+        # sorted row ids per value, so that a filter costs the size of its rows, not the size of the index
+        self._category_rows = {key: np.array(rows, dtype=np.intp) for key, rows in category_rows.items()}
+        self._subcategory_rows = {key: np.array(rows, dtype=np.intp) for key, rows in subcategory_rows.items()}
+        self._document_rows = {id(document): row for row, document in enumerate(self.documents.content)}
+
+    @staticmethod
+    def from_embeddings(
+        documents: KnowledgeBase, embeddings: np.ndarray, embedding_computer: EmbeddingComputer
+    ) -> "VectorDB":
+        """Creates the VectorDB from embeddings computed elsewhere, e.g. by `vectordb.build_index`.
 
+        Parameters
+            documents (KnowledgeBase): The snippets.
+            embeddings (np.ndarray): Embeddings of the snippet responses, in the order of the snippets.
+            embedding_computer (EmbeddingComputer): Object to compute query embeddings, with the model of `embeddings`.
+
+        Returns
+            (VectorDB): The VectorDB.
+        """
+        vectordb = VectorDB.__new__(VectorDB)
+        vectordb.embedding_computer = embedding_computer
+        vectordb._build_index(documents, embeddings)
+        return vectordb
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if "embeddings" not in state:
+            # index pickled before the embeddings were moved out of the snippets
+            embeddings = np.array([document.embedding for document in self.documents.content], dtype=np.float32)
+            self._build_index(self.documents, embeddings)
+        # the documents are new objects
+        self._document_rows = {id(document): row for row, document in enumerate(self.documents.content)}
+
+    def _rows(self, car_model: str | None, category: str | None, subcategory: str | None) -> slice | np.ndarray:
+        """Returns the rows matching the filters, as a slice where possible (no copy of the matrix needed), else as
+        sorted integer row ids. Unknown filter values match no rows."""
+        if car_model is None:
+            rows = slice(0, len(self.documents.content))
+        else:
+            # as before, the filter matches vehicle models containing `car_model`, e.g. "Audi A6" matches "Audi A6 Avant"
+            ranges = [row_range for model, row_range in self._model_rows.items() if car_model in model]
+            if len(ranges) == 1:
+                rows = slice(*ranges[0])
+            else:
+                rows = np.concatenate(
+                    [np.arange(*row_range, dtype=np.intp) for row_range in ranges] or [np.zeros(0, dtype=np.intp)]
+                )
+        for index, key in ((self._category_rows, category), (self._subcategory_rows, subcategory)):
+            if key is None:
+                continue
+            key_rows = index.get(key, np.zeros(0, dtype=np.intp))
+            if isinstance(rows, slice):
+                # the rows of the value within the range, found by binary search in the sorted row ids
+                rows = key_rows[np.searchsorted(key_rows, rows.start) : np.searchsorted(key_rows, rows.stop)]
+            else:
+                rows = np.intersect1d(rows, key_rows, assume_unique=True)
+        return rows
 
     def search_with_embedding(
-        self, query_embedding: list[float], num_results: int = 9, result_offset: int = 0, car_model: str = None
-    ) -> Iterator[tuple[str, float]]:
+        self,
+        query_embedding: list[float] | np.ndarray,
+        num_results: int = 9,
+        result_offset: int = 0,
+        car_model: str = None,
+        category: str | None = None,
+        subcategory: str | None = None,
+    ) -> Iterator[tuple[ContentSnippet, float]]:
         """Performs a vector search for a given query embedding.
 
         Parameters
             query_embedding (list[float]): Embedding of the query.
             num_results (int): The number of results to return.
             result_offset (int): The number of results to skip, for pagination.
+            car_model (str): Only search snippets whose vehicle model contains this string.
+            category (str): Only search snippets of this category.
+            subcategory (str): Only search snippets of this subcategory.
 
         Returns
-            (Iterator[tuple[str, float]]): Documents and similarity scores of the vector search.
+            (Iterator[tuple[ContentSnippet, float]]): Documents and similarity scores of the vector search.
         """
-        
-        if car_model is None:
-            filtered_documents = [doc for doc in self.documents.content]
-        else:
-            filtered_documents = [doc for doc in self.documents.content if car_model in doc.vehicle_model]
-        
-        embeddings = np.array([doc.embedding for doc in filtered_documents])
+        [results] = self.search_many(
+            [query_embedding],
+            num_results=num_results,
+            result_offset=result_offset,
+            car_model=car_model,
+            category=category,
+            subcategory=subcategory,
+        )
+        return iter(results)
+
+    def search_many(
+        self,
+        query_embeddings: list[list[float]] | np.ndarray,
+        num_results: int = 9,
+        result_offset: int = 0,
+        car_model: str = None,
+        category: str | None = None,
+        subcategory: str | None = None,
+    ) -> list[list[tuple[ContentSnippet, float]]]:
+        """Performs a vector search for a batch of query embeddings, scoring all of them with one matrix product.
+
+        Parameters
+            query_embeddings (list[list[float]]): Embeddings of the queries, one row per query.
+            num_results (int): The number of results to return per query.
+            result_offset (int): The number of results to skip, for pagination.
+            car_model (str): Only search snippets whose vehicle model contains this string.
+            category (str): Only search snippets of this category.
+            subcategory (str): Only search snippets of this subcategory.
+
+        Returns
+            (list[list[tuple[ContentSnippet, float]]]): Documents and similarity scores per query.
+        """
+        rows = self._rows(car_model, category, subcategory)
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_embeddings)))
+        if self._ivf is not None:
+            results = []
+            for query in queries:
+                indices, scores = self._ivf.search(
+                    query, self.embeddings, result_offset + num_results, self.nprobe, allowed=rows
+                )
+                indices, scores = indices[result_offset:].tolist(), scores[result_offset:]
+                results.append([(self.documents.content[i], score) for i, score in zip(indices, scores)])
+            return results
 
         indices, scores = _vector_search(
-            np.array(query_embedding),
-            embeddings_matrix=embeddings,
+            queries,
+            embeddings_matrix=self.embeddings[rows],
             num_results=num_results,
             result_offset=result_offset,
+            quantized=self._quantized[rows] if self._quantized is not None else None,
+            rerank_factor=self.rerank_factor,
+        )
+        if isinstance(rows, slice):
+            indices = indices + rows.start
+        else:
+            indices = rows[indices]
+        return [
+            [(self.documents.content[i], score) for i, score in zip(query_indices, query_scores)]
+            for query_indices, query_scores in zip(indices.tolist(), scores)
+        ]
+
+    def quantize(
+        self, kind: quantization.Quantization | None, rerank_factor: int = 4, dimensions: int | None = None
+    ) -> None:
+        """Searches a quantized and/or truncated copy of the embeddings from now on, re-ranking the best candidates
+        exactly.
+
+        The full-precision matrix is kept for the re-ranking; when it is memory-mapped (`load_from_disk`), only the
+        rows of the candidates are read from it.
+
+        Parameters
+            kind (str): "float16", "int8" (scalar quantization with one scale per dimension), "float32" (with
+                `dimensions`), or None for exact search.
+            rerank_factor (int): Number of candidates re-ranked exactly, per requested result.
+            dimensions (int): Score only this many leading dimensions (re-normalized) in the coarse stage.
+        """
+        if kind is None and dimensions is not None:
+            kind = "float32"
+        self._quantized = quantization.quantize(self.embeddings, kind, dimensions) if kind else None
+        self.rerank_factor = rerank_factor
+
+    def build_ivf(self, num_clusters: int | None = None, nprobe: int | None = None) -> None:
+        """Builds the approximate nearest-neighbour index (IVF, see `nevo_framework.retrieval.ivf`) used by searches
+        from now on. It is stored with the index by `store_to_disk`.
+
+        Parameters
+            num_clusters (int): Number of clusters; default about 4 * sqrt(snippets).
+            nprobe (int): Number of clusters searched per query; more clusters give a better recall but take longer.
+        """
+        self._ivf = ivf.IvfIndex.build(self.embeddings, num_clusters)
+        if nprobe is not None:
+            self.nprobe = nprobe
+
+    def build_lexical_index(self) -> None:
+        """Builds the lexical (BM25) index over the questions and responses of the snippets, used by `search_lexical`.
+        It is stored with the index by `store_to_disk`.
+        """
+        self._bm25 = bm25.Bm25Index.build(
+            [f"{document.question}\n{document.response}" for document in self.documents.content]
         )
-        result_docs = [filtered_documents[i] for i in indices]
-        return zip(result_docs, scores)
+
+    @property
+    def has_lexical_index(self) -> bool:
+        return self._bm25 is not None
+
+    def search_lexical(
+        self,
+        query: str,
+        num_results: int = 9,
+        result_offset: int = 0,
+        car_model: str = None,
+        category: str | None = None,
+        subcategory: str | None = None,
+    ) -> list[tuple[ContentSnippet, float]]:
+        """Performs a lexical (BM25) search for a query string; needs no embedding. Without a lexical index, nothing
+        is found.
+
+        Parameters
+            query (str): Query for which to perform search.
+            num_results (int): The number of results to return.
+            result_offset (int): The number of results to skip, for pagination.
+            car_model (str): Only search snippets whose vehicle model contains this string.
+            category (str): Only search snippets of this category.
+            subcategory (str): Only search snippets of this subcategory.
+
+        Returns
+            (list[tuple[ContentSnippet, float]]): Documents and scores, normalized to [0, 1] by the upper bound of
+                the score, see `nevo_framework.retrieval.bm25`.
+        """
+        if self._bm25 is None:
+            return []
+        rows = self._rows(car_model, category, subcategory)
+        indices, scores = self._bm25.search(query, result_offset + num_results, allowed=rows)
+        return [
+            (self.documents.content[i], float(score))
+            for i, score in zip(indices[result_offset:].tolist(), scores[result_offset:])
+        ]
+
+    def rows_of(self, documents: list[ContentSnippet]) -> list[int]:
+        """Returns the row ids of documents found by the searches of this VectorDB.
+
+        Parameters
+            documents (list[ContentSnippet]): Documents returned by searches of this VectorDB.
+
+        Returns
+            (list[int]): The row id of each document. Raises a KeyError for documents of another VectorDB, e.g. of a
+                reloaded version of the index.
+        """
+        return [self._document_rows[id(document)] for document in documents]
+
+    def lexical_matched_terms(self, query: str, documents: list[ContentSnippet]) -> list[int]:
+        """Returns the number of distinct query terms (without stopwords) each document contains, for documents found
+        by the searches of this VectorDB. Without a lexical index, no terms are matched.
+        """
+        if self._bm25 is None:
+            return [0] * len(documents)
+        return self._bm25.matched_terms(query, np.array(self.rows_of(documents), dtype=np.int64)).tolist()
+
+    def fuse(
+        self, rankings: list[list[tuple[ContentSnippet, float]]], num_results: int = 9
+    ) -> list[tuple[ContentSnippet, float]]:
+        """Fuses the results of several searches (e.g. `search_with_embedding` and `search_lexical`) of this VectorDB
+        by reciprocal rank fusion of the row ids. All searches must have been run on this VectorDB, see `rows_of`.
+
+        Parameters
+            rankings (list[list[tuple[ContentSnippet, float]]]): Results of each search, best first.
+            num_results (int): The number of results to return.
+
+        Returns
+            (list[tuple[ContentSnippet, float]]): Documents and fused scores.
+        """
+        rows = [self.rows_of([document for document, _ in ranking]) for ranking in rankings]
+        fused = bm25.reciprocal_rank_fusion(rows)
+        return [(self.documents.content[row], score) for row, score in fused[:num_results]]
 
     def search_with_query(
         self, query: str, num_results: int = 5, result_offset: int = 0, car_model: str = None
     ) -> Iterator[tuple[str, float]]:
         """Performs a vector search for a given query string.
 
+        The query is embedded with the synchronous client, which blocks. In async code, embed the query with the
+        embedding service (`nevo_framework.retrieval.embedding_service`) and use `search_with_embedding`.
+
         Parameters
             query (str): Query for which to perform search.
             num_results (int): The number of results to return.
@@ -151,26 +467,60 @@ class VectorDB:
         return self.search_with_embedding(query_embedding, num_results=num_results, result_offset=result_offset, car_model=car_model)
 
     def store_to_disk(self, path: str) -> None:
-        """Store the VectorDB to disk using pickle.
+        """Store the VectorDB to disk as an index directory (see `nevo_framework.retrieval.index_format`).
 
         Parameters
-            path (str): Path to store the VectorDB.
+            path (str): Directory to store the VectorDB in.
         """
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        index_format.write_index(
+            path, self.embeddings, self.records(), self.embedding_computer.model, arrays=self.arrays()
+        )
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The search structures stored with the index (IVF, lexical index), by array name."""
+        arrays = {}
+        for structure in (self._ivf, self._bm25):
+            if structure is not None:
+                arrays.update(structure.arrays())
+        return arrays
+
+    def records(self) -> list[dict]:
+        """The snippets as stored in the index directory, one per row."""
+        return [document.model_dump(mode="json", exclude={"embedding"}) for document in self.documents.content]
 
     @staticmethod
     def load_from_disk(path: str) -> "VectorDB":
-        """Load the VectorDB from disk.
+        """Load the VectorDB from disk. The embedding matrix is memory-mapped, not read.
+
+        Indexes pickled by earlier versions (`.pkl` files) are still loaded, convert them with
+        `python -m vectordb.migrate_indexes`.
 
         Parameters
-            path (str): Path to load the VectorDB.
+            path (str): Index directory (or pickle file) to load the VectorDB from.
 
         Returns
-            (VectorDB2): The loaded VectorDB.
+            (VectorDB): The loaded VectorDB.
         """
-        with open(path, "rb") as f:
-            return pickle.load(f)
+        if path.endswith(".pkl"):
+            logging.warning(
+                f"Loading pickled vector index {path}, convert it with `python -m vectordb.migrate_indexes`."
+            )
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        header, vectors, records = index_format.read_index(path)
+        vectordb = VectorDB.__new__(VectorDB)
+        vectordb.embedding_computer = EmbeddingComputer(model=header.embedding_model)
+        documents = KnowledgeBase(content=[ContentSnippet.model_validate(record) for record in records])
+        vectordb._build_index(documents, vectors, normalized=header.normalized)
+        if all(name in header.arrays for name in ivf.ARRAY_NAMES):
+            vectordb._ivf = ivf.IvfIndex.from_arrays(
+                {name: index_format.read_array(path, header, name) for name in ivf.ARRAY_NAMES}
+            )
+        if all(name in header.arrays for name in bm25.ARRAY_NAMES):
+            vectordb._bm25 = bm25.Bm25Index.from_arrays(
+                {name: index_format.read_array(path, header, name) for name in bm25.ARRAY_NAMES}
+            )
+        return vectordb
 
 
 def main():
@@ -189,9 +539,9 @@ def main():
         print(f"Document: {doc.response}, Score: {score}")
 
     print("Storing and loading from disk...")
-    with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
-        vectordb.store_to_disk(f.name)
-        vectordb_loaded = VectorDB.load_from_disk(f.name)
+    with tempfile.TemporaryDirectory() as directory:
+        vectordb.store_to_disk(os.path.join(directory, "index"))
+        vectordb_loaded = VectorDB.load_from_disk(os.path.join(directory, "index"))
         results_loaded = vectordb_loaded.search_with_query(query, car_model="Audi A6")
         for doc, score in results_loaded:
             print(f"Document: {doc.response}, Score: {score}")
@@ -0,0 +1,100 @@
+"""
+Benchmark of the audio framing (`nevo_framework.llm.audio_framing.AudioFramer`).
+
+Simulates a model response of irregular base64 encoded PCM16 fragments, as streamed by the audio models, and reports
+for different frame durations how many websocket frames per second of audio are sent, how many bytes are copied per
+second of audio and how much CPU time the framing takes. Then a response whose stream pauses in the middle is framed
+with and without `flush_on_deadline`, reporting how long the audio before the pause is held back.
+
+Run from the framework root:
+
+    python analysis/audio_framing_benchmark.py
+"""
+
+import asyncio
+import base64
+import random
+import time
+
+from nevo_framework.config.audio_config import AudioConfig
+from nevo_framework.llm.audio_framing import AudioFramer, flush_on_deadline
+
+AUDIO_SECONDS = 120
+FRAME_DURATIONS_MS = [0, 20, 40, 100]
+MAX_DELAY_MS = 100
+PAUSE_SECONDS = 0.5
+
+
+def make_fragments(config: AudioConfig, seconds: float) -> list[str]:
+    """Irregular fragments between a few samples and ~100 ms, with a bias to small ones."""
+    total_bytes = int(seconds * config.sample_rate) * config.sample_width * config.channels
+    fragments = []
+    produced = 0
+    while produced < total_bytes:
+        size = min(int(random.expovariate(1 / 400)) * 2 + 2, total_bytes - produced)
+        fragments.append(base64.b64encode(random.randbytes(size)).decode())
+        produced += size
+    return fragments
+
+
+async def held_back_seconds(fragments: list[bytes], config: AudioConfig, with_deadline: bool) -> float:
+    """Time from the start of the stream's pause until the audio received before it has been sent."""
+    framer = AudioFramer(frame_duration_ms=40, max_delay_ms=MAX_DELAY_MS, config=config)
+    pause_started = None
+    sent_after_pause = None
+
+    async def stream():
+        nonlocal pause_started
+        for i, fragment in enumerate(fragments):
+            if i == len(fragments) // 2:
+                pause_started = time.perf_counter()
+                await asyncio.sleep(PAUSE_SECONDS)
+            yield fragment
+
+    async def send(frame: bytes):
+        nonlocal sent_after_pause
+        if pause_started is not None and sent_after_pause is None:
+            sent_after_pause = time.perf_counter()
+
+    chunks = flush_on_deadline(stream(), framer, send) if with_deadline else stream()
+    async for fragment in chunks:
+        for frame in framer.write(fragment):
+            await send(frame)
+    if frame := framer.flush():
+        await send(frame)
+    return sent_after_pause - pause_started
+
+
+def main():
+    config = AudioConfig()
+    random.seed(0)
+    fragments = make_fragments(config, AUDIO_SECONDS)
+    print(f"{len(fragments)} fragments for {AUDIO_SECONDS}s of audio ({len(fragments) / AUDIO_SECONDS:.0f}/s)\n")
+
+    print(f"{'frame ms':>8} {'frames/s audio':>15} {'bytes copied/s audio':>21} {'CPU ms/s audio':>15}")
+    for frame_duration_ms in FRAME_DURATIONS_MS:
+        framer = AudioFramer(frame_duration_ms=frame_duration_ms, max_delay_ms=MAX_DELAY_MS, config=config)
+        sent_bytes = 0
+        start = time.process_time()
+        for fragment in fragments:
+            for frame in framer.write(base64.b64decode(fragment)):
+                sent_bytes += len(frame)
+        if frame := framer.flush():
+            sent_bytes += len(frame)
+        elapsed = time.process_time() - start
+        print(
+            f"{frame_duration_ms:>8} {framer.frames_emitted / AUDIO_SECONDS:>15.1f} "
+            f"{framer.bytes_copied / AUDIO_SECONDS:>21.0f} {1000 * elapsed / AUDIO_SECONDS:>15.3f}"
+        )
+
+    # fragments of 1001 samples do not fill whole 40 ms frames, so a partial frame is waiting when the stream pauses
+    pause_fragments = [bytes(2 * 1001)] * 20
+    print(f"\nstream pausing for {PAUSE_SECONDS * 1000:.0f} ms, 40 ms frames, max delay {MAX_DELAY_MS} ms")
+    for with_deadline in [False, True]:
+        held_back = asyncio.run(held_back_seconds(pause_fragments, config, with_deadline))
+        label = "with flush_on_deadline" if with_deadline else "write only"
+        print(f"{label:>23}: audio before the pause held back {1000 * held_back:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
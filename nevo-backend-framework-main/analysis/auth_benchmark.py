@@ -0,0 +1,106 @@
+"""
+Benchmark of requests/sec on `/respond`, comparing the previous authentication dependencies (token and session
+resolved separately, cookies logged at INFO, token decoded on every request) with `get_authenticated_session`
+(one dependency, verified tokens cached).
+
+The requests are sent in-process through httpx's ASGI transport, so the numbers show the server-side cost per
+request without network. Logging is configured at INFO like the server, but written to /dev/null.
+
+Run from the framework root:
+
+    python analysis/auth_benchmark.py
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+import httpx
+import jwt
+from fastapi import Body, Depends, HTTPException, Request, status
+
+from nevo_framework.api import api, api_helpers
+from nevo_framework.api.server_messages import WebElementMessage
+from nevo_framework.api.sessions import SessionState, get_session_state, store_session_state
+
+REQUESTS = 5000
+CONCURRENCY = 16
+
+
+async def legacy_token(request: Request) -> str:
+    """The token dependency as it was before: cookies logged at INFO, token decoded on every request."""
+    logging.info(f"Request cookies: {request.cookies}, getting token.")
+    token = request.cookies.get("access_token")
+    try:
+        jwt.decode(token, api_helpers.JWT_SECRET_KEY, algorithms=[api_helpers.ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
+    return token
+
+
+async def legacy_session(request: Request) -> SessionState:
+    """The session dependency as it was before: cookies parsed and logged again."""
+    logging.info(f"Request cookies: {request.cookies}, getting session id.")
+    if session := get_session_state(request.cookies.get("session_id")):
+        return session
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session not found for the given ID.")
+
+
+@api.app.post("/respond_legacy")
+async def respond_legacy(
+    token: str = Depends(legacy_token),
+    session_state: SessionState = Depends(legacy_session),
+    payload: dict = Body(...),
+):
+    session_state.input_queue.put_nowait(WebElementMessage(message_type=payload["type"], message_dict=payload))
+    return {"message": "ok"}
+
+
+async def measure(path: str, cookies: dict, session_state: SessionState) -> float:
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", cookies=cookies) as client:
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def request():
+            async with semaphore:
+                response = await client.post(path, json={"type": "benchmark"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+    # don't let the queue grow across runs
+    while not session_state.input_queue.empty():
+        session_state.input_queue.get_nowait()
+    return REQUESTS / elapsed
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO, handlers=[logging.FileHandler(os.devnull)], force=True)
+
+    session_state = SessionState(
+        id="benchmark-session", dialog_manager=None, input_queue=asyncio.Queue(), output_queue=None
+    )
+    session_state.accept_client_data = True
+    store_session_state(session_state)
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    token = jwt.encode({"exp": expiration}, api_helpers.JWT_SECRET_KEY, algorithm=api_helpers.ALGORITHM)
+    cookies = {"access_token": token, "session_id": session_state.id}
+
+    # warm up both paths
+    await measure("/respond_legacy", cookies, session_state)
+    await measure("/respond", cookies, session_state)
+
+    before = await measure("/respond_legacy", cookies, session_state)
+    after = await measure("/respond", cookies, session_state)
+    print(f"{REQUESTS} requests, concurrency {CONCURRENCY}")
+    print(f"before: {before:>8.0f} requests/s")
+    print(f"after:  {after:>8.0f} requests/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
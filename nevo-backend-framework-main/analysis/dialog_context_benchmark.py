@@ -0,0 +1,85 @@
+"""
+Compares the dialog context of tracker agents built as before (each tracker appends the last two messages to its own
+list on every call and joins the list) with a shared `DialogContextWindow`.
+
+A conversation of `--turns` turns (a user message and an assistant answer of random length each) is run with
+`--trackers` trackers reading the context per turn. Reported per number of turns: the estimated prompt tokens of the
+context and the time spent building it in all trackers. No API access is needed. Run from the framework root:
+
+    python analysis/dialog_context_benchmark.py --turns 200
+"""
+
+import argparse
+import random
+import time
+
+from nevo_framework.llm.dialog_context import DialogContextView, DialogContextWindow, estimate_tokens
+
+WORDS = "the car has a range of about five hundred kilometers and comes with park assist and a large trunk".split()
+
+
+def message(role: str, rng: random.Random, words: int) -> dict[str, str]:
+    return {"role": role, "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(words // 2, words)))}
+
+
+class ListTracker:
+    """The dialog context as the trackers kept it before."""
+
+    def __init__(self):
+        self.dialog = []
+
+    def get_dialog(self, dialog: list[dict[str, str]]) -> str:
+        if len(dialog) >= 2:
+            self.dialog.append(f"{dialog[-2]['role']}: {dialog[-2]['content']}")
+            self.dialog.append(f"{dialog[-1]['role']}: {dialog[-1]['content']}")
+        return "\n".join(self.dialog)
+
+
+class WindowTracker:
+    def __init__(self, window: DialogContextWindow):
+        self.context = DialogContextView(window)
+
+    def get_dialog(self, dialog: list[dict[str, str]]) -> str:
+        self.context.update(dialog)
+        return self.context.render()
+
+
+def run(trackers: list, args: argparse.Namespace) -> list[tuple[int, int, float]]:
+    rng = random.Random(0)
+    dialog = [message("assistant", rng, args.assistant_words)]
+    results, seconds = [], 0.0
+    for turn in range(1, args.turns + 1):
+        dialog.append(message("user", rng, args.user_words))
+        start = time.perf_counter()
+        contexts = [tracker.get_dialog(dialog) for tracker in trackers]
+        seconds += time.perf_counter() - start
+        dialog.append(message("assistant", rng, args.assistant_words))
+        if turn in args.report:
+            results.append((turn, estimate_tokens(contexts[0]), seconds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size and build time of the tracker dialog context.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--trackers", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    parser.add_argument("--user-words", type=int, default=20)
+    parser.add_argument("--assistant-words", type=int, default=60)
+    args = parser.parse_args()
+    args.report = {turns for turns in [10, 25, 50, 100, 200, 500, 1000] if turns <= args.turns} | {args.turns}
+
+    window = DialogContextWindow(max_tokens=args.max_tokens)
+    lists = run([ListTracker() for _ in range(args.trackers)], args)
+    windows = run([WindowTracker(window) for _ in range(args.trackers)], args)
+    print(f"{args.trackers} trackers, window of {args.max_tokens} tokens")
+    print(f"{'turns':>6} {'list tokens':>12} {'window tokens':>14} {'list ms':>8} {'window ms':>10}")
+    for (turns, list_tokens, list_seconds), (_, window_tokens, window_seconds) in zip(lists, windows):
+        print(
+            f"{turns:>6} {list_tokens:>12} {window_tokens:>14} {1000 * list_seconds:>8.2f} "
+            f"{1000 * window_seconds:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compares embedding the queries of concurrent RAG lookups with the synchronous OpenAI client (as `EmbeddingComputer`
+does) and with the `EmbeddingService`.
+
+`SESSIONS` sessions each embed one query at about the same time; some sessions ask the same question. The embedding
+API is simulated by an httpx mock transport answering after `LATENCY_SECONDS`. Reported are the wall time, the number
+of API calls, and the event loop lag, i.e. how long the audio streaming of all sessions would have been frozen.
+
+Run from the framework root:
+
+    python analysis/embedding_service_benchmark.py
+"""
+
+import asyncio
+import base64
+import json
+import os
+import random
+import struct
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "simulated")
+
+import httpx
+import openai
+
+from nevo_framework.retrieval.embedding_service import EmbeddingService
+
+SESSIONS = 50
+DISTINCT_QUESTIONS = 30
+LATENCY_SECONDS = 0.15
+DIMENSIONS = 1536
+TICK_SECONDS = 0.005
+EMBEDDING = [random.random() for _ in range(DIMENSIONS)]
+EMBEDDING_JSON = json.dumps(EMBEDDING)
+# the OpenAI SDK requests base64 encoded embeddings when numpy is installed
+EMBEDDING_BASE64 = json.dumps(base64.b64encode(struct.pack(f"{DIMENSIONS}f", *EMBEDDING)).decode())
+USAGE_JSON = json.dumps({"prompt_tokens": 1, "total_tokens": 1})
+
+
+class SimulatedEmbeddingApi:
+    def __init__(self):
+        self.calls = 0
+
+    def response(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        payload = json.loads(request.content)
+        texts = [payload["input"]] if isinstance(payload["input"], str) else payload["input"]
+        # the same vector for every text, serialized once: the cost of the server is not what is measured here
+        embedding = EMBEDDING_BASE64 if payload.get("encoding_format") == "base64" else EMBEDDING_JSON
+        data = ",".join(
+            f'{{"object": "embedding", "index": {index}, "embedding": {embedding}}}' for index in range(len(texts))
+        )
+        body = f'{{"object": "list", "data": [{data}], "model": "simulated", "usage": {USAGE_JSON}}}'
+        return httpx.Response(200, content=body.encode(), headers={"content-type": "application/json"})
+
+    def handle_sync(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(LATENCY_SECONDS)
+        return self.response(request)
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY_SECONDS)
+        return self.response(request)
+
+
+async def with_lag(lookups) -> tuple[float, float]:
+    """Runs the lookups while measuring event loop lag. Returns wall time and maximum lag."""
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(2 * TICK_SECONDS)
+    start = time.perf_counter()
+    await lookups()
+    elapsed = time.perf_counter() - start
+    running = False
+    await ticker_task
+    return elapsed, max(lags)
+
+
+async def main():
+    questions = [
+        f"What is the range of Audi model number {random.randrange(DISTINCT_QUESTIONS)}?" for _ in range(SESSIONS)
+    ]
+
+    sync_api = SimulatedEmbeddingApi()
+    sync_client = openai.OpenAI(http_client=httpx.Client(transport=httpx.MockTransport(sync_api.handle_sync)))
+
+    async def sync_lookups():
+        async def lookup(question: str):
+            # what rag_lookup did: the synchronous client, called from a coroutine
+            sync_client.embeddings.create(input=question, model="text-embedding-3-small")
+
+        await asyncio.gather(*(lookup(question) for question in questions))
+
+    async_api = SimulatedEmbeddingApi()
+    async_transport = httpx.MockTransport(async_api.handle_async)
+    async_client = openai.AsyncOpenAI(http_client=httpx.AsyncClient(transport=async_transport))
+    service = EmbeddingService(async_client, "text-embedding-3-small")
+
+    async def service_lookups():
+        await asyncio.gather(*(service.embed(question) for question in questions))
+
+    print(f"{SESSIONS} concurrent lookups, {len(set(questions))} distinct queries, {LATENCY_SECONDS}s API latency")
+    print(f"{'client':>18} {'wall ms':>8} {'API calls':>10} {'max loop lag ms':>16}")
+    elapsed, lag = await with_lag(sync_lookups)
+    print(f"{'synchronous':>18} {1000 * elapsed:>8.0f} {sync_api.calls:>10} {1000 * lag:>16.0f}")
+    elapsed, lag = await with_lag(service_lookups)
+    print(f"{'EmbeddingService':>18} {1000 * elapsed:>8.0f} {async_api.calls:>10} {1000 * lag:>16.0f}")
+    calls = async_api.calls
+    elapsed, lag = await with_lag(service_lookups)
+    print(f"{'(cached)':>18} {1000 * elapsed:>8.0f} {async_api.calls - calls:>10} {1000 * lag:>16.0f}")
+    print(f"service: {service.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
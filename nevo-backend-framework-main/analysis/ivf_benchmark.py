@@ -0,0 +1,99 @@
+"""
+Benchmarks the IVF approximate nearest-neighbour index (`nevo_framework.retrieval.ivf`) against exact search for
+knowledge bases of growing size: build time, queries per second and recall@k for several `nprobe` values, without
+and with a vehicle model filter.
+
+The embeddings are synthetic (unit vectors around cluster centres) and written to a memory-mapped `.npy` file in
+`--directory`, like the vectors of an index directory. The filter restricts the search to a contiguous fifth of the
+rows, as `VectorDB` does for one of five vehicle models. Queries are noisy copies of random rows.
+
+A million snippets of `text-embedding-3-small` (1536 dimensions) take 6 GB; reduce `--dimensions` (the default,
+256, is a truncated embedding) if that does not fit the memory. Run from the framework root:
+
+    python analysis/ivf_benchmark.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from nevo_framework.retrieval.ivf import IvfIndex
+
+NUM_MODELS = 5
+CHUNK_ROWS = 65536
+
+
+def synthetic_embeddings(path: Path, size: int, dimensions: int, rng: np.random.Generator) -> np.ndarray:
+    """Writes unit vectors around `sqrt(size)` random centres to a memory-mapped file, chunk by chunk."""
+    centres = rng.standard_normal((max(1, int(np.sqrt(size))), dimensions)).astype(np.float32)
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, dimensions))
+    for start in range(0, size, CHUNK_ROWS):
+        rows = min(CHUNK_ROWS, size - start)
+        chunk = centres[rng.integers(0, len(centres), rows)] + rng.standard_normal((rows, dimensions)).astype(
+            np.float32
+        )
+        matrix[start : start + rows] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    matrix.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def exact_search(query: np.ndarray, matrix: np.ndarray, k: int, allowed: slice) -> np.ndarray:
+    scores = np.empty(allowed.stop - allowed.start, dtype=np.float32)
+    for start in range(allowed.start, allowed.stop, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, allowed.stop)
+        scores[start - allowed.start : stop - allowed.start] = matrix[start:stop] @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return allowed.start + top[np.argsort(-scores[top])]
+
+
+def timed(search, queries: np.ndarray) -> tuple[list[np.ndarray], float]:
+    # warm-up: the first search pages in the memory-mapped matrix
+    search(queries[0])
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QPS and recall of the IVF index against exact search.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--directory", default=None, help="Directory for the embeddings (default: a temp dir).")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for size in args.sizes:
+            matrix = synthetic_embeddings(Path(directory) / f"vectors_{size}.npy", size, args.dimensions, rng)
+            queries = np.asarray(matrix[rng.choice(size, args.queries, replace=False)])
+            queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dimensions)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+            start = time.perf_counter()
+            index = IvfIndex.build(matrix)
+            build_seconds = time.perf_counter() - start
+            print(
+                f"\n{size} snippets, {args.dimensions} dimensions, {index.num_clusters} clusters, "
+                f"built in {build_seconds:.1f} s, top {args.k}"
+            )
+            print(f"{'filter':>6} {'nprobe':>6} {'q/s':>9} {'recall':>7} {'speedup':>8}")
+            for name, allowed in [("none", slice(0, size)), ("model", slice(0, size // NUM_MODELS))]:
+                exact, exact_qps = timed(lambda query: exact_search(query, matrix, args.k, allowed), queries)
+                print(f"{name:>6} {'exact':>6} {exact_qps:>9.0f} {1:>7.3f} {1:>7.1f}x")
+                for nprobe in args.nprobe:
+                    found, qps = timed(
+                        lambda query: index.search(query, matrix, args.k, nprobe, allowed=allowed)[0], queries
+                    )
+                    recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, found)])
+                    print(f"{name:>6} {nprobe:>6} {qps:>9.0f} {recall:>7.3f} {qps / exact_qps:>7.1f}x")
+            del matrix, index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Simulates a busy LLM provider to compare the OpenAI client as is with the `ScheduledClient` of `llm_scheduler`.
+
+One session fires `BACKGROUND_CALLS` background calls at once (like the extractors of a dialog step), then `SESSIONS`
+other sessions each make one interactive call (like the voice response). The provider, served by an httpx mock
+transport, answers after `LATENCY_SECONDS` and rejects requests beyond `PROVIDER_CONCURRENCY` in flight with 429 and
+a `Retry-After` header.
+
+Reported are the latencies of the interactive and the background calls, the number of 429s the provider sent and the
+scheduler's queue wait metrics. Run from the framework root:
+
+    python analysis/llm_scheduler_fairness.py
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import openai
+
+from nevo_framework.llm import llm_scheduler
+
+PROVIDER_CONCURRENCY = 8
+LATENCY_SECONDS = 0.2
+RETRY_AFTER_SECONDS = 0.5
+BACKGROUND_CALLS = 40
+SESSIONS = 5
+
+COMPLETION = {
+    "id": "chatcmpl-simulated",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "simulated",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+}
+
+
+class SimulatedProvider:
+    def __init__(self):
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.in_flight >= PROVIDER_CONCURRENCY:
+            self.rejected += 1
+            return httpx.Response(
+                429, headers={"retry-after": str(RETRY_AFTER_SECONDS)}, json={"error": {"message": "Rate limit"}}
+            )
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(LATENCY_SECONDS)
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(200, content=json.dumps(COMPLETION), headers={"content-type": "application/json"})
+
+
+async def call(client, session_id: str, priority: llm_scheduler.Priority) -> float:
+    llm_scheduler.set_session(session_id)
+    start = time.perf_counter()
+    with llm_scheduler.priority(priority):
+        await client.chat.completions.create(model="simulated", messages=[{"role": "user", "content": "hi"}])
+    return time.perf_counter() - start
+
+
+async def run(scheduled: bool):
+    provider = SimulatedProvider()
+    client = openai.AsyncOpenAI(
+        api_key="simulated", http_client=httpx.AsyncClient(transport=httpx.MockTransport(provider.handle))
+    )
+    if scheduled:
+        limits = llm_scheduler.DeploymentLimits(max_concurrency=PROVIDER_CONCURRENCY)
+        client = llm_scheduler.schedule_client(client, "text", limits, max_retries=5)
+
+    background = [
+        asyncio.create_task(call(client, "busy-session", llm_scheduler.Priority.BACKGROUND))
+        for _ in range(BACKGROUND_CALLS)
+    ]
+    await asyncio.sleep(0.05)
+    interactive = [
+        asyncio.create_task(call(client, f"session-{index}", llm_scheduler.Priority.INTERACTIVE))
+        for index in range(SESSIONS)
+    ]
+    results = await asyncio.gather(*interactive, *background, return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    interactive_latencies = [r for r in results[:SESSIONS] if not isinstance(r, Exception)]
+    background_latencies = [r for r in results[SESSIONS:] if not isinstance(r, Exception)]
+    return interactive_latencies, background_latencies, provider.rejected, failed, client
+
+
+async def main():
+    print(
+        f"{BACKGROUND_CALLS} background calls of one session, then {SESSIONS} interactive calls of other sessions; "
+        f"provider: {PROVIDER_CONCURRENCY} concurrent, {LATENCY_SECONDS}s latency"
+    )
+    print(f"{'client':>10} {'interactive median/max s':>25} {'background median/max s':>24} {'429s':>5} {'failed':>7}")
+    for scheduled in [False, True]:
+        interactive, background, rejected, failed, client = await run(scheduled)
+
+        def summary(latencies):
+            if not latencies:
+                return "-"
+            return f"{statistics.median(latencies):.2f}/{max(latencies):.2f}"
+
+        name = "scheduled" if scheduled else "plain"
+        print(f"{name:>10} {summary(interactive):>25} {summary(background):>24} {rejected:>5} {failed:>7}")
+        if scheduled:
+            print(f"scheduler metrics: {client.scheduler.metrics}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
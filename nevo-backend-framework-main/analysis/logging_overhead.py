@@ -0,0 +1,148 @@
+"""
+Measures the logging overhead per dialog turn on the event loop, comparing the previous setup (handlers called
+synchronously, AI log selected by formatting every record and matching "<<<AI>>>") with the queue pipeline of
+`logging_helpers.start_queue_logging` (records formatted and written in a background thread, AI log selected by
+`MarkerFilter`, DEBUG records sampled).
+
+A turn logs what a dialog step typically logs on the server: the user message, agent calls, timing events, the agent
+responses, the web element messages and per-chunk debug records while streaming audio. The handlers are the ones of
+`config/log-server.ini` plus the AI log, writing to a temporary directory (the console handler writes to /dev/null).
+While `SESSIONS` sessions run turns concurrently, a ticker task records how late it wakes up (event loop lag).
+
+Run from the framework root:
+
+    python analysis/logging_overhead.py
+"""
+
+import asyncio
+import logging
+import logging.handlers
+import os
+import tempfile
+import time
+
+from nevo_framework.helpers.logging_helpers import (
+    LOGMARKER_AI,
+    LogAi,
+    LogAiAgentResponse,
+    LogAiUserMessage,
+    MarkerFilter,
+    TimingLogger,
+    start_queue_logging,
+)
+
+TURNS = 1000
+SESSIONS = 20
+AUDIO_CHUNKS_PER_TURN = 100
+TICK_SECONDS = 0.005
+DEBUG_SAMPLE_RATE = 10
+RESPONSE = "The Audi Q4 e-tron combines a range of up to 520 km with a spacious interior and quick charging. " * 6
+
+
+class LegacyAILogFilter(logging.Filter):
+    """The AI log filter as it was before."""
+
+    def filter(self, record):
+        return record.getMessage().startswith("<<<AI>>>")
+
+
+def configure_handlers(log_dir: str, ai_filter: logging.Filter):
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.setLevel(logging.INFO)
+    file_handler = logging.handlers.RotatingFileHandler(os.path.join(log_dir, "logfile.log"), "a")
+    file_handler.setFormatter(
+        logging.Formatter("SERVER [%(asctime)s] [%(thread)d] [%(name)s %(module)s.%(funcName)s] %(levelname)s - %(message)s")
+    )
+    console_handler = logging.StreamHandler(open(os.devnull, "w"))
+    console_handler.setFormatter(
+        logging.Formatter("SERVER [%(thread)d] [%(name)s %(module)s.%(funcName)s] %(levelname)s - %(message)s")
+    )
+    ai_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, "ai.log"), maxBytes=5 * 1024 * 1024, backupCount=3
+    )
+    ai_handler.setFormatter(file_handler.formatter)
+    ai_handler.addFilter(ai_filter)
+    for handler in [file_handler, console_handler, ai_handler]:
+        root_logger.addHandler(handler)
+
+
+async def turn(session: int) -> float:
+    """Logs what one dialog step logs. Returns the time spent in logging calls."""
+    start = time.perf_counter()
+    logging.info(f"Recording ready for session {session}: in memory")
+    logging.info(LogAiUserMessage("Which of your electric cars has the longest range and how fast can it charge?"))
+    with TimingLogger("dialog_step"):
+        logging.info(LogAi(f"Orchestrator routing for session {session}."))
+        logging.info(LogAi(f"AudioChatAgentGPT4VoiceV2 calling gpt-4o-audio-preview (RecommendationAgent)."))
+        spent = time.perf_counter() - start
+        for chunk in range(AUDIO_CHUNKS_PER_TURN):
+            await asyncio.sleep(0)
+            chunk_start = time.perf_counter()
+            logging.debug(f"Output queue, no timing: AudioChunk(session={session}, chunk={chunk})")
+            spent += time.perf_counter() - chunk_start
+        start = time.perf_counter()
+        logging.info(f"Handling web element message for session {session}: {{'type': 'image', 'id': 'q4_etron'}}")
+        logging.info(LogAiAgentResponse("AudioChatAgentGPT4VoiceV2", RESPONSE))
+    logging.info(f"handle_dialog_step: received DIALOG_STEP_ENDED signal for session {session}")
+    return spent + time.perf_counter() - start
+
+
+async def run_sessions() -> tuple[float, list[float]]:
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            tick_start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - tick_start - TICK_SECONDS)
+
+    async def session(index: int) -> float:
+        spent = 0.0
+        for _ in range(TURNS // SESSIONS):
+            spent += await turn(index)
+        return spent
+
+    ticker_task = asyncio.create_task(ticker())
+    spent = await asyncio.gather(*(session(index) for index in range(SESSIONS)))
+    running = False
+    await ticker_task
+    return sum(spent) / TURNS, sorted(lags)
+
+
+async def main():
+    results = {}
+    drain = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for level in [logging.INFO, logging.DEBUG]:
+            level_name = logging.getLevelName(level)
+
+            # previous setup
+            configure_handlers(log_dir, LegacyAILogFilter())
+            logging.getLogger().setLevel(level)
+            results[f"synchronous, {level_name}"] = await run_sessions()
+
+            # queue pipeline
+            configure_handlers(log_dir, MarkerFilter(LOGMARKER_AI))
+            logging.getLogger().setLevel(level)
+            listener = start_queue_logging(DEBUG_SAMPLE_RATE)
+            results[f"queue, {level_name}"] = await run_sessions()
+            drain_start = time.perf_counter()
+            listener.stop()
+            drain[level_name] = time.perf_counter() - drain_start
+        configure_handlers(log_dir, LegacyAILogFilter())
+
+    print(f"{TURNS} turns in {SESSIONS} concurrent sessions, DEBUG sampled 1 in {DEBUG_SAMPLE_RATE} with the queue")
+    print(f"{'pipeline':>20} {'ms per turn':>12} {'p99 lag ms':>11} {'max lag ms':>11}")
+    for name, (per_turn, lags) in results.items():
+        p99 = lags[min(len(lags) - 1, int(0.99 * len(lags)))]
+        print(f"{name:>20} {1000 * per_turn:>12.3f} {1000 * p99:>11.2f} {1000 * lags[-1]:>11.2f}")
+    for level_name, seconds in drain.items():
+        print(f"queue drained {1000 * seconds:.0f} ms after the last turn ({level_name})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Measures how much a burst of concurrent logins delays the event loop, comparing the previous login (bcrypt checked
+inline in the request handler) with `/login` (bcrypt checked in the bounded worker pool with admission control).
+
+While the logins run, a ticker task sleeps for `TICK_SECONDS` in a loop and records how late it wakes up; that lateness
+is what the audio streaming of all other sessions would see. The requests are sent in-process through httpx's ASGI
+transport, with the password whose hash is configured in the api module.
+
+Logging in creates a dialog manager, so an orchestrator must be configured. Run from the root of a backend with a
+working orchestrator, with the framework on the path, e.g.:
+
+    python analysis/login_event_loop_lag.py --password <password> --logins 100
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+import bcrypt
+import httpx
+from fastapi import Body, HTTPException, status
+
+from nevo_framework.api import api
+
+TICK_SECONDS = 0.01
+
+
+@api.app.post("/login_legacy")
+async def login_legacy(password: str = Body(..., embed=True)):
+    """The password check as it was before: bcrypt called directly on the event loop."""
+    if bcrypt.checkpw(password.encode("utf-8"), api.stored_hashed_password):
+        return {"message": "Logged in"}
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+
+
+async def measure(path: str, password: str, logins: int) -> tuple[list[float], dict[int, int], float]:
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        ticker_task = asyncio.create_task(ticker())
+        await asyncio.sleep(10 * TICK_SECONDS)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post(path, json={"password": password}) for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        running = False
+        await ticker_task
+
+    status_counts = {}
+    for response in responses:
+        status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+    return sorted(lags), status_counts, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Event loop lag during a burst of logins.")
+    parser.add_argument("--password", type=str, required=True, help="Password matching the configured hash.")
+    parser.add_argument("--logins", type=int, default=100, help="Number of concurrent logins.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{args.logins} concurrent logins")
+    print(f"{'path':>14} {'max lag ms':>11} {'p99 lag ms':>11} {'duration s':>11}  status codes")
+    for path in ["/login_legacy", "/login"]:
+        lags, status_counts, elapsed = await measure(path, args.password, args.logins)
+        p99 = lags[min(len(lags) - 1, int(0.99 * len(lags)))]
+        print(f"{path:>14} {1000 * lags[-1]:>11.0f} {1000 * p99:>11.0f} {elapsed:>11.1f}  {status_counts}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
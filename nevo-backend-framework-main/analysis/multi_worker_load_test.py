@@ -0,0 +1,208 @@
+"""
+Local load test for the multi-worker deployment (`--workers N`).
+
+For each worker count, the script starts the API server behind the chosen reverse proxy (`--router`), logs in many
+sessions concurrently, sends requests on all sessions, and then streams audio over the websocket of every session,
+measuring throughput. Logins are CPU bound (password hashing, creating the dialog manager), so login throughput should
+scale close to linearly with the number of workers, up to the number of cores - unless the proxy is the bottleneck.
+To show that, the CPU time used by the proxy is reported: the Python router runs in the server process, nginx in its
+child processes (read from /proc, so Linux only).
+
+The audio phase streams 40 ms frames of silence as fast as possible and closes the websocket without an end of
+speech, so no transcription is requested. The frame rate counts frames accepted by the front end (the proxy, or the
+server with one worker); a proxy may buffer frames the worker has not read yet. The server must be configured with
+`streaming_transcription: "buffered"` to read the frames; it is started with --user_first, so that connecting does
+not make the AI speak.
+
+Run from the root of the application backend (where the server is normally started), with the same environment
+(.env, PYTHONPATH) the server needs:
+
+    python ../nevo-backend-framework-main/analysis/multi_worker_load_test.py --workers 1 2 4 --sessions 200
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+PASSWORD = os.getenv("LOAD_TEST_PASSWORD", "test123")
+# generous, under load the requests queue up on the server
+REQUEST_TIMEOUT = 120
+# 40 ms of PCM16 mono at 24 kHz, the format of the streamed audio
+AUDIO_FRAME = bytes(2 * 24000 * 40 // 1000)
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as file:
+        # the fields after the command name, which may contain spaces; utime and stime are fields 14 and 15
+        fields = file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def child_processes(pid: int) -> list[tuple[int, str]]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        name, rest = stat.split("(", 1)[1].rsplit(")", 1)
+        if int(rest.split()[1]) == pid:
+            children.append((int(entry), name))
+    return children
+
+
+def proxy_cpu_seconds(server_pid: int) -> float:
+    """CPU time of the proxy: the server process itself (Python router) and all nginx processes below it."""
+    pids, pending = [server_pid], [server_pid]
+    while pending:
+        for child, name in child_processes(pending.pop()):
+            if name == "nginx":
+                pids.append(child)
+                pending.append(child)
+    seconds = 0.0
+    for pid in pids:
+        try:
+            seconds += process_cpu_seconds(pid)
+        except OSError:
+            pass
+    return seconds
+
+
+async def wait_until_healthy(base_url: str, worker_count: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    healthy_in_a_row = 0
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                healthy = (await client.get(f"{base_url}/health")).status_code == 200
+            except httpx.TransportError:
+                healthy = False
+            healthy_in_a_row = healthy_in_a_row + 1 if healthy else 0
+            # the router sends requests without session round-robin, so this means every worker is up
+            if healthy_in_a_row >= worker_count:
+                return
+            if not healthy:
+                await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server at {base_url} did not become healthy within {timeout} seconds.")
+
+
+async def login(base_url: str, semaphore: asyncio.Semaphore) -> httpx.Cookies:
+    async with semaphore, httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+        response = await client.post(f"{base_url}/login/text", json={"password": PASSWORD})
+        response.raise_for_status()
+        return response.cookies
+
+
+async def session_requests(base_url: str, cookies: httpx.Cookies, count: int, semaphore: asyncio.Semaphore):
+    async with httpx.AsyncClient(cookies=cookies, timeout=REQUEST_TIMEOUT) as client:
+        for _ in range(count):
+            async with semaphore:
+                (await client.get(f"{base_url}/test")).raise_for_status()
+
+
+async def stream_audio(base_url: str, cookies: httpx.Cookies, frames: int, semaphore: asyncio.Semaphore) -> float:
+    """Returns the time the last frame was sent; the closing handshake is not part of the measurement."""
+    url = f"{base_url.replace('http', 'ws', 1)}/ws/audio/{cookies['session_id']}"
+    headers = [("cookie", "; ".join(f"{name}={value}" for name, value in cookies.items()))]
+    async with semaphore, websockets.connect(url, additional_headers=headers, max_size=None) as websocket:
+        for _ in range(frames):
+            await websocket.send(AUDIO_FRAME)
+        return time.perf_counter()
+
+
+async def run_load(
+    base_url: str, sessions: int, requests_per_session: int, audio_frames: int, concurrency: int
+) -> tuple[float, float, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    cookies = await asyncio.gather(*(login(base_url, semaphore) for _ in range(sessions)))
+    login_rate = sessions / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session_requests(base_url, c, requests_per_session, semaphore) for c in cookies))
+    request_rate = sessions * requests_per_session / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    sent = await asyncio.gather(*(stream_audio(base_url, c, audio_frames, semaphore) for c in cookies))
+    frame_rate = sessions * audio_frames / (max(sent) - start)
+    return login_rate, request_rate, frame_rate
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test of the API server with different numbers of workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests_per_session", type=int, default=20)
+    parser.add_argument("--audio_frames", type=int, default=250, help="40 ms audio frames per session.")
+    parser.add_argument("--router", choices=["nginx", "python"], default="nginx")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = []
+    for worker_count in args.workers:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "nevo_framework.api.api",
+                "--workers",
+                str(worker_count),
+                "--router",
+                args.router,
+                "--user_first",
+            ],
+            env={**os.environ, "PORT": str(args.port)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            await wait_until_healthy(base_url, worker_count)
+            # with one worker, the server runs without proxy
+            proxy_start = proxy_cpu_seconds(server.pid) if worker_count > 1 else None
+            start = time.perf_counter()
+            rates = await run_load(
+                base_url, args.sessions, args.requests_per_session, args.audio_frames, args.concurrency
+            )
+            # share of one core used by the proxy during the load
+            if proxy_start is not None:
+                proxy_load = (proxy_cpu_seconds(server.pid) - proxy_start) / (time.perf_counter() - start)
+            else:
+                proxy_load = None
+            results.append((worker_count, *rates, proxy_load))
+            login_rate, request_rate, frame_rate = rates
+            print(
+                f"{worker_count} worker(s): {login_rate:.1f} logins/s, {request_rate:.1f} requests/s, "
+                f"{frame_rate:.0f} audio frames/s, proxy {'-' if proxy_load is None else f'{proxy_load:.0%}'} of a core"
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\n{os.cpu_count()} cores, {args.router} router")
+    print(
+        f"{'workers':>7} {'logins/s':>9} {'speedup':>8} {'requests/s':>11} {'speedup':>8} "
+        f"{'frames/s':>9} {'speedup':>8} {'proxy CPU':>10}"
+    )
+    _, base_login_rate, base_request_rate, base_frame_rate, _ = results[0]
+    for worker_count, login_rate, request_rate, frame_rate, proxy_load in results:
+        print(
+            f"{worker_count:>7} {login_rate:>9.1f} {login_rate / base_login_rate:>8.2f} "
+            f"{request_rate:>11.1f} {request_rate / base_request_rate:>8.2f} "
+            f"{frame_rate:>9.0f} {frame_rate / base_frame_rate:>8.2f} "
+            f"{'-' if proxy_load is None else f'{proxy_load:.0%}':>10}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
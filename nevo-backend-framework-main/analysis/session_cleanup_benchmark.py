@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of the cost of one session cleanup pass against the number of sessions.
+
+Compares the expiry-heap based `sessions.collect_sessions_to_remove` with the previous implementation, which scanned
+all sessions three times per pass. In each pass about 1% of the sessions are expired or marked for removal.
+
+Run from the framework root (the master config is loaded from config/master_config.json):
+
+    python analysis/session_cleanup_benchmark.py
+"""
+
+import asyncio
+import datetime
+import random
+import time
+
+from fastapi.websockets import WebSocketState
+
+from nevo_framework.api import sessions
+from nevo_framework.api.sessions import SessionState
+
+SESSION_COUNTS = [100, 1_000, 10_000, 100_000]
+EXPIRED_FRACTION = 0.01
+REPETITIONS = 5
+
+
+def full_scan_cleanup(now: datetime.datetime) -> list[tuple[str, str]]:
+    """The previous cleanup: three scans over all sessions."""
+    sessions_to_kill = set((s.id, "marked for removal") for s in sessions._sessions.values() if s.kill_session)
+    sessions_to_kill.update(
+        (s.id, "inactive")
+        for s in sessions._sessions.values()
+        if (now - s.last_activity).total_seconds() > 60 * sessions.CONFIG.timeout_session_activity_minutes
+    )
+    sessions_to_kill.update(
+        (s.id, "websocket not connected")
+        for s in sessions._sessions.values()
+        if s.websocket and s.websocket.client_state != WebSocketState.CONNECTED
+    )
+    for session_id, _ in sessions_to_kill:
+        sessions._sessions.pop(session_id, None)
+    return list(sessions_to_kill)
+
+
+def populate(count: int, now: datetime.datetime):
+    sessions._sessions.clear()
+    sessions._expiry_heap.clear()
+    sessions._marked_for_removal.clear()
+    timeout = datetime.timedelta(minutes=sessions.CONFIG.timeout_session_activity_minutes)
+    for i in range(count):
+        session = SessionState(id=f"session-{i}", dialog_manager=None, input_queue=None, output_queue=None)
+        # most sessions are active; a few are past their timeout
+        if random.random() < EXPIRED_FRACTION / 2:
+            session.last_activity = now - 2 * timeout
+        else:
+            session.last_activity = now - random.random() * timeout / 2
+        sessions.store_session_state(session)
+    for session in random.sample(list(sessions._sessions.values()), int(count * EXPIRED_FRACTION / 2)):
+        session.mark_for_removal()
+
+
+def measure(cleanup, count: int) -> float:
+    timings = []
+    for _ in range(REPETITIONS):
+        now = datetime.datetime.now()
+        populate(count, now)
+        start = time.perf_counter()
+        cleanup(now)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def main():
+    print(f"{'sessions':>9} {'full scan ms':>13} {'expiry heap ms':>15}")
+    for count in SESSION_COUNTS:
+        full_scan = measure(full_scan_cleanup, count)
+        heap = measure(sessions.collect_sessions_to_remove, count)
+        print(f"{count:>9} {full_scan * 1000:>13.3f} {heap * 1000:>15.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Simulates conversations through the `SpeculativeExecutor`: per turn, a router takes `--router-ms` to pick the next
+branch, and branches with preparatory work (a RAG lookup, an image lookup) take `--work-ms` before the agent can
+speak. Routes follow a Markov chain in which users mostly stay on a topic; the work is keyed by a car model, which
+changes with `--model-change` probability per turn.
+
+Reported per number of speculated branches: mean and p95 time until the agent can speak, and the share of started
+work which was wasted. No API access is needed. Run from the framework root:
+
+    python analysis/speculation_benchmark.py --turns 200
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from nevo_framework.llm.speculation import SpeculativeExecutor
+
+BRANCHES = ["car_model_details", "image_intent", "driver_assistance_features", "test_drive", "car_model_comparison"]
+WORK_BRANCHES = ["car_model_details", "image_intent"]
+MODELS = ["Audi A1", "Audi A3", "Audi A6", "Audi Q3", "Audi Q6"]
+STAY_PROBABILITY = 0.6
+
+
+def next_route(route: str, rng: random.Random) -> str:
+    if rng.random() < STAY_PROBABILITY:
+        return route
+    return rng.choice(BRANCHES)
+
+
+async def conversation(max_branches: int, args: argparse.Namespace, seed: int) -> tuple[list[float], dict]:
+    rng = random.Random(seed)
+    executor = SpeculativeExecutor(max_branches=max_branches, default_order=WORK_BRANCHES)
+    route, model = rng.choice(BRANCHES), rng.choice(MODELS)
+    last_model = None
+    latencies = []
+
+    async def work():
+        await asyncio.sleep(args.work_ms / 1000)
+
+    for _ in range(args.turns):
+        route = next_route(route, rng)
+        if rng.random() < args.model_change:
+            model = rng.choice(MODELS)
+        start = time.perf_counter()
+        speculation = executor.start({branch: (last_model, work) for branch in WORK_BRANCHES})
+        await asyncio.sleep(args.router_ms / 1000)
+        if route in WORK_BRANCHES:
+            await speculation.commit(route, key=model, work=work)
+        else:
+            await speculation.commit(route)
+        latencies.append(time.perf_counter() - start)
+        last_model = model
+    return latencies, executor.metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency and waste of speculative branch execution.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--router-ms", type=float, default=600)
+    parser.add_argument("--work-ms", type=float, default=500)
+    parser.add_argument("--model-change", type=float, default=0.2, help="Probability that the car model changes.")
+    parser.add_argument("--speed-up", type=float, default=20, help="Latencies are simulated this much faster.")
+    args = parser.parse_args()
+    scaled = argparse.Namespace(**vars(args))
+    scaled.router_ms, scaled.work_ms = args.router_ms / args.speed_up, args.work_ms / args.speed_up
+
+    print(
+        f"{args.conversations} conversations of {args.turns} turns, router {args.router_ms:.0f} ms, "
+        f"work {args.work_ms:.0f} ms"
+    )
+    print(f"{'branches':>8} {'mean ms':>8} {'p95 ms':>7} {'hit rate':>9} {'wasted':>7}")
+    for max_branches in [0, 1, 2]:
+        latencies, started, committed, wasted, needed = [], 0, 0, 0, 0
+        for seed in range(args.conversations):
+            conversation_latencies, metrics = asyncio.run(conversation(max_branches, scaled, seed))
+            latencies += conversation_latencies
+            for branch_metrics in metrics.values():
+                started += branch_metrics.started
+                committed += branch_metrics.committed
+                wasted += branch_metrics.wasted
+                needed += branch_metrics.committed + branch_metrics.failed + branch_metrics.missed
+        milliseconds = 1000 * args.speed_up * np.array(latencies)
+        print(
+            f"{max_branches:>8} {np.mean(milliseconds):>8.0f} {np.percentile(milliseconds, 95):>7.0f} "
+            f"{committed / needed if needed else 0:>9.0%} {wasted / started if started else 0:>7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measures the time to first token (TTFT) of the first streamed voice response of a process, for
+
+* "cold": a process without prewarming (the request opens the connection),
+* "warm": connections prewarmed at startup with `http_pool.prewarm`,
+
+and the TTFT of the voice response following a text call (the router of a dialog step), with one connection pool
+per client as before and with the shared pool.
+
+The API is simulated by a local HTTP server which streams a chat completion after `--latency_ms`; each new
+connection is delayed by `--handshake_ms` to stand in for the TCP and TLS handshakes to the real API (which a local
+server without TLS does not have). Run from the framework root:
+
+    python analysis/time_to_first_token.py --handshake_ms 150
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+
+from nevo_framework.llm import http_pool
+
+CHUNK = {
+    "id": "chatcmpl-simulated",
+    "object": "chat.completion.chunk",
+    "created": 0,
+    "model": "simulated",
+    "choices": [{"index": 0, "delta": {"content": "Hello"}, "finish_reason": None}],
+}
+REPETITIONS = 5
+
+
+class SimulatedApi:
+    """A minimal keep-alive HTTP/1.1 server answering every request with a streamed chat completion."""
+
+    def __init__(self, handshake_seconds: float, latency_seconds: float):
+        self.handshake_seconds = handshake_seconds
+        self.latency_seconds = latency_seconds
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_seconds)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                await reader.readexactly(length)
+                await asyncio.sleep(self.latency_seconds)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\ntransfer-encoding: chunked\r\n\r\n"
+                )
+                for event in [f"data: {json.dumps(CHUNK)}\n\n", "data: [DONE]\n\n"]:
+                    data = event.encode()
+                    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # client closed the connection, or the server shuts down
+            writer.close()
+
+
+async def time_to_first_token(client) -> float:
+    start = time.perf_counter()
+    stream = await client.chat.completions.create(model="simulated", messages=[], stream=True)
+    async for _ in stream:
+        ttft = time.perf_counter() - start
+        break
+    async for _ in stream:
+        pass
+    return ttft
+
+
+async def text_call(client):
+    stream = await client.chat.completions.create(model="simulated", messages=[], stream=True)
+    async for _ in stream:
+        pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Time to first token, cold vs warm process.")
+    parser.add_argument("--handshake_ms", type=float, default=150, help="Simulated connection setup time.")
+    parser.add_argument("--latency_ms", type=float, default=300, help="Simulated time to first token of the API.")
+    args = parser.parse_args()
+    api = SimulatedApi(args.handshake_ms / 1000, args.latency_ms / 1000)
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+    config = http_pool.HttpPoolConfig()
+
+    def shared_client():
+        http_client = http_pool.shared_async_http_client(config)
+        return openai.AsyncOpenAI(api_key="simulated", base_url=base_url, http_client=http_client)
+
+    def own_client():
+        return openai.AsyncOpenAI(api_key="simulated", base_url=base_url, http_client=httpx.AsyncClient())
+
+    scenarios = ["first turn, cold", "first turn, warm", "after text call, own pools", "after text call, shared pool"]
+    results = {name: [] for name in scenarios}
+    for _ in range(REPETITIONS):
+        # each repetition stands for a new process: new pools
+        await http_pool.close()
+        results["first turn, cold"].append(await time_to_first_token(shared_client()))
+
+        await http_pool.close()
+        await http_pool.prewarm([shared_client()], connections=2)
+        results["first turn, warm"].append(await time_to_first_token(shared_client()))
+
+        text_client, audio_client = own_client(), own_client()
+        await text_call(text_client)
+        results["after text call, own pools"].append(await time_to_first_token(audio_client))
+        await text_client.close()
+        await audio_client.close()
+
+        await http_pool.close()
+        await text_call(shared_client())
+        results["after text call, shared pool"].append(await time_to_first_token(shared_client()))
+    await http_pool.close()
+    server.close()
+
+    print(f"simulated handshake {args.handshake_ms:.0f} ms, API time to first token {args.latency_ms:.0f} ms")
+    print(f"{'scenario':>30} {'median TTFT ms':>15}")
+    for name, values in results.items():
+        print(f"{name:>30} {1000 * sorted(values)[len(values) // 2]:>15.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Measures the latency from the moment the user stops talking until the transcript is ready, for
+
+* "upload": the recording is uploaded after the user stopped, then transcribed (the /receive_audio_blob path),
+* "buffered": the audio was streamed while the user talked, then transcribed (streaming_transcription "buffered"),
+* "realtime": the audio was streamed to the real-time transcription service while the user talked
+  (streaming_transcription "realtime", only with --live).
+
+Without --live, the speech-to-text call is simulated with a fixed round trip plus a time per second of audio, and
+the upload with the given bandwidth, so the script runs without API access. With --live, the OpenAI APIs are used and
+a recording of speech should be given with --wav (PCM16 mono, 24 kHz).
+
+Run from the framework root:
+
+    python analysis/transcription_latency.py --seconds 5 --uplink_mbit 2
+    python analysis/transcription_latency.py --live --wav my_question.wav
+"""
+
+import argparse
+import asyncio
+import io
+import time
+import wave
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from nevo_framework.llm import llm_tools
+from nevo_framework.llm.streaming_transcription import (
+    STREAMING_AUDIO_CONFIG,
+    BufferedStreamingTranscriber,
+    RealtimeStreamingTranscriber,
+    StreamingTranscriber,
+)
+
+CHUNK_SECONDS = 0.1
+REPETITIONS = 3
+
+
+def load_pcm(args) -> bytes:
+    if args.wav:
+        with wave.open(args.wav, "rb") as wav_file:
+            assert wav_file.getframerate() == STREAMING_AUDIO_CONFIG.sample_rate, "Expected a 24 kHz recording."
+            return wav_file.readframes(wav_file.getnframes())
+    sample_bytes = STREAMING_AUDIO_CONFIG.sample_width * STREAMING_AUDIO_CONFIG.channels
+    return bytes(int(args.seconds * STREAMING_AUDIO_CONFIG.sample_rate) * sample_bytes)
+
+
+def as_wav(pcm: bytes) -> io.BytesIO:
+    recording = io.BytesIO()
+    with wave.open(recording, "wb") as wav_file:
+        wav_file.setnchannels(STREAMING_AUDIO_CONFIG.channels)
+        wav_file.setsampwidth(STREAMING_AUDIO_CONFIG.sample_width)
+        wav_file.setframerate(STREAMING_AUDIO_CONFIG.sample_rate)
+        wav_file.writeframes(pcm)
+    recording.seek(0)
+    recording.name = "recording.wav"
+    return recording
+
+
+def simulated_transcribe(args):
+    async def transcribe(recording: io.BytesIO) -> str:
+        with wave.open(recording, "rb") as wav_file:
+            audio_seconds = wav_file.getnframes() / wav_file.getframerate()
+        await asyncio.sleep(args.stt_round_trip + args.stt_seconds_per_audio_second * audio_seconds)
+        return "simulated transcript"
+
+    return transcribe
+
+
+async def upload_then_transcribe(pcm: bytes, args) -> float:
+    """Latency of the upload path: upload after the user stopped, then transcribe."""
+    transcribe = llm_tools.transcribe_recording if args.live else simulated_transcribe(args)
+    recording = as_wav(pcm)
+    stop = time.perf_counter()
+    await asyncio.sleep(args.rtt + len(recording.getbuffer()) * 8 / (args.uplink_mbit * 1e6))
+    await transcribe(recording)
+    return time.perf_counter() - stop
+
+
+async def stream_then_finish(pcm: bytes, transcriber: StreamingTranscriber) -> float:
+    """Latency of the streaming path: the audio is fed in real time while the user talks."""
+    chunk_bytes = int(CHUNK_SECONDS * STREAMING_AUDIO_CONFIG.sample_rate) * STREAMING_AUDIO_CONFIG.sample_width
+    await transcriber.start()
+    for offset in range(0, len(pcm), chunk_bytes):
+        await transcriber.append(pcm[offset : offset + chunk_bytes])
+        await asyncio.sleep(CHUNK_SECONDS)
+    stop = time.perf_counter()
+    await transcriber.finish()
+    latency = time.perf_counter() - stop
+    await transcriber.close()
+    return latency
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="User-stop to transcript-ready latency.")
+    parser.add_argument("--live", action="store_true", help="Use the OpenAI APIs instead of simulated ones.")
+    parser.add_argument("--wav", type=str, help="Recording to use (PCM16 mono 24 kHz WAV).")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the simulated speech without --wav.")
+    parser.add_argument("--uplink_mbit", type=float, default=2.0, help="Upload bandwidth of the client in Mbit/s.")
+    parser.add_argument("--rtt", type=float, default=0.08, help="Round trip time client to server in seconds.")
+    parser.add_argument("--stt_round_trip", type=float, default=0.6, help="Simulated STT round trip in seconds.")
+    parser.add_argument("--stt_seconds_per_audio_second", type=float, default=0.05)
+    args = parser.parse_args()
+    pcm = load_pcm(args)
+
+    def buffered():
+        if args.live:
+            return BufferedStreamingTranscriber()
+        return BufferedStreamingTranscriber(transcribe=simulated_transcribe(args))
+
+    paths = {
+        "upload": lambda: upload_then_transcribe(pcm, args),
+        "buffered": lambda: stream_then_finish(pcm, buffered()),
+    }
+    if args.live:
+        paths["realtime"] = lambda: stream_then_finish(pcm, RealtimeStreamingTranscriber())
+
+    audio_seconds = len(pcm) / (STREAMING_AUDIO_CONFIG.sample_rate * STREAMING_AUDIO_CONFIG.sample_width)
+    print(f"{audio_seconds:.1f}s of audio, {'live APIs' if args.live else 'simulated APIs'}")
+    print(f"{'path':>10} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, run in paths.items():
+        latencies = sorted([await run() for _ in range(REPETITIONS)])
+        if name != "upload":
+            # the end of speech message still needs half a round trip to reach the server
+            latencies = [latency + args.rtt / 2 for latency in latencies]
+        print(
+            f"{name:>10} {1000 * latencies[len(latencies) // 2]:>10.0f} {1000 * latencies[0]:>8.0f} "
+            f"{1000 * latencies[-1]:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,12 +2,16 @@
 A simple numpy based in-memory vector store for small datasets, storing and searching embeddings.
 """
 
+import json
+import logging
 import os
 import pickle
 from typing import Iterator
 
 import numpy as np
 import openai
+from nevo_framework.retrieval import index_format
+from pydantic import BaseModel, ConfigDict
 
 """
 Loading a file
@@ -17,6 +21,20 @@ Loading a file
 - When searching, filter for the car model and the search the embeddings; car model is stored in the 'vehicle_mdoel' field
 """
 
+
+class ContentSnippet(BaseModel):
+    """A knowledge base entry. Only the fields used for searching are declared, all others are kept as they are."""
+
+    model_config = ConfigDict(extra="allow")
+
+    vehicle_model: str
+    response: str
+
+
+class KnowledgeBase(BaseModel):
+    content: list[ContentSnippet] = []
+
+
 openai_client = openai.OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
     timeout=60
@@ -93,11 +111,10 @@ class VectorDB:
                     responses.append(document.response)
         
         embeddings = embedding_computer.get_embeddings(responses)
-                    
-        for i,document in enumerate(documents.content):            
-            document.embedding = embeddings[i]
 
         self.documents = documents
+        # one row per snippet, kept out of the snippets so it can be stored (and memory-mapped) as one matrix
+        self.embeddings = np.array(embeddings, dtype=np.float32)
 
 
     def search_with_embedding(
@@ -114,16 +131,14 @@ class VectorDB:
             (Iterator[tuple[str, float]]): Documents and similarity scores of the vector search.
         """
         
-        if car_model is None:
-            filtered_documents = [doc for doc in self.documents.content]
-        else:
-            filtered_documents = [doc for doc in self.documents.content if car_model in doc.vehicle_model]
-        
-        embeddings = np.array([doc.embedding for doc in filtered_documents])
+        rows = [
+            i for i, doc in enumerate(self.documents.content) if car_model is None or car_model in doc.vehicle_model
+        ]
+        filtered_documents = [self.documents.content[i] for i in rows]
 
         indices, scores = _vector_search(
             np.array(query_embedding),
-            embeddings_matrix=embeddings,
+            embeddings_matrix=self.embeddings[rows],
             num_results=num_results,
             result_offset=result_offset,
         )
@@ -147,26 +162,39 @@ class VectorDB:
         return self.search_with_embedding(query_embedding, num_results=num_results, result_offset=result_offset, car_model=car_model)
 
     def store_to_disk(self, path: str) -> None:
-        """Store the VectorDB to disk using pickle.
+        """Store the VectorDB to disk as an index directory (see `nevo_framework.retrieval.index_format`).
 
         Parameters
-            path (str): Path to store the VectorDB.
+            path (str): Directory to store the VectorDB in.
         """
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        records = [document.model_dump(mode="json", exclude={"embedding"}) for document in self.documents.content]
+        index_format.write_index(path, self.embeddings, records, self.embedding_computer.model, normalized=False)
 
     @staticmethod
     def load_from_disk(path: str) -> "VectorDB":
-        """Load the VectorDB from disk.
+        """Load the VectorDB from disk. The embedding matrix is memory-mapped, not read.
+
+        Pickled VectorDBs (`.pkl` files) of earlier versions are still loaded.
 
         Parameters
-            path (str): Path to load the VectorDB.
+            path (str): Index directory (or pickle file) to load the VectorDB from.
 
         Returns
-            (VectorDB2): The loaded VectorDB.
+            (VectorDB): The loaded VectorDB.
         """
-        with open(path, "rb") as f:
-            return pickle.load(f)
+        if path.endswith(".pkl"):
+            logging.warning(f"Loading pickled vector index {path}, store it again to convert it to an index directory.")
+            with open(path, "rb") as f:
+                vectordb = pickle.load(f)
+            if not hasattr(vectordb, "embeddings"):
+                vectordb.embeddings = np.array([doc.embedding for doc in vectordb.documents.content], dtype=np.float32)
+            return vectordb
+        header, vectors, records = index_format.read_index(path)
+        vectordb = VectorDB.__new__(VectorDB)
+        vectordb.embedding_computer = EmbeddingComputer(model=header.embedding_model)
+        vectordb.documents = KnowledgeBase(content=[ContentSnippet.model_validate(record) for record in records])
+        vectordb.embeddings = vectors
+        return vectordb
 
 
 def main():
@@ -185,9 +213,9 @@ def main():
         print(f"Document: {doc.response}, Score: {score}")
 
     print("Storing and loading from disk...")
-    with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
-        vectordb.store_to_disk(f.name)
-        vectordb_loaded = VectorDB.load_from_disk(f.name)
+    with tempfile.TemporaryDirectory() as directory:
+        vectordb.store_to_disk(os.path.join(directory, "index"))
+        vectordb_loaded = VectorDB.load_from_disk(os.path.join(directory, "index"))
         results_loaded = vectordb_loaded.search_with_query(query)
         for doc, score in results_loaded:
             print(f"Document: {doc.response}, Score: {score}")
@@ -1,16 +1,19 @@
 import argparse
 import asyncio
 import datetime
+import io
+import json
 import logging
 import logging.handlers
 import os
 import re
-import uuid
+import signal
+import sys
+import time
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from typing import Any
 
-import bcrypt  # Use bcrypt for password hashing
 import jwt
 import pydantic
 from dotenv import load_dotenv
@@ -33,11 +36,28 @@ from fastapi.websockets import WebSocketState
 
 import nevo_framework.api.api_helpers as api_helpers
 import nevo_framework.api.server_messages as server_messages
-from nevo_framework.api.server_messages import AudioUploadReady, WebElementMessage
+from nevo_framework.api.server_messages import (
+    AudioUploadReady,
+    ClientDisconnected,
+    TranscribedAudio,
+    TranscriptionFailed,
+    WebElementMessage,
+)
+from nevo_framework.api import audio_ingest, password_verification, workers
+from nevo_framework.api.output_channel import OUTPUT_AUDIO_CONFIG, OutputChannel, OutputChannelClosed
 from nevo_framework.api.sessions import SessionState, get_session_state, session_cleanup, store_session_state
 from nevo_framework.config.master_config import get_master_config
-from nevo_framework.helpers.logging_helpers import DIALOG_STEP_ENDED, LogAi
+from nevo_framework.helpers import logging_helpers
+from nevo_framework.helpers.logging_helpers import DIALOG_STEP_ENDED, LogAi, LogTiming
+from nevo_framework.llm import http_pool, llm_scheduler
 from nevo_framework.llm.dialog_manager import DialogManager
+from nevo_framework.llm.streaming_transcription import (
+    StreamingTranscriber,
+    UtteranceTooLong,
+    create_streaming_transcriber,
+    utterance_limit_bytes,
+)
+from nevo_framework.retrieval import index_registry
 
 QUEUE_TIMEOUT__OUTPUT_DATA = 2 * 60
 
@@ -45,12 +65,6 @@ CONFIG = get_master_config()
 parser = argparse.ArgumentParser(description="Start the API server.")
 
 
-# Define the custom filter
-class AILogFilter(logging.Filter):
-    def filter(self, record):
-        return record.getMessage().startswith("<<<AI>>>")
-
-
 # hashed password generated using bcrypt
 # If HASHED_PASSWORD is not set or invalid, use fixed hash for password "test123" (matches local setup)
 # This hash is from LOCAL_SETUP_GUIDE.md - DO NOT regenerate, use this exact hash
@@ -70,15 +84,46 @@ load_dotenv()
 async def lifespan(app: FastAPI):
 
     api_helpers.setup_ai_logging()
+    # From here on, log records are written by a background thread instead of the event loop
+    log_listener = logging_helpers.start_queue_logging(CONFIG.debug_log_sample_rate) if CONFIG.async_logging else None
+
+    # Load the indexes the application registered (e.g. RAG vector stores) before the first login needs them,
+    # and open connections to the LLM APIs so the first dialog step does not wait for the handshakes
+    await asyncio.gather(
+        asyncio.to_thread(index_registry.preload_registered_indexes),
+        http_pool.prewarm(
+            CONFIG.language_model_config.client.values(),
+            CONFIG.http_pool.prewarm_connections,
+            CONFIG.http_pool.prewarm_timeout_seconds,
+        ),
+    )
 
     # Start the session cleanup task
     asyncio.create_task(session_cleanup())
     yield
 
+    await http_pool.close()
+    if log_listener:
+        log_listener.stop()
+
 
 enable_docs = os.getenv("ENABLE_DOCS", "false").lower() == "true"
 app = FastAPI(docs_url="/readme_images" if enable_docs else None, redoc_url=None, lifespan=lifespan)
 
+
+# registered before the CORS middleware, so that CORS wraps it and the browser can read the rejection
+@app.middleware("http")
+async def limit_audio_upload_size(request: Request, call_next):
+    """
+    Rejects audio uploads above `max_audio_upload_bytes` before their body is read and parsed.
+    """
+    if request.method == "POST" and request.url.path == "/receive_audio_blob":
+        content_length = request.headers.get("content-length")
+        if rejection := audio_ingest.check_content_length(content_length, CONFIG.max_audio_upload_bytes):
+            logging.warning(f"Audio upload rejected with {rejection.status_code}, Content-Length {content_length}.")
+            return rejection
+    return await call_next(request)
+
 # Configure CORS if frontend is on a different domain or port
 # Use explicit origins when credentials are enabled (required for CORS with credentials)
 # When allow_credentials=True, browsers reject wildcard '*' - must use specific origins
@@ -157,17 +202,28 @@ async def track_session_last_activity(request: Request, call_next):
         else:
             logging.warning(f"Session activity tracker: Session not found for session: {session_id}")
     else:
-        logging.warning(f"Session ID not found in cookies: {request.cookies}")
+        logging.debug(f"Session ID not found in cookies: {request.cookies}")
     response = await call_next(request)
     return response
 
 
 @app.post("/login")
 @app.post("/login/{modality}")
-async def login(request: Request, response: Response, password: str = Body(..., embed=True), modality: str = "audio"):
+async def login(
+    request: Request,
+    response: Response,
+    password: str | None = Body(None, embed=True),
+    login_ticket: str | None = Body(None, embed=True),
+    modality: str = "audio",
+):
     """
     Login endpoint. Verifies the password and returns a JWT token and session ID.
     Creates the session state for the user.
+
+    Instead of the password, the login ticket returned by a previous password login can be sent (in the body or as
+    cookie) to log in again without the expensive password check, e.g. when reconnecting. A ticket can be used once,
+    and a ticket login does not return a new ticket. With several workers, only the cookie routes the login to the
+    worker that issued the ticket.
     """
 
     logging.info(f"Login attempt with modality: {modality}")
@@ -178,10 +234,18 @@ async def login(request: Request, response: Response, password: str = Body(...,
             detail=f"Invalid modality '{modality}'. Supported modalities are 'audio' and 'text'.",
         )
 
-    if bcrypt.checkpw(password.encode("utf-8"), stored_hashed_password):
+    login_ticket = login_ticket or request.cookies.get("login_ticket")
+    if password is not None:
+        logged_in = await password_verification.check_password(password, stored_hashed_password)
+    elif login_ticket is not None:
+        logged_in = await password_verification.check_login_ticket(login_ticket)
+    else:
+        logged_in = False
+
+    if logged_in:
         expiration = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
         token = jwt.encode({"exp": expiration}, api_helpers.JWT_SECRET_KEY, algorithm=api_helpers.ALGORITHM)
-        session_id = str(uuid.uuid4())
+        session_id = workers.new_session_id()
         # Set JWT and session ID as HTTP-only cookies
         # For cross-origin requests (frontend and backend on different domains), we need:
         # - Secure=True (required when SameSite=None)
@@ -202,8 +266,31 @@ async def login(request: Request, response: Response, password: str = Body(...,
             secure=is_azure,  # True for HTTPS (Azure), False for HTTP (local)
             samesite="none" if is_azure else "lax"  # None for cross-origin (Azure), lax for same-origin (local)
         )
+        if password is not None:
+            new_login_ticket = password_verification.create_login_ticket()
+            response.set_cookie(
+                key="login_ticket",
+                value=new_login_ticket,
+                httponly=True,
+                secure=is_azure,
+                samesite="none" if is_azure else "lax",
+                max_age=int(CONFIG.login_ticket_minutes * 60),
+            )
+        else:
+            # the ticket was used up; the next login needs the password
+            new_login_ticket = None
+            response.delete_cookie(
+                key="login_ticket", httponly=True, secure=is_azure, samesite="none" if is_azure else "lax"
+            )
         input_queue = asyncio.Queue()
-        output_queue = asyncio.Queue()
+        output_queue = OutputChannel(
+            high_watermark_bytes=int(
+                CONFIG.output_audio_high_watermark_seconds * OUTPUT_AUDIO_CONFIG.bytes_per_second
+            ),
+            low_watermark_bytes=int(CONFIG.output_audio_low_watermark_seconds * OUTPUT_AUDIO_CONFIG.bytes_per_second),
+            max_droppable_messages=CONFIG.output_max_status_messages,
+            max_ordered_items=CONFIG.output_max_queued_items,
+        )
         dialog_manager = DialogManager(output_queue=output_queue, chat_modality=modality)
         store_session_state(
             SessionState(
@@ -214,17 +301,17 @@ async def login(request: Request, response: Response, password: str = Body(...,
             )
         )
         logging.info(f"Login successful. New session created with ID {session_id}. Modality is {modality}.")
-        return {"message": "Logged in", "token": token, "session_id": session_id}
+        return {"message": "Logged in", "token": token, "session_id": session_id, "login_ticket": new_login_ticket}
     else:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
 
 
 @app.post("/respond")
 async def web_element_respond(
-    token: dict = Depends(api_helpers.get_and_check_token_from_cookies),
-    session_state: SessionState = Depends(api_helpers.get_session_state_from_cookies),
+    auth: api_helpers.AuthenticatedSession = Depends(api_helpers.get_authenticated_session),
     payload: dict = Body(...),
 ):
+    session_state = auth.session_state
     if not session_state.accept_client_data:
         raise HTTPException(
             status_code=status.HTTP_412_PRECONDITION_FAILED,
@@ -256,6 +343,11 @@ async def websocket_audio_endpoint(
     else:
         ai_speaks_first = CONFIG.ai_speaks_first
 
+    if not workers.is_owned_by_this_worker(session_id):
+        logging.warning(f"Websocket for session {session_id} reached worker {workers.worker_id()}, which does not own it.")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     session_state = get_session_state(session_id)
 
     if session_state is None:
@@ -268,12 +360,15 @@ async def websocket_audio_endpoint(
         logging.warning(f"Session not found for the given ID: {session_id}.")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session not found for the given ID.")
 
+    streamed_audio_task: asyncio.Task | None = None
     try:
         await websocket.accept()
         logging.info(f"WebSocket connection established. Session ID: {session_id}")
         assert session_state.id == session_id, "Session ID must match the session state."
         session_state.websocket = websocket
-        
+        # LLM calls of this connection (and the tasks it starts) are queued fairly per session
+        llm_scheduler.set_session(session_id)
+
         # Set session_id in orchestrator if it has a set_session_id method (for Shop version)
         try:
             orchestrator = session_state.dialog_manager._agent_orchestrator
@@ -295,6 +390,9 @@ async def websocket_audio_endpoint(
         # only after the client connects to the websocket, we accept data
         session_state.accept_client_data = True
 
+        if CONFIG.streaming_transcription != "off":
+            streamed_audio_task = asyncio.create_task(receive_streamed_audio(websocket, session_state))
+
         while True:
             if websocket.client_state != WebSocketState.CONNECTED:
                 logging.info(f"Websocket disconnected for session {session_id}")
@@ -307,19 +405,40 @@ async def websocket_audio_endpoint(
             # do not accept more data while the server is processing
             session_state.accept_client_data = False
             if isinstance(frontend_message, AudioUploadReady):
-                logging.info(f"Recording file ready for session {session_id}: {frontend_message.audio_file_path}")
+                logging.info(f"Recording ready for session {session_id}: {frontend_message.audio_file_path or 'in memory'}")
                 await handle_dialog_step(
                     websocket=websocket,
                     recording_file_path=frontend_message.audio_file_path,
                     web_element_message=None,
                     session_state=session_state,
+                    recording_buffer=frontend_message.audio_buffer,
                 )
                 # delete the audio recording file after processing
-                try:
-                    os.remove(frontend_message.audio_file_path)
-                    logging.info(f"Deleted recording file: {frontend_message.audio_file_path}")
-                except Exception as e:
-                    logging.error(f"Failed to delete recording file {frontend_message.audio_file_path}: {e}")
+                if frontend_message.audio_file_path:
+                    try:
+                        os.remove(frontend_message.audio_file_path)
+                        logging.info(f"Deleted recording file: {frontend_message.audio_file_path}")
+                    except Exception as e:
+                        logging.error(f"Failed to delete recording file {frontend_message.audio_file_path}: {e}")
+            elif isinstance(frontend_message, TranscribedAudio):
+                logging.info(f"Handling transcribed audio for session {session_id}: {frontend_message}")
+                await session_state.output_queue.put(
+                    server_messages.TranscriptionCompletedMessage(content=frontend_message.content)
+                )
+                await handle_dialog_step(
+                    websocket=websocket,
+                    recording_file_path=None,
+                    web_element_message=None,
+                    session_state=session_state,
+                    transcribed_user_message=frontend_message.content,
+                )
+            elif isinstance(frontend_message, TranscriptionFailed):
+                await api_helpers.send_pydantic(
+                    websocket, server_messages.EndOfDialogStepMessage(server_error=frontend_message.server_error)
+                )
+            elif isinstance(frontend_message, ClientDisconnected):
+                logging.info(f"Websocket disconnected for session {session_id}")
+                break
             elif isinstance(frontend_message, WebElementMessage):
                 logging.info(f"Handling web element message for session {session_id}: {frontend_message}")
                 await handle_dialog_step(
@@ -336,10 +455,95 @@ async def websocket_audio_endpoint(
     except WebSocketDisconnect:
         logging.info(f"WebSocket disconnected for session {session_id} (WebSocketDisconnect exception)")
     finally:
+        if streamed_audio_task is not None:
+            streamed_audio_task.cancel()
         logging.info(f"Marking session {session_id} for removal.")
         session_state.accept_client_data = False
+        # nobody will read the output any more: fail producers still waiting for the client
+        if isinstance(session_state.output_queue, OutputChannel):
+            session_state.output_queue.close()
         # mark the session for removal
-        session_state.kill_session = True
+        session_state.mark_for_removal()
+
+
+async def receive_streamed_audio(websocket: WebSocket, session_state: SessionState):
+    """
+    Receives the user's speech streamed over the websocket while the user is talking: binary messages with PCM16 audio,
+    followed by a {"type": "end_of_speech"} text message. The audio is fed to a streaming transcriber as it arrives,
+    and the transcript is put on the input queue at the end of speech.
+
+    An utterance longer than `max_audio_upload_bytes` or `max_audio_upload_seconds`, or one the transcriber fails on,
+    is ended with an error; the rest of its audio is discarded up to the end of speech. Errors are put on the input
+    queue as `TranscriptionFailed`, so only the dialog loop writes to the websocket.
+    """
+    transcriber: StreamingTranscriber | None = None
+    max_bytes = utterance_limit_bytes(CONFIG.max_audio_upload_bytes, CONFIG.max_audio_upload_seconds)
+    discarding = False
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if (audio := message.get("bytes")) is not None:
+                if not session_state.accept_client_data:
+                    continue  # the AI is responding, the audio is not meant for us
+                if discarding:
+                    continue  # the utterance was too long, see below
+                try:
+                    if transcriber is None:
+                        transcriber = create_streaming_transcriber(CONFIG.streaming_transcription, max_bytes=max_bytes)
+                        await transcriber.start()
+                    await transcriber.append(audio)
+                except UtteranceTooLong as e:
+                    logging.warning(f"Streamed audio of session {session_state.id} rejected: {e}")
+                    await transcriber.close()
+                    transcriber = None
+                    discarding = True
+                    session_state.input_queue.put_nowait(TranscriptionFailed(server_error="Recording too long."))
+                except Exception as e:
+                    # a failing transcription service ends the utterance, not the session
+                    logging.error(f"Streaming transcription failed for session {session_state.id}: {e}")
+                    if transcriber is not None:
+                        await transcriber.close()
+                        transcriber = None
+                    discarding = True
+                    session_state.input_queue.put_nowait(TranscriptionFailed(server_error="Transcription failed."))
+            elif (text := message.get("text")) is not None:
+                try:
+                    message_type = json.loads(text).get("type")
+                except (json.JSONDecodeError, AttributeError):
+                    message_type = None
+                if message_type != "end_of_speech":
+                    logging.warning(f"Unexpected websocket message for session {session_state.id}: {text}")
+                    continue
+                if discarding:
+                    discarding = False
+                    continue
+                if transcriber is None:
+                    logging.warning(f"End of speech without streamed audio for session {session_state.id}.")
+                    continue
+                end_of_speech = time.perf_counter()
+                # no dialog step may start while the transcript is pending; the dialog loop accepts data again
+                # after it handled the transcript (or the error)
+                session_state.accept_client_data = False
+                try:
+                    transcript = await transcriber.finish()
+                except Exception as e:
+                    logging.error(f"Streaming transcription failed for session {session_state.id}: {e}")
+                    session_state.input_queue.put_nowait(TranscriptionFailed(server_error="Transcription failed."))
+                    continue
+                finally:
+                    await transcriber.close()
+                    transcriber = None
+                latency = time.perf_counter() - end_of_speech
+                logging.info(LogTiming(f"streaming_transcription:end_of_speech_to_transcript {latency:.3f}s"))
+                session_state.input_queue.put_nowait(TranscribedAudio(content=transcript))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if transcriber is not None:
+            await transcriber.close()
+        session_state.input_queue.put_nowait(ClientDisconnected())
 
 
 async def handle_dialog_step(
@@ -347,6 +551,8 @@ async def handle_dialog_step(
     recording_file_path: str | None,
     web_element_message: dict | None,
     session_state: SessionState,
+    recording_buffer: io.BytesIO | None = None,
+    transcribed_user_message: str | None = None,
 ):
     """
     Initiate an "audio chat cycle":
@@ -359,6 +565,8 @@ async def handle_dialog_step(
         websocket (WebSocket): WebSocket connection.
         recording_file_path (str): Path to the uploaded audio recording.
         dialog_manager (AgentOrchestrator): The dialog manager that handles the AI processing.
+        recording_buffer (io.BytesIO): The uploaded audio recording in memory, used instead of recording_file_path.
+        transcribed_user_message (str): The transcript of audio streamed by the user, used instead of a recording.
     """
     assert session_state.dialog_manager is not None
 
@@ -366,23 +574,34 @@ async def handle_dialog_step(
     async def streaming_ai_tasks():
         audio_response_task = asyncio.create_task(
             session_state.dialog_manager.dialog_step(
-                recording_file_path=recording_file_path, web_element_message=web_element_message
+                recording_file_path=recording_file_path,
+                web_element_message=web_element_message,
+                recording_buffer=recording_buffer,
+                transcribed_user_message=transcribed_user_message,
             )
         )
-        await asyncio.gather(audio_response_task)
+        try:
+            await asyncio.gather(audio_response_task)
+        except OutputChannelClosed:
+            logging.info(f"Dialog step of session {session_state.id} stopped, the client disconnected.")
 
     asyncio.create_task(streaming_ai_tasks())
+    output_queue = session_state.dialog_manager.get_output_queue()
     try:
         # wait for data created by the streaming dialog step chain
         while True:
-            data = await asyncio.wait_for(
-                session_state.dialog_manager.get_output_queue().get(), timeout=QUEUE_TIMEOUT__OUTPUT_DATA
-            )
+            data = await asyncio.wait_for(output_queue.get(), timeout=QUEUE_TIMEOUT__OUTPUT_DATA)
             # important to keep the session alive when the AI is streaming long answers
             session_state.set_was_active()
+            send_start = time.perf_counter()
             if data == DIALOG_STEP_ENDED:
                 # If we are at the end of the dialog step we break out of the loop as we don't have more messages or audio chunks to send.
                 logging.info(f"handle_dialog_step: received DIALOG_STEP_ENDED signal for session {session_state.id}")
+                if isinstance(output_queue, OutputChannel):
+                    # status messages are only sent when nothing else is waiting, send the remaining ones now
+                    for message in output_queue.take_droppable():
+                        await api_helpers.send_pydantic(websocket, message)
+                    logging.info(LogTiming(f"output_channel:{session_state.id} {output_queue.metrics}"))
                 await api_helpers.send_pydantic(websocket, server_messages.EndOfDialogStepMessage())
                 break
             elif isinstance(data, bytes):
@@ -396,6 +615,8 @@ async def handle_dialog_step(
                     f"streaming_dialogue_step: Unexpected data in output stream for session {session_state.id}: {data}"
                 )
                 raise RuntimeError(f"Unexpected data in output stream: {data}")
+            if isinstance(output_queue, OutputChannel):
+                output_queue.record_send(time.perf_counter() - send_start)
     except asyncio.TimeoutError:
         logging.error(
             f"streaming_dialogue_step: TimeoutError on waiting for audio chunks for session {session_state.id}"
@@ -408,53 +629,64 @@ async def handle_dialog_step(
 @app.post("/receive_audio_blob")
 async def recieve_audio_blob(
     file: UploadFile = File(...),
-    token: dict = Depends(api_helpers.get_and_check_token_from_cookies),
-    session_state: SessionState = Depends(api_helpers.get_session_state_from_cookies),
+    auth: api_helpers.AuthenticatedSession = Depends(api_helpers.get_authenticated_session),
 ):
     """
     Endpoint for uploading audio files (user's recorded message) to the server.
     """
+    session_state = auth.session_state
     if not session_state.accept_client_data:
         raise HTTPException(
             status_code=status.HTTP_412_PRECONDITION_FAILED,
             detail="Audio upload not allowed before websocket connection or during processing of a dialog step.",
         )
     try:
-        os.makedirs(CONFIG.recording_file_dir, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
-        recording_file_path = os.path.join(CONFIG.recording_file_dir, f"audio-input_{session_state.id}_{timestamp}.wav")
-        with open(recording_file_path, "wb") as f:
-            contents = await file.read()
-            f.write(contents)
-        logging.info(f"Audio received and saved to {recording_file_path} (session ID: {session_state.id}).")
-        session_state.input_queue.put_nowait(AudioUploadReady(audio_file_path=recording_file_path))
+        recording = await audio_ingest.read_upload(file, max_bytes=CONFIG.max_audio_upload_bytes)
+        audio_ingest.check_duration(recording, max_seconds=CONFIG.max_audio_upload_seconds)
+        if CONFIG.audio_ingest_mode == "disk" or CONFIG.has_debug_flag("store_audio"):
+            os.makedirs(CONFIG.recording_file_dir, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+            extension = os.path.splitext(recording.name)[1]
+            recording_file_path = os.path.join(
+                CONFIG.recording_file_dir, f"audio-input_{session_state.id}_{timestamp}{extension}"
+            )
+            await audio_ingest.store_recording(recording, recording_file_path)
+            logging.info(f"Audio received and saved to {recording_file_path} (session ID: {session_state.id}).")
+        if CONFIG.audio_ingest_mode == "disk":
+            upload = AudioUploadReady(audio_file_path=recording_file_path)
+        else:
+            # with the store_audio debug flag, the stored file is kept for inspection
+            logging.info(f"Audio received, {recording.getbuffer().nbytes} bytes (session ID: {session_state.id}).")
+            upload = AudioUploadReady(audio_buffer=recording)
+        session_state.input_queue.put_nowait(upload)
         return {"success": True}
+    except HTTPException:
+        raise
     except Exception as e:
-        return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Audio upload failed.")
+        logging.error(f"Audio upload failed for session {session_state.id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Audio upload failed.")
 
 
 @app.get("/stop")
 async def stop(
-    token: dict = Depends(api_helpers.get_and_check_token_from_cookies),
-    session_state: SessionState = Depends(api_helpers.get_session_state_from_cookies),
+    auth: api_helpers.AuthenticatedSession = Depends(api_helpers.get_authenticated_session),
 ):
     """
     Endpoint to stop the AI and close the session.
     """
-    session_state.kill_session = True
-    logging.info(f"Session {session_state.id} marked for removal.")
+    auth.session_state.mark_for_removal()
+    logging.info(f"Session {auth.session_state.id} marked for removal.")
     return {"message": "Session closed."}
 
 
 @app.get("/test")
 async def test(
-    token: dict = Depends(api_helpers.get_and_check_token_from_cookies),
-    session_state: SessionState = Depends(api_helpers.get_session_state_from_cookies),
+    auth: api_helpers.AuthenticatedSession = Depends(api_helpers.get_authenticated_session),
 ):
     """
     Simple endpoint for testing the API.
     """
-    return {"message": f"Test successful, token first 3 chars: {token[:3]}, session ID: {session_state.id}"}
+    return {"message": f"Test successful, token first 3 chars: {auth.token[:3]}, session ID: {auth.session_state.id}"}
 
 
 def validate_orchestrator_class():
@@ -514,6 +746,20 @@ def main():
     parser.add_argument(
         "--user_first", action="store_true", help="User speaks first in the dialog, regardless of config setting."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes. With more than one, a reverse proxy on the public port forwards each "
+        "session to the worker that owns it, and the workers listen on the ports directly above.",
+    )
+    parser.add_argument(
+        "--router",
+        choices=["nginx", "python"],
+        default=None,
+        help="Reverse proxy in front of multiple workers: nginx (default if installed), or the Python router, which "
+        "forwards every request and websocket frame in one process and is meant for development.",
+    )
     args = parser.parse_args()
     if args.reload:
         print("Uvicorn auto-reload enabled!")
@@ -543,6 +789,33 @@ def main():
 
     validate_orchestrator_class()
 
+    if args.workers > 1:
+        from nevo_framework.api import worker_router
+
+        assert not args.reload, "Auto-reload is not supported with multiple workers."
+        router = args.router or ("nginx" if workers.nginx_available() else "python")
+        print(f"Starting {args.workers} workers behind {router} on port {port}.")
+        workers.start_workers(args.workers, base_port=port, log_config="config/log-server.ini")
+        if router == "nginx":
+            # room for the multipart encoding around the largest accepted recording
+            max_body_bytes = CONFIG.max_audio_upload_bytes + 64 * 1024
+            nginx = workers.start_nginx(args.workers, port, max_body_bytes, directory=os.path.join("temp", "nginx"))
+            # exit normally on SIGTERM, so that nginx is stopped and the (daemon) workers are terminated
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            try:
+                nginx.wait()
+            finally:
+                nginx.terminate()
+            return
+        logging.warning("The Python router forwards all traffic in one process; use nginx in production.")
+        uvicorn.run(
+            worker_router.create_router_app(args.workers, base_port=port),
+            host="0.0.0.0",
+            port=port,
+            log_config="config/log-server.ini",
+        )
+        return
+
     uvicorn.run(
         "nevo_framework.api.api:app",
         host="0.0.0.0",
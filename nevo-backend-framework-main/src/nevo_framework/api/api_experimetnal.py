@@ -338,7 +338,7 @@ async def websocket_audio_endpoint(
         logging.info(f"Marking session {session_id} for removal.")
         session_state.accept_client_data = False
         # mark the session for removal
-        session_state.kill_session = True
+        session_state.mark_for_removal()
         if realtime_transcription_task is not None:
             realtime_transcription_task.cancel()
             await realtime_transcription_task
@@ -465,7 +465,7 @@ async def stop(
     """
     Endpoint to stop the AI and close the session.
     """
-    session_state.kill_session = True
+    session_state.mark_for_removal()
     logging.info(f"Session {session_state.id} marked for removal.")
     return {"message": "Session closed."}
 
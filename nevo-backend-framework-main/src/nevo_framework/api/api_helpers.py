@@ -1,15 +1,41 @@
 import logging
 import os
+import time
+from dataclasses import dataclass
 
 import jwt
 import pydantic
+from cachetools import TLRUCache
 from fastapi import HTTPException, Request, WebSocket, status
 
+from nevo_framework.api import workers
 from nevo_framework.api.sessions import SessionState, get_session_state
+from nevo_framework.helpers.logging_helpers import LOGMARKER_AI, MarkerFilter
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 
+# maximum number of verified tokens kept in the cache
+VERIFIED_TOKEN_CACHE_SIZE = 4096
+
+
+def _token_expiry(token: str, payload: dict, now: float) -> float:
+    # tokens without expiry are not cached
+    return payload.get("exp", now)
+
+
+# verified token -> decoded payload; a token is evicted when it expires, so a cached token is always still valid
+_verified_tokens: TLRUCache = TLRUCache(maxsize=VERIFIED_TOKEN_CACHE_SIZE, ttu=_token_expiry, timer=time.time)
+
+
+@dataclass
+class AuthenticatedSession:
+    """The verified token and the session of a request, see `get_authenticated_session`."""
+
+    token: str
+    token_payload: dict
+    session_state: SessionState
+
 
 async def get_and_check_token_from_cookies_ws(websocket: WebSocket):
     # Try to get token from cookies first (same-origin)
@@ -31,14 +57,14 @@ async def get_and_check_token_from_cookies_ws(websocket: WebSocket):
 
 
 async def get_and_check_token_from_cookies(request: Request) -> str:
-    logging.info(f"Request cookies: {request.cookies}, getting token.")  # Changed to INFO for debugging
+    logging.debug(f"Request cookies: {request.cookies}, getting token.")
     token = request.cookies.get("access_token")
     if not token:
         # Also check Authorization header as fallback for cross-origin requests
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.replace("Bearer ", "")
-            logging.info(f"Token found in Authorization header instead of cookies")
+            logging.debug(f"Token found in Authorization header instead of cookies")
         else:
             logging.error(f"Token missing from both cookies and Authorization header. Cookies: {request.cookies}")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token missing")
@@ -47,13 +73,13 @@ async def get_and_check_token_from_cookies(request: Request) -> str:
 
 
 async def get_session_id_from_cookies(request: Request) -> str:
-    logging.info(f"Request cookies: {request.cookies}, getting session id.")  # Changed to INFO for debugging
+    logging.debug(f"Request cookies: {request.cookies}, getting session id.")
     session_id = request.cookies.get("session_id")
     if not session_id:
         # Fallback: check X-Session-ID header for cross-origin requests
         session_id = request.headers.get("X-Session-ID")
         if session_id:
-            logging.info(f"Session ID found in X-Session-ID header instead of cookies")
+            logging.debug(f"Session ID found in X-Session-ID header instead of cookies")
         else:
             logging.error(f"Session ID missing from both cookies and X-Session-ID header. Cookies: {request.cookies}")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session ID missing")
@@ -61,34 +87,79 @@ async def get_session_id_from_cookies(request: Request) -> str:
 
 
 async def get_session_state_from_cookies(request: Request) -> SessionState:
-    logging.info(f"Request cookies: {request.cookies}, getting session id.")  # Changed to INFO for debugging
+    logging.debug(f"Request cookies: {request.cookies}, getting session id.")
     session_id = request.cookies.get("session_id")
     if not session_id:
         # Fallback: check X-Session-ID header for cross-origin requests
         session_id = request.headers.get("X-Session-ID")
         if session_id:
-            logging.info(f"Session ID found in X-Session-ID header instead of cookies")
+            logging.debug(f"Session ID found in X-Session-ID header instead of cookies")
         else:
             logging.error(f"Session ID missing from both cookies and X-Session-ID header. Cookies: {request.cookies}")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session ID missing")
+    if not workers.is_owned_by_this_worker(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_421_MISDIRECTED_REQUEST,
+            detail=f"Session {session_id} is not owned by worker {workers.worker_id()}.",
+        )
     if session := get_session_state(session_id):
         return session
     else:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session not found for the given ID.")
 
 
+async def get_authenticated_session(request: Request) -> AuthenticatedSession:
+    """
+    Dependency resolving the token and the session of a request in one go: reads the token from the cookies or the
+    Authorization header and the session ID from the cookies or the X-Session-ID header, verifies the token and looks
+    up the session.
+    """
+    cookies = request.cookies
+    token = cookies.get("access_token")
+    if not token:
+        auth_header = request.headers.get("Authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header[len("Bearer ") :]
+        else:
+            logging.warning("get_authenticated_session: Token missing from both cookies and Authorization header.")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token missing")
+    payload = await verify_jwt_token(token)
+
+    session_id = cookies.get("session_id") or request.headers.get("X-Session-ID")
+    if not session_id:
+        logging.warning("get_authenticated_session: Session ID missing from both cookies and X-Session-ID header.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session ID missing")
+    if not workers.is_owned_by_this_worker(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_421_MISDIRECTED_REQUEST,
+            detail=f"Session {session_id} is not owned by worker {workers.worker_id()}.",
+        )
+    if (session := get_session_state(session_id)) is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session not found for the given ID.")
+    return AuthenticatedSession(token=token, token_payload=payload, session_state=session)
+
+
 async def verify_jwt_token(token: str) -> dict:
+    """
+    Verifies the access token and returns its payload. Verified tokens are cached until they expire.
+    Tokens issued for another purpose, like login tickets, are rejected.
+    """
+    if (payload := _verified_tokens.get(token)) is not None:
+        return payload
     try:
-        logging.debug(f"Verifying JWT token: {token}")
         # Decode and validate the JWT token
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         logging.warning("verify_jwt_token: Token has expired")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token has expired")
     except jwt.InvalidTokenError:
         logging.warning("verify_jwt_token: Invalid token")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
+    if "purpose" in payload:
+        logging.warning(f"verify_jwt_token: Token for {payload['purpose']} used as access token")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
+    _verified_tokens[token] = payload
+    return payload
 
 
 async def send_pydantic(websocket: WebSocket, message: pydantic.BaseModel):
@@ -104,11 +175,6 @@ def setup_ai_logging():
     This does not seem to work in the logging ini file.
     """
 
-    # Define the custom filter
-    class AILogFilter(logging.Filter):
-        def filter(self, record):
-            return record.getMessage().startswith("<<<AI>>>")
-
     # Programmatically set up a logger that filters for AI messages and logs to a file.
     # This does not seem to work in the logging ini file.
     ai_log_handler = logging.handlers.RotatingFileHandler("ai.log", maxBytes=5 * 1024 * 1024, backupCount=3)
@@ -118,5 +184,5 @@ def setup_ai_logging():
             "SERVER [%(asctime)s] [%(thread)d] [%(name)s %(module)s.%(funcName)s] %(levelname)s - %(message)s"
         )
     )
-    ai_log_handler.addFilter(AILogFilter())
+    ai_log_handler.addFilter(MarkerFilter(LOGMARKER_AI))
     logging.getLogger().addHandler(ai_log_handler)
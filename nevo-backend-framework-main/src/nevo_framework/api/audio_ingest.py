@@ -0,0 +1,216 @@
+"""
+Helpers for receiving the user's audio recordings.
+
+By default (`audio_ingest_mode` "memory") an upload is read into an in-memory buffer, checked against the size and
+duration limits and handed to the speech-to-text client as a file-like object. The recording is only written to disk
+by us in "disk" mode, or additionally when the `store_audio` debug flag is set. Note that the multipart parser of
+Starlette spools uploaded files above 1 MB to a temporary file before the endpoint runs (a voice recording in WebM/Opus
+reaches that after a few minutes); the size limit is therefore checked on the Content-Length of the request before the
+body is parsed (`check_content_length`).
+
+The speech-to-text API detects the audio format from the file extension, so the buffer gets a name with an extension
+matching the content type of the upload. The duration limit is checked for WAV and WebM recordings (the frontend
+records WebM); other formats are only limited by size.
+"""
+
+import io
+import logging
+import os
+import struct
+import wave
+
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+
+# size of the chunks in which uploads are read
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# allowance for the multipart encoding around the uploaded file
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# file extensions of the audio formats accepted by the speech-to-text API, by content type
+AUDIO_EXTENSIONS = {
+    "audio/wav": ".wav",
+    "audio/wave": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/webm": ".webm",
+    "video/webm": ".webm",
+    "audio/ogg": ".ogg",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/x-m4a": ".m4a",
+    "audio/flac": ".flac",
+}
+DEFAULT_AUDIO_EXTENSION = ".wav"
+
+# WebM (Matroska) element ids, see https://www.matroska.org/technical/elements.html
+_EBML_HEADER = 0x1A45DFA3
+_WEBM_SEGMENT = 0x18538067
+_WEBM_INFO = 0x1549A966
+_WEBM_TIMECODE_SCALE = 0x2AD7B1
+_WEBM_DURATION = 0x4489
+_WEBM_CLUSTER = 0x1F43B675
+_WEBM_CLUSTER_TIMECODE = 0xE7
+_WEBM_BLOCK_GROUP = 0xA0
+_WEBM_BLOCK = 0xA1
+_WEBM_SIMPLE_BLOCK = 0xA3
+# elements whose children are read; all others are skipped
+_WEBM_CONTAINERS = {_WEBM_SEGMENT, _WEBM_INFO, _WEBM_CLUSTER, _WEBM_BLOCK_GROUP}
+
+
+def check_content_length(content_length: str | None, max_bytes: int) -> JSONResponse | None:
+    """
+    Returns the error response for an audio upload request whose body would exceed `max_bytes` (plus the multipart
+    encoding), or which does not declare its length; None if the upload may be read.
+    """
+    if content_length is None or not content_length.isdigit():
+        return JSONResponse(
+            status_code=status.HTTP_411_LENGTH_REQUIRED, content={"detail": "Audio uploads need a Content-Length."}
+        )
+    if int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"Audio upload of {content_length} bytes exceeds the limit of {max_bytes} bytes."},
+        )
+    return None
+
+
+def recording_name(filename: str | None, content_type: str | None) -> str:
+    """
+    The name of an uploaded recording for the speech-to-text API: the uploaded file name if it has a known audio
+    extension, otherwise "recording" with the extension of the content type (browsers upload blobs as "blob").
+    """
+    if filename and os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS.values():
+        return filename
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return "recording" + AUDIO_EXTENSIONS.get(media_type, DEFAULT_AUDIO_EXTENSION)
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> io.BytesIO:
+    """
+    Reads an uploaded file chunk by chunk into a buffer, rejecting it with 413 as soon as it exceeds `max_bytes`.
+    The buffer is named for the speech-to-text API, which detects the audio format from the extension (see
+    `recording_name`).
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio upload of {file.size} bytes exceeds the limit of {max_bytes} bytes.",
+        )
+    buffer = io.BytesIO()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Audio upload exceeds the limit of {max_bytes} bytes.",
+            )
+        buffer.write(chunk)
+    buffer.seek(0)
+    buffer.name = recording_name(file.filename, file.content_type)
+    return buffer
+
+
+def wav_duration_seconds(buffer: io.BytesIO) -> float | None:
+    """
+    Returns the duration of a WAV recording in seconds, or None if the buffer does not contain a WAV file.
+    The buffer position is left at the start.
+    """
+    try:
+        with wave.open(buffer, "rb") as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError) as e:
+        logging.debug(f"Could not read WAV header of the recording: {e}")
+        return None
+    finally:
+        buffer.seek(0)
+
+
+def _read_vint(data: bytes, position: int, keep_marker: bool) -> tuple[int, int]:
+    """Reads an EBML variable-length integer; returns its value and its length in bytes."""
+    first = data[position]
+    if first == 0:
+        raise ValueError("Invalid EBML variable-length integer.")
+    length = 9 - first.bit_length()
+    if position + length > len(data):
+        raise ValueError("Truncated EBML variable-length integer.")
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for byte in data[position + 1 : position + length]:
+        value = (value << 8) | byte
+    return value, length
+
+
+def webm_duration_seconds(buffer: io.BytesIO) -> float | None:
+    """
+    Returns the duration of a WebM recording in seconds, or None if the buffer does not contain a WebM file.
+    Recordings of the browser's MediaRecorder usually lack the duration element; their duration is taken from the
+    timecode of the last block. Truncated files are measured up to where they end.
+    """
+    data = buffer.getvalue()
+    if data[:4] != _EBML_HEADER.to_bytes(4, "big"):
+        return None
+    timecode_scale = 1_000_000  # nanoseconds per timecode unit
+    duration = None
+    cluster_timecode = 0
+    last_block = None
+    position = 0
+    try:
+        while position < len(data):
+            element, length = _read_vint(data, position, keep_marker=True)
+            position += length
+            size, length = _read_vint(data, position, keep_marker=False)
+            position += length
+            if element in _WEBM_CONTAINERS:
+                continue  # read the children; the size is often unknown in live recordings
+            if size == (1 << (7 * length)) - 1:
+                break  # unknown size of an element we cannot read into
+            if element == _WEBM_TIMECODE_SCALE:
+                timecode_scale = int.from_bytes(data[position : position + size], "big")
+            elif element == _WEBM_DURATION:
+                duration = struct.unpack(">f" if size == 4 else ">d", data[position : position + size])[0]
+            elif element == _WEBM_CLUSTER_TIMECODE:
+                cluster_timecode = int.from_bytes(data[position : position + size], "big")
+            elif element in (_WEBM_SIMPLE_BLOCK, _WEBM_BLOCK):
+                # track number, then the timecode relative to the cluster
+                _, track_length = _read_vint(data, position, keep_marker=False)
+                timecode = data[position + track_length : position + track_length + 2]
+                if len(timecode) == 2:
+                    block_timecode = cluster_timecode + int.from_bytes(timecode, "big", signed=True)
+                    last_block = block_timecode if last_block is None else max(last_block, block_timecode)
+            position += size
+    except (IndexError, ValueError, struct.error) as e:
+        logging.debug(f"WebM recording is truncated or invalid: {e}")
+    if duration is None:
+        duration = last_block
+    return duration * timecode_scale / 1e9 if duration is not None else None
+
+
+def recording_duration_seconds(buffer: io.BytesIO) -> float | None:
+    """
+    Returns the duration of a WAV or WebM recording in seconds, or None for other formats.
+    """
+    duration = wav_duration_seconds(buffer)
+    if duration is None:
+        duration = webm_duration_seconds(buffer)
+    return duration
+
+
+def check_duration(buffer: io.BytesIO, max_seconds: float):
+    """
+    Rejects a recording longer than `max_seconds` with 413. Recordings which are neither WAV nor WebM are not checked.
+    """
+    duration = recording_duration_seconds(buffer)
+    if duration is not None and duration > max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio recording of {duration:.1f}s exceeds the limit of {max_seconds}s.",
+        )
+
+
+async def store_recording(buffer: io.BytesIO, path: str):
+    """
+    Writes the recording to disk without blocking the event loop. The buffer position is left at the start.
+    """
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(buffer.getvalue())
+    buffer.seek(0)
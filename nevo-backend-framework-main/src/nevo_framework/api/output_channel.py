@@ -0,0 +1,223 @@
+"""
+The per-session channel for data sent to the frontend (audio chunks and messages).
+
+It replaces an unbounded `asyncio.Queue` and keeps its interface (`put_nowait`, `put`, `get`, `qsize`, `empty`), but
+handles a slow client gracefully:
+
+* Audio chunks, web element messages (e.g. `ShowImage`) and control markers share one lane, so their order is kept.
+  The producer is slowed down by `await put(...)` when more than `high_watermark_bytes` of audio are queued, until the
+  client has caught up to `low_watermark_bytes`. The lane holds at most `max_ordered_items` items: `put` waits for
+  space. `put_nowait` raises `asyncio.QueueFull` like a full `asyncio.Queue` for audio chunks only; other items
+  (markers like the end of a dialog step, web element messages from synchronous code) are never lost and may exceed
+  the bound.
+* Status messages (`AiStatusMessage`) are debugging information. They go to a separate bounded lane, are only sent
+  when nothing else is waiting, and the oldest ones are dropped when the lane is full.
+
+When the client is gone, `close` wakes all waiting producers and consumers, which then raise `OutputChannelClosed`;
+later items are discarded.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from nevo_framework.api.server_messages import AiStatusMessage
+from nevo_framework.config.audio_config import AudioConfig
+
+# format of the audio streamed by the voice agents
+OUTPUT_AUDIO_CONFIG = AudioConfig()
+
+
+class OutputChannelClosed(Exception):
+    """Raised by producers and consumers waiting on an output channel that was closed."""
+
+
+@dataclass
+class OutputChannelMetrics:
+    """Counters of an output channel, accumulated over the lifetime of the session."""
+
+    # format of the audio, for reporting the queued audio in seconds (not a counter)
+    audio_bytes_per_second: int = OUTPUT_AUDIO_CONFIG.bytes_per_second
+    # maximum number of items waiting to be sent
+    max_depth: int = 0
+    # maximum number of audio bytes waiting to be sent
+    max_queued_audio_bytes: int = 0
+    # number of status messages dropped because their lane was full
+    dropped_messages: int = 0
+    # how often and how long producers waited for the client to catch up
+    producer_waits: int = 0
+    producer_wait_seconds: float = 0.0
+    # number of items sent to the client and the time it took
+    sends: int = 0
+    send_seconds: float = 0.0
+    max_send_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        mean_send_ms = 1000 * self.send_seconds / self.sends if self.sends else 0.0
+        return (
+            f"max depth {self.max_depth}, "
+            f"max audio queued {self.max_queued_audio_bytes / self.audio_bytes_per_second:.1f}s, "
+            f"dropped {self.dropped_messages}, producer waits {self.producer_waits} "
+            f"({self.producer_wait_seconds:.2f}s), sends {self.sends} (mean {mean_send_ms:.1f}ms, "
+            f"max {1000 * self.max_send_seconds:.1f}ms)"
+        )
+
+
+class OutputChannel:
+    """
+    Bounded output channel with backpressure for audio and a droppable lane for status messages.
+
+    Args:
+        high_watermark_bytes: When at least this many audio bytes are queued, `put` blocks for audio chunks.
+        low_watermark_bytes: Blocked producers resume when the queued audio is down to this many bytes.
+        max_droppable_messages: Maximum number of queued status messages; older ones are dropped.
+        max_ordered_items: Maximum number of queued audio chunks, web element messages and control markers.
+        audio_config: Format of the audio chunks.
+    """
+
+    def __init__(
+        self,
+        high_watermark_bytes: int,
+        low_watermark_bytes: int,
+        max_droppable_messages: int,
+        max_ordered_items: int = 1024,
+        audio_config: AudioConfig = OUTPUT_AUDIO_CONFIG,
+    ) -> None:
+        assert 0 <= low_watermark_bytes <= high_watermark_bytes, "Low watermark must not exceed the high watermark."
+        self.high_watermark_bytes = high_watermark_bytes
+        self.low_watermark_bytes = low_watermark_bytes
+        self.max_droppable_messages = max_droppable_messages
+        self.max_ordered_items = max_ordered_items
+        self.metrics = OutputChannelMetrics(audio_bytes_per_second=audio_config.bytes_per_second)
+        # audio chunks, web element messages and control markers, in order
+        self._ordered: deque[Any] = deque()
+        # status messages, sent when nothing else is waiting
+        self._droppable: deque[Any] = deque()
+        self._queued_audio_bytes = 0
+        self._item_available = asyncio.Event()
+        self._accepting_audio = asyncio.Event()
+        self._accepting_audio.set()
+        # set while the ordered lane has space
+        self._ordered_space = asyncio.Event()
+        self._ordered_space.set()
+        self._closed = False
+
+    @staticmethod
+    def is_droppable(item: Any) -> bool:
+        return isinstance(item, AiStatusMessage)
+
+    def qsize(self) -> int:
+        return len(self._ordered) + len(self._droppable)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    @property
+    def queued_audio_bytes(self) -> int:
+        return self._queued_audio_bytes
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """
+        Closes the channel, e.g. when the client disconnected: waiting producers and consumers raise
+        `OutputChannelClosed`, queued and later items are discarded.
+        """
+        self._closed = True
+        self._ordered.clear()
+        self._droppable.clear()
+        self._queued_audio_bytes = 0
+        # wake everyone waiting, they find the channel closed
+        self._item_available.set()
+        self._accepting_audio.set()
+        self._ordered_space.set()
+
+    def put_nowait(self, item: Any):
+        """
+        Adds an item without waiting. The audio watermarks are not enforced here; producers of audio should use
+        `put`. Raises `asyncio.QueueFull` for an audio chunk if the ordered lane is full; other items are always
+        added.
+        """
+        if self._closed:
+            return  # nobody will send it
+        if self.is_droppable(item):
+            if len(self._droppable) >= self.max_droppable_messages:
+                self._droppable.popleft()
+                self.metrics.dropped_messages += 1
+            self._droppable.append(item)
+        else:
+            if isinstance(item, bytes) and len(self._ordered) >= self.max_ordered_items:
+                raise asyncio.QueueFull(f"Output channel is full ({self.max_ordered_items} items).")
+            self._ordered.append(item)
+            if len(self._ordered) >= self.max_ordered_items:
+                self._ordered_space.clear()
+            if isinstance(item, bytes):
+                self._queued_audio_bytes += len(item)
+                self.metrics.max_queued_audio_bytes = max(self.metrics.max_queued_audio_bytes, self._queued_audio_bytes)
+                if self._queued_audio_bytes >= self.high_watermark_bytes:
+                    self._accepting_audio.clear()
+        self.metrics.max_depth = max(self.metrics.max_depth, self.qsize())
+        self._item_available.set()
+
+    async def put(self, item: Any):
+        """
+        Adds an item. Audio chunks wait while the queued audio is above the high watermark, until the client has
+        caught up to the low watermark; other items wait while the ordered lane is full. Raises
+        `OutputChannelClosed` if the channel is closed.
+        """
+        while not self._closed and not self.is_droppable(item):
+            if isinstance(item, bytes) and not self._accepting_audio.is_set():
+                event = self._accepting_audio
+            elif not self._ordered_space.is_set():
+                event = self._ordered_space
+            else:
+                break
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await event.wait()
+            self.metrics.producer_waits += 1
+            self.metrics.producer_wait_seconds += loop.time() - start
+        if self._closed:
+            raise OutputChannelClosed()
+        self.put_nowait(item)
+
+    async def get(self) -> Any:
+        """
+        Removes and returns the next item to send. Status messages are only returned when nothing else is waiting.
+        Raises `OutputChannelClosed` if the channel is closed.
+        """
+        while True:
+            if self._closed:
+                raise OutputChannelClosed()
+            if self._ordered:
+                item = self._ordered.popleft()
+                if len(self._ordered) < self.max_ordered_items:
+                    self._ordered_space.set()
+                if isinstance(item, bytes):
+                    self._queued_audio_bytes -= len(item)
+                    if self._queued_audio_bytes <= self.low_watermark_bytes:
+                        self._accepting_audio.set()
+                return item
+            if self._droppable:
+                return self._droppable.popleft()
+            self._item_available.clear()
+            await self._item_available.wait()
+
+    def take_droppable(self) -> list[Any]:
+        """
+        Removes and returns all queued status messages, e.g. to send them before the end of a dialog step.
+        """
+        items = list(self._droppable)
+        self._droppable.clear()
+        return items
+
+    def record_send(self, seconds: float):
+        """
+        Records how long sending an item to the client took.
+        """
+        self.metrics.sends += 1
+        self.metrics.send_seconds += seconds
+        self.metrics.max_send_seconds = max(self.metrics.max_send_seconds, seconds)
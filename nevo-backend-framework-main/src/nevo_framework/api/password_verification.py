@@ -0,0 +1,136 @@
+"""
+Password verification for `/login`, off the event loop.
+
+bcrypt is deliberately slow (a few hundred milliseconds per check). Running it in the request handler would block the
+event loop, and with it the audio streaming of every other session. The checks therefore run in a small dedicated
+thread pool (bcrypt releases the GIL while hashing). When more logins are waiting than the pool can work off quickly,
+new ones are rejected with 429 instead of queueing without bound.
+
+After a successful password login, the client receives a short-lived signed login ticket. Presenting the ticket
+instead of the password lets a client that lost its session log in again without another bcrypt check. A ticket:
+
+* is signed for its own audience, so it is not accepted as access token (see `api_helpers.verify_jwt_token`),
+* can be used once; the ids of used tickets are kept until the tickets expire,
+* is prefixed with its id, which encodes the issuing worker like a session id, so the proxy sends it back to the
+  worker that can tell whether it was used,
+* is not renewed by a ticket login, so the password has to be checked again after `login_ticket_minutes`.
+
+Ticket logins are subject to the same admission limit as password checks.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import bcrypt
+import jwt
+from cachetools import TLRUCache
+from fastapi import HTTPException, status
+
+from nevo_framework.api import api_helpers, workers
+from nevo_framework.config.master_config import get_master_config
+
+CONFIG = get_master_config()
+
+LOGIN_TICKET_PURPOSE = "login_ticket"
+LOGIN_TICKET_AUDIENCE = "nevo-login-ticket"
+# maximum number of used, unexpired login tickets remembered; beyond that, ticket logins are refused
+USED_TICKET_CACHE_SIZE = 100_000
+
+_executor = ThreadPoolExecutor(
+    max_workers=CONFIG.login_verification_concurrency, thread_name_prefix="password-verification"
+)
+# number of logins being checked, password checks running or waiting for a thread
+_admitted = 0
+
+
+def _ticket_expiry(ticket_id: str, expiration: float, now: float) -> float:
+    return expiration
+
+
+# ids of the login tickets used -> their expiration time (seconds since the epoch); an id is evicted when its ticket
+# expires, so the cache only holds ids of tickets which would still be accepted
+_used_tickets: TLRUCache = TLRUCache(maxsize=USED_TICKET_CACHE_SIZE, ttu=_ticket_expiry, timer=time.time)
+
+
+@contextmanager
+def _admission():
+    """
+    Admits one login check. Raises an HTTPException with status 429 if too many checks are already waiting.
+    """
+    global _admitted
+    if _admitted >= CONFIG.login_verification_concurrency + CONFIG.login_verification_queue_limit:
+        logging.warning(f"Rejecting login, {_admitted} password checks are already running or waiting.")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please try again.",
+            headers={"Retry-After": "1"},
+        )
+    _admitted += 1
+    try:
+        yield
+    finally:
+        _admitted -= 1
+
+
+async def check_password(password: str, hashed_password: bytes) -> bool:
+    """
+    Checks the password against the bcrypt hash in the worker pool. Raises an HTTPException with status 429 if too
+    many checks are already waiting.
+    """
+    with _admission():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, bcrypt.checkpw, password.encode("utf-8"), hashed_password)
+
+
+def create_login_ticket() -> str:
+    """
+    Creates a signed login ticket, valid for `CONFIG.login_ticket_minutes`: "<ticket id>.<signed token>".
+    """
+    ticket_id = workers.new_session_id()
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=CONFIG.login_ticket_minutes)
+    token = jwt.encode(
+        {"exp": expiration, "aud": LOGIN_TICKET_AUDIENCE, "purpose": LOGIN_TICKET_PURPOSE, "jti": ticket_id},
+        api_helpers.JWT_SECRET_KEY,
+        algorithm=api_helpers.ALGORITHM,
+    )
+    return f"{ticket_id}.{token}"
+
+
+async def check_login_ticket(ticket: str) -> bool:
+    """
+    Checks whether the login ticket is valid, not expired and not used yet, and marks it as used. Raises an
+    HTTPException with status 429 if too many logins are already waiting, and with status 421 if the ticket was issued
+    by another worker.
+    """
+    with _admission():
+        ticket_id, _, token = ticket.partition(".")
+        if workers.owner_of(ticket_id) is not None and not workers.is_owned_by_this_worker(ticket_id):
+            raise HTTPException(
+                status_code=status.HTTP_421_MISDIRECTED_REQUEST,
+                detail=f"Login ticket was not issued by worker {workers.worker_id()}.",
+            )
+        try:
+            payload = jwt.decode(
+                token, api_helpers.JWT_SECRET_KEY, algorithms=[api_helpers.ALGORITHM], audience=LOGIN_TICKET_AUDIENCE
+            )
+        except jwt.InvalidTokenError as e:
+            logging.info(f"Invalid login ticket: {e}")
+            return False
+        if payload.get("purpose") != LOGIN_TICKET_PURPOSE or payload.get("jti") != ticket_id:
+            logging.info("Invalid login ticket: wrong purpose or id.")
+            return False
+        if ticket_id in _used_tickets:
+            logging.warning(f"Login ticket {ticket_id} was used before.")
+            return False
+        # drops the ids of expired tickets (kept in expiration order, no scan of all ids)
+        _used_tickets.expire()
+        if _used_tickets.currsize >= _used_tickets.maxsize:
+            # evicting an unexpired id would let its ticket be used again
+            logging.warning(f"{_used_tickets.currsize} used login tickets are outstanding, refusing the ticket login.")
+            return False
+        _used_tickets[ticket_id] = payload["exp"]
+        return True
@@ -1,3 +1,4 @@
+import io
 from dataclasses import dataclass
 from typing import Any, Literal
 
@@ -67,7 +68,10 @@ class TextChatResponse(BaseModel):
 
 @dataclass
 class AudioUploadReady:
-    audio_file_path: str
+    # path of the recording on disk, if it was stored
+    audio_file_path: str | None = None
+    # the recording in memory, if it was not stored (see audio_ingest)
+    audio_buffer: io.BytesIO | None = None
 
 
 @dataclass
@@ -79,3 +83,15 @@ class WebElementMessage:
 @dataclass
 class TranscribedAudio:
     content: str
+
+
+@dataclass
+class TranscriptionFailed:
+    """Put on the input queue when streamed audio could not be transcribed; ends the dialog step with the error."""
+
+    server_error: str
+
+
+@dataclass
+class ClientDisconnected:
+    """Put on the input queue when the websocket of the session disconnected."""
@@ -1,5 +1,6 @@
 import asyncio
 import datetime
+import heapq
 from asyncio import Queue
 from dataclasses import dataclass, field
 import logging
@@ -9,6 +10,7 @@ from fastapi import status
 from fastapi import HTTPException, WebSocket
 from fastapi.websockets import WebSocketState
 
+from nevo_framework.api.output_channel import OutputChannel
 from nevo_framework.llm.dialog_manager import DialogManager
 
 from nevo_framework.config.master_config import get_master_config
@@ -18,6 +20,13 @@ CONFIG = get_master_config()
 
 # dictionary to store the session state for each session
 _sessions: dict[str, "SessionState"] = {}
+# Expiry index: a min-heap of (expiry time, session id) with exactly one entry per stored session. The entries are
+# updated lazily: set_was_active() only updates the timestamp, and when an entry comes due the cleanup re-checks
+# the session and pushes it back with its new expiry time if it was active in the meantime. This way, a cleanup
+# pass only touches sessions that are (or were about to be) expired, instead of scanning all sessions.
+_expiry_heap: list[tuple[datetime.datetime, str]] = []
+# ids of sessions that were marked for removal since the last cleanup pass
+_marked_for_removal: set[str] = set()
 
 
 @dataclass
@@ -31,8 +40,8 @@ class SessionState:
     # Queue used for data received from the frontend from various sources. The queue is processed in the
     # main "dialog loop".
     input_queue: Queue
-    # Queue used for data sent to the frontend, such as audio chunks and messages.
-    output_queue: Queue
+    # Channel used for data sent to the frontend, such as audio chunks and messages.
+    output_queue: OutputChannel
     # timestamp of the users last activity
     last_activity: datetime.datetime = field(default_factory=datetime.datetime.now)
     # indicates whether the session is currently accepting data from the client
@@ -42,13 +51,25 @@ class SessionState:
     # the session is marked for removal on the next periodic cleanup
     kill_session: bool = False
 
-
     def set_was_active(self):
         """
         Update the last activity timestamp to the current time.
         """
         self.last_activity = datetime.datetime.now()
 
+    def mark_for_removal(self):
+        """
+        Mark the session for removal on the next periodic cleanup.
+        """
+        self.kill_session = True
+        _marked_for_removal.add(self.id)
+
+    def expires_at(self) -> datetime.datetime:
+        """
+        The time at which the session is considered inactive if there is no further activity.
+        """
+        return self.last_activity + datetime.timedelta(minutes=CONFIG.timeout_session_activity_minutes)
+
     def get_ai_species(self) -> str:
         """
         Get the type of AI (type of orchestrator) that is being used in this session.
@@ -67,6 +88,7 @@ def store_session_state(session_state: SessionState):
             detail=f"Session ID {session_state.id} already exists. Cannot create a new session with the same ID.",
         )
     _sessions[session_state.id] = session_state
+    heapq.heappush(_expiry_heap, (session_state.expires_at(), session_state.id))
 
 
 def get_session_state(session_id: str) -> SessionState | None:
@@ -77,6 +99,67 @@ def get_session_state(session_id: str) -> SessionState | None:
     return _sessions.get(session_id)
 
 
+def collect_sessions_to_remove(now: datetime.datetime) -> list[tuple["SessionState", str]]:
+    """
+    Remove all sessions that are marked for removal, inactive or whose websocket is no longer connected from the
+    session store and return them together with the reason for removal.
+
+    Only the sessions marked for removal and the sessions whose expiry time has passed are looked at, so the cost
+    does not depend on the total number of sessions.
+    """
+    to_remove: dict[str, tuple[SessionState, str]] = {}
+
+    # sessions that have been marked for removal, which includes sessions whose websocket disconnected
+    for session_id in _marked_for_removal:
+        if (session := _sessions.get(session_id)) is not None:
+            to_remove[session_id] = (session, "marked for removal")
+    _marked_for_removal.clear()
+
+    # sessions whose expiry time has passed
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        _, session_id = heapq.heappop(_expiry_heap)
+        session = _sessions.get(session_id)
+        if session is None or session_id in to_remove:
+            continue
+        if session.kill_session:
+            # marked by setting the flag directly instead of calling mark_for_removal()
+            to_remove[session_id] = (session, "marked for removal")
+        elif (expires_at := session.expires_at()) <= now:
+            to_remove[session_id] = (session, "inactive")
+        elif session.websocket and session.websocket.client_state != WebSocketState.CONNECTED:
+            to_remove[session_id] = (session, "websocket not connected")
+        else:
+            # the session was active since the entry was pushed, reschedule it
+            heapq.heappush(_expiry_heap, (expires_at, session_id))
+
+    for session_id in to_remove:
+        del _sessions[session_id]
+    # the heap entries of removed sessions are dropped when they come due
+    return list(to_remove.values())
+
+
+async def close_sessions(sessions_to_close: list[tuple["SessionState", str]]):
+    """
+    Close the websocket connections of removed sessions. The connections are closed concurrently, with at most
+    `CONFIG.session_cleanup_close_concurrency` closes in flight.
+    """
+    semaphore = asyncio.Semaphore(CONFIG.session_cleanup_close_concurrency)
+
+    async def close_session(session: SessionState, kill_reason: str):
+        if session.websocket:
+            async with semaphore:
+                # close the websocket connection if it is still open
+                try:
+                    await asyncio.wait_for(
+                        session.websocket.close(), timeout=CONFIG.session_websocket_close_timeout_seconds
+                    )
+                except Exception as e:
+                    pass  # ignore, we are closing the connection anyway
+        logging.info(f"Session {session.id} removed, reason: {kill_reason}")
+
+    await asyncio.gather(*(close_session(session, kill_reason) for session, kill_reason in sessions_to_close))
+
+
 async def session_cleanup():
     """
     Check for inactive sessions and close them. This is run periodically in the background.
@@ -86,34 +169,5 @@ async def session_cleanup():
     logging.info("Starting periodic session activity check.")
     while True:
         logging.info("Checking for inactive or disconnected sessions.")
-        now = datetime.datetime.now()
-        # check for sessions that have been marked for removal
-        sessions_to_kill: set[str] = set(
-            (session.id, "marked for removal") for session in _sessions.values() if session.kill_session
-        )
-        # check for sessions that have not been active for a while
-        sessions_to_kill.update(
-            (session.id, "inactive")
-            for session in _sessions.values()
-            if (now - session.last_activity).total_seconds() > 60 * CONFIG.timeout_session_activity_minutes
-        )
-        # check for sessions that have a websocket connection that is not connected
-        sessions_to_kill.update(
-            (session.id, "websocket not connected")
-            for session in _sessions.values()
-            if session.websocket and session.websocket.client_state != WebSocketState.CONNECTED
-        )
-        # remove sessions that are marked for removal
-        for session_id, kill_reason in sessions_to_kill:
-            # this seems to occur sometimes
-            if session_id not in _sessions:
-                continue
-            if _sessions[session_id].websocket:
-                # close the websocket connection if it is still open
-                try:
-                    await asyncio.wait_for(_sessions[session_id].websocket.close(), timeout=10)
-                except Exception as e:
-                    pass  # ignore, we are closing the connection anyway
-            del _sessions[session_id]
-            logging.info(f"Session {session_id} removed, reason: {kill_reason}")
+        await close_sessions(collect_sessions_to_remove(datetime.datetime.now()))
         await asyncio.sleep(CONFIG.session_cleanup_interval_seconds)
@@ -0,0 +1,150 @@
+"""
+The router of the multi-worker deployment (see `workers.py`). It is the public entry point and forwards each HTTP
+request and websocket connection to the worker that owns the session:
+
+* `/login` is sent to the next worker in round-robin order; the worker encodes its id into the new session id. A
+  login with a `login_ticket` cookie is sent to the worker that issued the ticket.
+* `/ws/audio/{session_id}` is sent to the worker encoded in the path.
+* All other requests are sent to the worker encoded in the `session_id` cookie or the `X-Session-ID` header, or
+  round-robin if the request has no session.
+
+The router does not look at the content of requests, authentication and CORS are handled by the workers.
+
+Every request and websocket frame passes through this one Python process, which caps the throughput of all workers
+at about one core. It is the fallback for development machines without nginx; deployments use the nginx
+configuration of `workers.nginx_config` (`--router nginx`).
+"""
+
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+
+import httpx
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from nevo_framework.api import workers
+
+# headers that describe the connection rather than the message and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+}
+
+
+def create_router_app(worker_count: int, base_port: int) -> FastAPI:
+    """
+    Creates the router app for `worker_count` workers listening on the internal ports above `base_port`.
+    """
+    round_robin = itertools.cycle(range(worker_count))
+    http_client: httpx.AsyncClient | None = None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        nonlocal http_client
+        # no timeout: responses of the workers can take as long as the AI needs
+        async with httpx.AsyncClient(timeout=None) as client:
+            http_client = client
+            yield
+
+    app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
+
+    def choose_worker(path: str, session_id: str | None, login_ticket: str | None = None) -> int | None:
+        if path.startswith("/login"):
+            ticket_worker = workers.owner_of(login_ticket) if login_ticket else None
+            if ticket_worker is not None and ticket_worker < worker_count:
+                return ticket_worker
+            return next(round_robin)
+        if session_id is None:
+            return next(round_robin)
+        worker = workers.owner_of(session_id)
+        if worker is None or worker >= worker_count:
+            return None
+        return worker
+
+    @app.websocket("/ws/audio/{session_id}")
+    async def proxy_websocket(websocket: WebSocket, session_id: str):
+        worker = workers.owner_of(session_id)
+        if worker is None or worker >= worker_count:
+            logging.warning(f"Router: no worker for websocket of session {session_id}.")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        url = f"ws://{workers.WORKER_HOST}:{workers.worker_port(base_port, worker)}{websocket.url.path}"
+        if websocket.url.query:
+            url += f"?{websocket.url.query}"
+        headers = [("cookie", cookie)] if (cookie := websocket.headers.get("cookie")) else []
+        try:
+            async with websockets.connect(url, additional_headers=headers, max_size=None) as upstream:
+                await websocket.accept()
+
+                async def client_to_worker():
+                    while True:
+                        message = await websocket.receive()
+                        if message["type"] == "websocket.disconnect":
+                            return
+                        if message.get("bytes") is not None:
+                            await upstream.send(message["bytes"])
+                        elif message.get("text") is not None:
+                            await upstream.send(message["text"])
+
+                async def worker_to_client():
+                    async for message in upstream:
+                        if isinstance(message, bytes):
+                            await websocket.send_bytes(message)
+                        else:
+                            await websocket.send_text(message)
+                    await websocket.close()
+
+                tasks = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+                # whichever side closes first ends the connection on the other side
+                _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+        except (websockets.InvalidStatus, OSError) as e:
+            logging.warning(f"Router: websocket connection to worker {worker} failed for session {session_id}: {e}")
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"])
+    async def proxy_http(request: Request, path: str) -> Response:
+        session_id = request.cookies.get("session_id") or request.headers.get("X-Session-ID")
+        worker = choose_worker(request.url.path, session_id, request.cookies.get("login_ticket"))
+        if worker is None:
+            return Response(
+                status_code=status.HTTP_421_MISDIRECTED_REQUEST, content=f"No worker for session {session_id}."
+            )
+
+        url = f"http://{workers.WORKER_HOST}:{workers.worker_port(base_port, worker)}{request.url.path}"
+        if request.url.query:
+            url += f"?{request.url.query}"
+        headers = [(k, v) for k, v in request.headers.raw if k.lower() != b"host" and k.lower() not in HOP_BY_HOP_HEADERS]
+        upstream_request = http_client.build_request(request.method, url, headers=headers, content=request.stream())
+        try:
+            upstream_response = await http_client.send(upstream_request, stream=True)
+        except httpx.TransportError as e:
+            logging.error(f"Router: request to worker {worker} failed: {e}")
+            return Response(status_code=status.HTTP_502_BAD_GATEWAY, content=f"Worker {worker} not reachable.")
+
+        response = StreamingResponse(
+            upstream_response.aiter_raw(),
+            status_code=upstream_response.status_code,
+            background=BackgroundTask(upstream_response.aclose),
+        )
+        # raw headers, so that multiple set-cookie headers survive; the router's server adds its own date and server
+        response.raw_headers = [
+            (k, v)
+            for k, v in upstream_response.headers.raw
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() not in (b"date", b"server")
+        ]
+        return response
+
+    return app
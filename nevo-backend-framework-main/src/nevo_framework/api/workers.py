@@ -0,0 +1,209 @@
+"""
+Multi-process deployment: the API server runs as N worker processes behind a reverse proxy.
+
+A session only exists in the memory of the worker that created it (see `sessions.py`), so every request of a session
+must reach that worker. The id of the owning worker is encoded into the session id itself (`w<worker id>-<uuid>`),
+which lets the proxy pick the worker without any shared state. Logins are distributed over the workers round-robin,
+except logins with a login ticket (see `password_verification.py`), which go to the worker that issued the ticket.
+
+The proxy is nginx, configured by `nginx_config`: it routes on the session id prefix and forwards the websocket
+connections without touching the frames in Python. Where nginx is not installed, the Python router of
+`worker_router.py` can be used instead; it forwards every request and websocket frame itself, so its single process
+limits the throughput of all workers to about one core.
+
+Each worker learns its id and the number of workers from environment variables set by `start_workers`.
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import uuid
+
+WORKER_ID_ENV = "NEVO_WORKER_ID"
+WORKER_COUNT_ENV = "NEVO_WORKER_COUNT"
+
+# host the workers listen on; only the router is reachable from outside
+WORKER_HOST = "127.0.0.1"
+
+
+def worker_id() -> int | None:
+    """
+    Returns the id of this worker process, or None if the server runs as a single process.
+    """
+    value = os.getenv(WORKER_ID_ENV)
+    return int(value) if value is not None else None
+
+
+def new_session_id() -> str:
+    """
+    Creates a new session id. In multi-worker mode, the id of this worker is encoded into the session id.
+    """
+    if (this_worker := worker_id()) is None:
+        return str(uuid.uuid4())
+    return f"w{this_worker}-{uuid.uuid4()}"
+
+
+def owner_of(session_id: str) -> int | None:
+    """
+    Returns the id of the worker that owns the session, or None if the session id does not encode a worker.
+    """
+    prefix, separator, _ = session_id.partition("-")
+    if not separator or not prefix.startswith("w") or not prefix[1:].isdigit():
+        return None
+    return int(prefix[1:])
+
+
+def is_owned_by_this_worker(session_id: str) -> bool:
+    """
+    Checks whether the session belongs to this worker. Always true if the server runs as a single process.
+    """
+    if (this_worker := worker_id()) is None:
+        return True
+    return owner_of(session_id) == this_worker
+
+
+def worker_port(base_port: int, worker: int) -> int:
+    """
+    The internal port of a worker. Workers listen on the ports directly above the public port of the router.
+    """
+    return base_port + 1 + worker
+
+
+def _run_worker(worker: int, worker_count: int, port: int, log_config: str):
+    import uvicorn
+
+    os.environ[WORKER_ID_ENV] = str(worker)
+    os.environ[WORKER_COUNT_ENV] = str(worker_count)
+    uvicorn.run("nevo_framework.api.api:app", host=WORKER_HOST, port=port, log_config=log_config)
+
+
+def start_workers(worker_count: int, base_port: int, log_config: str) -> list[multiprocessing.Process]:
+    """
+    Starts the worker processes, each running the API server on its internal port.
+    """
+    processes = []
+    for worker in range(worker_count):
+        port = worker_port(base_port, worker)
+        process = multiprocessing.Process(
+            target=_run_worker,
+            args=(worker, worker_count, port, log_config),
+            name=f"nevo-worker-{worker}",
+            daemon=True,
+        )
+        process.start()
+        logging.info(f"Started worker {worker} on {WORKER_HOST}:{port} (pid {process.pid}).")
+        processes.append(process)
+    return processes
+
+
+def nginx_config(worker_count: int, base_port: int, max_body_bytes: int) -> str:
+    """
+    Returns an nginx configuration routing the public port `base_port` to the workers like `worker_router.py`:
+    logins and requests without session round-robin, logins with a `login_ticket` cookie to the worker encoded in the
+    ticket, all other requests and websockets to the worker encoded in the session id (`session_id` cookie,
+    `X-Session-ID` header or websocket path). Requests for sessions of unknown workers are sent round-robin and
+    rejected by the worker that receives them.
+
+    Args:
+        worker_count: Number of workers.
+        base_port: The public port.
+        max_body_bytes: Maximum size of request bodies (audio uploads).
+    """
+    servers = "\n".join(
+        f"        server {WORKER_HOST}:{worker_port(base_port, worker)};" for worker in range(worker_count)
+    )
+    session_routes = "\n".join(
+        f'        "~^w{worker}-" {WORKER_HOST}:{worker_port(base_port, worker)};' for worker in range(worker_count)
+    )
+    websocket_routes = "\n".join(
+        f'        "~^/ws/audio/w{worker}-" {WORKER_HOST}:{worker_port(base_port, worker)};'
+        for worker in range(worker_count)
+    )
+    # responses of the workers can take as long as the AI needs, and the websocket of a session stays open
+    proxy_settings = """
+            proxy_http_version 1.1;
+            proxy_set_header Host $host;
+            proxy_buffering off;
+            proxy_request_buffering off;
+            proxy_read_timeout 1h;
+            proxy_send_timeout 1h;"""
+    return f"""worker_processes auto;
+error_log stderr warn;
+pid nginx.pid;
+
+events {{
+    worker_connections 8192;
+}}
+
+http {{
+    access_log off;
+    client_max_body_size {max_body_bytes};
+
+    upstream nevo_workers {{
+{servers}
+        keepalive 64;
+    }}
+
+    map $cookie_session_id $session_id {{
+        "" $http_x_session_id;
+        default $cookie_session_id;
+    }}
+
+    map $session_id $session_worker {{
+{session_routes}
+        default nevo_workers;
+    }}
+
+    map $cookie_login_ticket $login_worker {{
+{session_routes}
+        default nevo_workers;
+    }}
+
+    map $uri $websocket_worker {{
+{websocket_routes}
+        default nevo_workers;
+    }}
+
+    server {{
+        listen {base_port};
+
+        location /login {{
+            proxy_pass http://$login_worker;{proxy_settings}
+            proxy_set_header Connection "";
+        }}
+
+        location /ws/ {{
+            proxy_pass http://$websocket_worker;{proxy_settings}
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection "upgrade";
+        }}
+
+        location / {{
+            proxy_pass http://$session_worker;{proxy_settings}
+            proxy_set_header Connection "";
+        }}
+    }}
+}}
+"""
+
+
+def nginx_available() -> bool:
+    return shutil.which("nginx") is not None
+
+
+def start_nginx(worker_count: int, base_port: int, max_body_bytes: int, directory: str) -> subprocess.Popen:
+    """
+    Writes the configuration of `nginx_config` to `directory` and starts nginx in the foreground with `directory` as
+    its prefix (for the pid file and temporary files).
+    """
+    os.makedirs(os.path.join(directory, "logs"), exist_ok=True)
+    config_path = os.path.abspath(os.path.join(directory, "nginx.conf"))
+    with open(config_path, "w") as file:
+        file.write(nginx_config(worker_count, base_port, max_body_bytes))
+    process = subprocess.Popen(
+        ["nginx", "-p", os.path.abspath(directory), "-c", config_path, "-g", "daemon off;"],
+    )
+    logging.info(f"Started nginx on port {base_port} (pid {process.pid}), configuration {config_path}.")
+    return process
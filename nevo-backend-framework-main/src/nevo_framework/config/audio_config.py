@@ -9,3 +9,7 @@ class AudioConfig:
     channels: int = 1
     sample_width: int = 2
     sample_rate: int = 24000
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.channels * self.sample_width
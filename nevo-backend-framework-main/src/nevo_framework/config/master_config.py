@@ -6,6 +6,11 @@ import openai
 import logging
 from pydantic import BaseModel, Field
 
+from nevo_framework.llm import http_pool
+from nevo_framework.llm.http_pool import HttpPoolConfig
+from nevo_framework.llm.llm_scheduler import DeploymentLimits, schedule_client
+from nevo_framework.retrieval.quantization import Quantization
+
 
 class LanguageModelConfig(BaseModel):
     deployment: Literal["OpenAI", "Azure"]
@@ -27,10 +32,95 @@ class MasterConfig(BaseModel):
     timeout_session_activity_minutes: float = 2
     # number of seconds between session cleanup checks
     session_cleanup_interval_seconds: float = 60
+    # write log records in a background thread instead of the event loop
+    async_logging: bool = True
+    # log only every n-th DEBUG record of each call site (1 logs all of them)
+    debug_log_sample_rate: int = 10
+    # query embeddings: number cached in memory, optional SQLite file to persist them, and micro-batching of
+    # concurrent requests (maximum texts per call, maximum wait for other requests)
+    embedding_cache_size: int = 10_000
+    embedding_cache_path: str | None = None
+    embedding_batch_max_size: int = 64
+    embedding_batch_max_delay_ms: float = 5
+    # vector searches of concurrent sessions are run as one batch (maximum queries per batch, maximum wait for others)
+    search_batch_max_size: int = 64
+    search_batch_max_delay_ms: float = 2
+    # vector indexes searched on a quantized copy of their embeddings ("float16" or "int8"), by index directory name;
+    # the best rerank_factor * k candidates are re-ranked exactly
+    vector_index_quantization: dict[str, Quantization] = {}
+    vector_index_rerank_factor: int = 4
+    # vector indexes whose coarse stage scores only a prefix of the embedding dimensions (e.g. 256), by index
+    # directory name; combined with vector_index_quantization if set for the index
+    vector_index_prefix_dimensions: dict[str, int] = {}
+    # clusters searched per query in vector indexes with an approximate nearest-neighbour index (IVF), by index
+    # directory name; indexes without an entry use 8
+    vector_index_nprobe: dict[str, int] = {}
+    # RAG lookups answer from the lexical (BM25) index alone, without query rewrite and query embedding, if the
+    # question is self-contained (at least lexical_fast_path_min_terms content words, no reference back to the dialog),
+    # and the best snippet contains at least lexical_fast_path_min_terms of its words, reaches this normalized score
+    # (in [0, 1], see retrieval.bm25) and at least lexical_fast_path_min_margin times the second best (0 if there is
+    # none); None disables the fast path
+    lexical_fast_path_min_score: float | None = 0.6
+    lexical_fast_path_min_margin: float = 1.5
+    lexical_fast_path_min_terms: int = 2
+    # other RAG lookups fuse the vector and the lexical ranking (reciprocal rank fusion), or use the vector ranking only
+    hybrid_search: bool = True
+    # a spoken sentence selects the image of a retrieved snippet in the process if its word overlap score is at least
+    # image_match_min_score and image_match_min_margin times that of the second best snippet; ambiguous sentences
+    # are passed to the LLM if image_match_llm_fallback is set
+    image_match_min_score: float = 0.15
+    image_match_min_margin: float = 1.5
+    image_match_llm_fallback: bool = True
+    # how a user turn is analyzed: "fanout" asks a router and a model selector separately and rewrites the query in
+    # each RAG lookup, "fused" asks one turn analyzer for route, model and rewritten query (one request per turn)
+    turn_analysis_mode: Literal["fanout", "fused"] = "fanout"
+    # number of likely conversation branches whose preparatory work (e.g. RAG lookup) starts while the turn is still
+    # being routed; 0 disables the speculation. Speculative work for a branch not taken costs requests, so it is opt-in
+    speculative_branches: int = 0
+    # estimated number of tokens of the recent dialog sent to the tracker agents (router, intent and detail trackers)
+    # with each request; older messages are dropped
+    dialog_context_max_tokens: int = 1500
+    # connection pool shared by all OpenAI clients
+    http_pool: HttpPoolConfig = Field(default_factory=HttpPoolConfig)
+    # limits per LLM client ("audio", "text", "stt", "embedding"): requests in flight and requests per minute
+    # (missing or 0: no limit)
+    llm_max_concurrency: dict[str, int] = {"audio": 16, "text": 32, "stt": 8}
+    llm_requests_per_minute: dict[str, float] = {}
+    # number of retries of failed LLM requests (429s pause all requests of the client for the Retry-After time)
+    llm_max_retries: int = 2
+    # maximum number of password checks running in parallel, and waiting beyond that before logins are rejected (429)
+    login_verification_concurrency: int = 2
+    login_verification_queue_limit: int = 32
+    # minutes during which the login ticket returned by /login can be used instead of the password
+    login_ticket_minutes: float = 10
+    # maximum number of websocket connections closed concurrently by the session cleanup
+    session_cleanup_close_concurrency: int = 32
+    # number of seconds to wait for a websocket connection to close during session cleanup
+    session_websocket_close_timeout_seconds: float = 10
+    # seconds of AI audio queued for a client above which the AI stream is paused, and below which it resumes
+    output_audio_high_watermark_seconds: float = 10
+    output_audio_low_watermark_seconds: float = 5
+    # maximum number of queued status messages per session; older ones are dropped
+    output_max_status_messages: int = 32
+    # maximum number of queued audio frames and other messages per session; producers wait for the client beyond
+    output_max_queued_items: int = 1024
+    # duration of the audio frames sent to the client (0 sends the fragments as streamed by the model)
+    audio_frame_duration_ms: float = 40
+    # maximum time streamed audio waits for its frame to be completed before it is sent anyway
+    audio_frame_max_delay_ms: float = 100
     # if true, the JSON message indicating the end of the stream will contain the full AI response
     send_response_text_in_end_of_stream: bool = False
     # the file directory for saving temporary user recording files:
     recording_file_dir: str = "temp"
+    # "memory" keeps uploaded recordings in memory until they are transcribed, "disk" stores them in recording_file_dir
+    audio_ingest_mode: Literal["memory", "disk"] = "memory"
+    # limits for uploaded recordings; larger or longer recordings are rejected
+    max_audio_upload_bytes: int = 10 * 1024 * 1024
+    max_audio_upload_seconds: float = 120
+    # Transcription of audio streamed over the websocket while the user speaks (see streaming_transcription):
+    # "off" only accepts uploaded recordings, "realtime" uses the real-time transcription service,
+    # "buffered" transcribes the streamed audio with the speech-to-text model at the end of speech.
+    streaming_transcription: Literal["off", "realtime", "buffered"] = "off"
     # maximum number of car models to be matched by the keyword search
     max_keyword_matches: int = 2
     # Values for calculating where to place images based on the character length of the bot's message
@@ -65,25 +155,36 @@ def _load_config_from_json(filepath: str = "config/master_config.json") -> Maste
         master_config = MasterConfig.model_validate_json(file.read())
         logging.info(f"Loaded configuration from {filepath}")
 
+    # all clients share one connection pool
+    http_client = http_pool.shared_async_http_client(master_config.http_pool)
+
     if master_config.language_model_config.deployment == "Azure":
         master_config.language_model_config.client["audio"] = openai.AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             azure_endpoint=os.getenv("API_BASE"),  # type: ignore
             api_version=master_config.language_model_config.api_version["audio"],
+            http_client=http_client,
+            timeout=http_pool.client_timeout(master_config.http_pool, "audio"),
         )
 
         master_config.language_model_config.client["text"] = openai.AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             azure_endpoint=os.getenv("API_BASE"),  # type: ignore
             api_version=master_config.language_model_config.api_version["text"],
+            http_client=http_client,
+            timeout=http_pool.client_timeout(master_config.http_pool, "text"),
         )
     elif master_config.language_model_config.deployment == "OpenAI":
         # both of these dictionary entried have the same client; this is for consistency with the above
         master_config.language_model_config.client["audio"] = openai.AsyncOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=http_client,
+            timeout=http_pool.client_timeout(master_config.http_pool, "audio"),
         )
         master_config.language_model_config.client["text"] = openai.AsyncOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=http_client,
+            timeout=http_pool.client_timeout(master_config.http_pool, "text"),
         )
     else:
         raise ValueError("Only Azure and OpenAI are supported")
@@ -91,8 +192,26 @@ def _load_config_from_json(filepath: str = "config/master_config.json") -> Maste
     # NB: This is a workaround for us needing to use OpenAI for STT because Azure has too low of a rate limit
     master_config.language_model_config.client["stt"] = openai.AsyncOpenAI(
         api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        timeout=http_pool.client_timeout(master_config.http_pool, "stt"),
     )
 
+    # embeddings are also computed with OpenAI, see nevo_framework.retrieval.embedding_service
+    master_config.language_model_config.client["embedding"] = openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        timeout=http_pool.client_timeout(master_config.http_pool, "embedding"),
+    )
+
+    # all LLM calls of the process go through one scheduler per client (see llm_scheduler)
+    clients = master_config.language_model_config.client
+    for name, client in clients.items():
+        limits = DeploymentLimits(
+            max_concurrency=master_config.llm_max_concurrency.get(name, DeploymentLimits.max_concurrency),
+            requests_per_minute=master_config.llm_requests_per_minute.get(name, 0),
+        )
+        clients[name] = schedule_client(client, name, limits, master_config.llm_max_retries)
+
     if debug_flags := os.getenv("API_DEBUG"):
         master_config.debug_flags = debug_flags.split(",")
 
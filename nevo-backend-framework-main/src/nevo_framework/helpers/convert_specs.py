@@ -10,6 +10,8 @@ import argparse
 import logging
 import time
 
+from nevo_framework.llm import http_pool
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,7 +20,7 @@ logging.basicConfig(format=FORMAT)
 
 load_dotenv()
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_pool.shared_http_client())
 
 SUMMARY_PROMPT = (
     "Here is some information on a model of car. Could you convert this into a three paragraph document "
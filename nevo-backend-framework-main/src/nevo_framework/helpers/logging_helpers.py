@@ -1,4 +1,7 @@
 import logging
+import logging.handlers
+import queue
+from collections import Counter
 from datetime import datetime
 import json
 
@@ -17,7 +20,18 @@ def remove_empty_lines(text: str) -> str:
     return "\n".join([line for line in text.split("\n") if line.strip()])
 
 
-class LogAi:
+class LogMessage:
+    """
+    Base class of log messages with a marker. Handlers select these messages by type and marker (see `MarkerFilter`)
+    instead of formatting every record and matching its text. The text is only built when a handler writes it.
+    """
+
+    marker = ""
+
+
+class LogAi(LogMessage):
+
+    marker = LOGMARKER_AI
 
     def __init__(self, message: str) -> None:
         self.message = message
@@ -26,14 +40,18 @@ class LogAi:
         return f"{LOGMARKER_AI} {self.message}"
 
 
-class LogAiDialogStart:
+class LogAiDialogStart(LogMessage):
+
+    marker = LOGMARKER_AI
 
     def __repr__(self):
         return f"""{LOGMARKER_AI} DIALOG START ---------------------------------------------------------------
 ----------------------------------------------------------------------------"""
 
 
-class LogAiUserMessage:
+class LogAiUserMessage(LogMessage):
+
+    marker = LOGMARKER_AI
 
     def __init__(self, message: str) -> None:
         self.message = message
@@ -42,7 +60,9 @@ class LogAiUserMessage:
         return f"{LOGMARKER_AI} USER MESSAGE:\n{self.message}"
 
 
-class LogAiAgentResponse:
+class LogAiAgentResponse(LogMessage):
+
+    marker = LOGMARKER_AI
 
     def __init__(self, agent_name: str, response: str) -> None:
         self.agent_name = agent_name
@@ -52,7 +72,9 @@ class LogAiAgentResponse:
         return f"{LOGMARKER_AI} AGENT RESPONSE FROM '{self.agent_name}':\n{self.response}"
 
 
-class LogTiming:
+class LogTiming(LogMessage):
+
+    marker = LOGMARKER_TIMING
 
     def __init__(self, event: str) -> None:
         self.event = event
@@ -128,6 +150,75 @@ class Timing:
 
 
 
+class MarkerFilter(logging.Filter):
+    """
+    Lets only records through whose message is a `LogMessage` with the given marker.
+    """
+
+    def __init__(self, marker: str) -> None:
+        super().__init__()
+        self.marker = marker
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return isinstance(record.msg, LogMessage) and record.msg.marker == self.marker
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Lets only every `rate`-th DEBUG record of each call site through, so debug logging in hot paths (per audio chunk,
+    per request) stays affordable. Records of other levels always pass.
+    """
+
+    def __init__(self, rate: int) -> None:
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counts: Counter[tuple[str, int]] = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or self.rate == 1:
+            return True
+        call_site = (record.pathname, record.lineno)
+        count = self._counts[call_site]
+        self._counts[call_site] = count + 1
+        return count % self.rate == 0
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A `QueueHandler` which passes records to the listener thread unformatted. The standard `QueueHandler` formats
+    each record in `prepare` so it can be pickled; within one process that is not needed, and leaving it to the
+    listener keeps message formatting off the calling thread (the event loop).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_queue_logging(debug_sample_rate: int = 1) -> logging.handlers.QueueListener:
+    """
+    Moves the handlers of the root logger behind a queue: the root logger only enqueues records, and a background
+    thread formats them and writes them to the previous handlers (files, console). Handler levels and filters
+    are applied in the background thread.
+
+    Call after logging has been configured and `stop()` the returned listener on shutdown, which writes out the
+    records still queued.
+
+    Args:
+        debug_sample_rate: Only every n-th DEBUG record of each call site is logged (1 logs all of them).
+    """
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
 class TestingSession:
 
     def __init__(self) -> None:
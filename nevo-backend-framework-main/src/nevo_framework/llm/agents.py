@@ -22,6 +22,8 @@ from nevo_framework.api.server_messages import TextChunkMessage,  EndOfResponseM
 from nevo_framework.config.master_config import get_master_config
 from nevo_framework.config.audio_config import AudioConfig
 from nevo_framework.helpers.logging_helpers import LogAi, LogAiAgentResponse
+from nevo_framework.llm import llm_scheduler
+from nevo_framework.llm.audio_framing import AudioFramer, flush_on_deadline
 from nevo_framework.llm.llm_tools import TimedWebElementMessage
 
 log_file_path = os.path.join("logging", f"agent_duration_{datetime.now()}.log")
@@ -370,28 +372,30 @@ class VoiceAgent:
         """
         # TODO currently not guarded against too long input
         logging.info(LogAi(f"AudioChatAgentGPT4VoiceV2 calling {self.model} ({type(self).__name__})."))
-        if self._modality == "audio":
-            response = await self.async_openai_client.chat.completions.create(
-                model=self.model,
-                messages=messages_for_context,
-                modalities=["text", "audio"],
-                audio={"voice": self.voice, "format": "pcm16"},
-                stream=True,
-                timeout=CONFIG.llm_call_timeout,
-                tools=self.tools,
-                temperature=self.temperature,
-                stream_options={"include_usage": True} if self.log_chat_steps else None,
-            )
-        else:
-            response = await self.async_openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages_for_context,
-                stream=True,
-                timeout=CONFIG.llm_call_timeout,
-                tools=self.tools,
-                temperature=self.temperature,
-                stream_options={"include_usage": True} if self.log_chat_steps else None,
-            )
+        # the streamed voice response is what the user is waiting for
+        with llm_scheduler.priority(llm_scheduler.Priority.INTERACTIVE):
+            if self._modality == "audio":
+                response = await self.async_openai_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages_for_context,
+                    modalities=["text", "audio"],
+                    audio={"voice": self.voice, "format": "pcm16"},
+                    stream=True,
+                    timeout=CONFIG.llm_call_timeout,
+                    tools=self.tools,
+                    temperature=self.temperature,
+                    stream_options={"include_usage": True} if self.log_chat_steps else None,
+                )
+            else:
+                response = await self.async_openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages_for_context,
+                    stream=True,
+                    timeout=CONFIG.llm_call_timeout,
+                    tools=self.tools,
+                    temperature=self.temperature,
+                    stream_options={"include_usage": True} if self.log_chat_steps else None,
+                )
 
         full_response_text = StringIO()
         tool_calls_raw = {}
@@ -421,6 +425,10 @@ class VoiceAgent:
         SAMPLE_RATE = 24000.0
         binary_audio_chunks = []  # used if RECORD_AUDIO is True
         token_use: TokenUse | None = None
+        # re-chunks the irregular audio fragments of the model into fixed-duration frames for the client
+        audio_framer = AudioFramer(
+            frame_duration_ms=CONFIG.audio_frame_duration_ms, max_delay_ms=CONFIG.audio_frame_max_delay_ms
+        )
 
         if timed_web_element_messages:
             timed_web_element_messages = sorted(timed_web_element_messages, key=lambda x: x.time_delta)
@@ -431,6 +439,9 @@ class VoiceAgent:
 
         stream_start_time = time.time()
 
+        if self.output_queue:
+            # a partial frame is sent when the model pauses longer than audio_frame_max_delay_ms
+            response = flush_on_deadline(response, audio_framer, self.output_queue.put)
         async for chunk in response:
             if sentence_callback and timed_message_queue_task is None:
                 # start the timed message queue task at the arrival of the first chunk to have a precise t0
@@ -444,7 +455,7 @@ class VoiceAgent:
                 delta: ChoiceDelta = chunk.choices[0].delta
                 time_elapsed = time.time() - stream_start_time
                 if next_timed_message and time_elapsed >= next_timed_message.time_delta:
-                    self.output_queue.put_nowait(next_timed_message.message)
+                    await self.output_queue.put(next_timed_message.message)
                     next_timed_message = next(next_message_iter, None)
                 if hasattr(delta, "audio"):
                     # print(f"Audio chunk: {delta.audio}")
@@ -454,7 +465,9 @@ class VoiceAgent:
                             audio_bytes = base64.b64decode(audio_chunk)
                             bytes_streamed += len(audio_bytes)
                             seconds_streamed = bytes_streamed / (2.0 * SAMPLE_RATE)
-                            self.output_queue.put_nowait(audio_bytes)
+                            for frame in audio_framer.write(audio_bytes):
+                                # waits if the client is too far behind, see OutputChannel
+                                await self.output_queue.put(frame)
                             if self.store_audio:
                                 binary_audio_chunks.append(audio_bytes)
                     else:
@@ -465,7 +478,7 @@ class VoiceAgent:
                             text_watch_queue.put_nowait(text_chunk)
                         if False:  # TESTING!!!!!!!!
                             print(f"Text chunk: {text_chunk}")
-                            self.output_queue.put_nowait(TextChunkMessage(type="text_chunk", content=text_chunk))
+                            await self.output_queue.put(TextChunkMessage(type="text_chunk", content=text_chunk))
                     if not audio_id:
                         audio_id = delta.audio.get("id", None)
 
@@ -481,7 +494,8 @@ class VoiceAgent:
                 elif hasattr(delta, "content") and delta.content:
                     # this is used for pure text chat, which serves as a fallback and less expensive option 
                     # in case we dont want to use audio streaming
-                    self.output_queue.put_nowait(TextChunkMessage(type="text_chunk", content=delta.content))
+                    # waits if the client is too far behind, see OutputChannel
+                    await self.output_queue.put(TextChunkMessage(type="text_chunk", content=delta.content))
                     full_response_text.write(delta.content)
                     if text_watch_queue:
                         text_watch_queue.put_nowait(delta.content)
@@ -513,13 +527,17 @@ class VoiceAgent:
                     completion_tokens=usage.completion_tokens,
                     completion_audio_tokens=usage.completion_tokens_details.audio_tokens,
                 )
+        # send the rest of the audio, which is still waiting for its frame to be completed
+        if self.output_queue and (frame := audio_framer.flush()):
+            await self.output_queue.put(frame)
+
         # if we still have timed messages to send, send them now
         while next_timed_message:
-            self.output_queue.put_nowait(next_timed_message.message)
+            await self.output_queue.put(next_timed_message.message)
             next_timed_message = next(next_message_iter, None)
 
         # indicate the end of the response (which might not be the end of the dialog step)
-        self.output_queue.put_nowait(EndOfResponseMessage())
+        await self.output_queue.put(EndOfResponseMessage())
 
         if text_watch_queue:
             text_watch_queue.put_nowait(stream_watching.SentenceWatcher.END_OF_STREAM)
@@ -0,0 +1,146 @@
+"""
+Re-chunking of streamed PCM audio into fixed-duration frames.
+
+The model streams audio in fragments of irregular, often tiny size. Sending each fragment as its own websocket
+message costs per-message overhead on the server, proxies and the browser. The `AudioFramer` collects fragments in a
+preallocated buffer and emits frames of a fixed duration instead. A partial frame is emitted when it has waited longer
+than the maximum delay, and at the end of a response. `flush_on_deadline` enforces the maximum delay while the
+model stream pauses; `AudioFramer.write` alone can only check it when the next fragment arrives.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+from nevo_framework.config.audio_config import AudioConfig
+
+T = TypeVar("T")
+
+
+class AudioFramer:
+    """
+    Collects PCM audio fragments and emits frames of `frame_duration_ms`.
+
+    The fragments are copied into one preallocated buffer, so no memory is allocated per fragment; the only allocation
+    is the `bytes` object of each emitted frame, which is handed to the output queue and must not be reused.
+
+    Args:
+        frame_duration_ms: Duration of the emitted frames. 0 disables framing, fragments are passed through as they are.
+        max_delay_ms: Maximum time the first byte of a partial frame waits before the frame is emitted anyway.
+        config: Format of the audio. Defaults to `AudioConfig()`.
+    """
+
+    def __init__(self, frame_duration_ms: float, max_delay_ms: float, config: AudioConfig | None = None) -> None:
+        if config is None:
+            config = AudioConfig()
+        self.sample_bytes = config.sample_width * config.channels
+        samples_per_frame = int(config.sample_rate * frame_duration_ms / 1000)
+        self.frame_bytes = samples_per_frame * self.sample_bytes
+        self.max_delay_seconds = max_delay_ms / 1000
+        self._buffer = bytearray(self.frame_bytes)
+        self._view = memoryview(self._buffer)
+        self._fill = 0
+        # time when the first byte of the current partial frame arrived
+        self._partial_since: float | None = None
+        # statistics, e.g. for benchmarking
+        self.frames_emitted = 0
+        self.bytes_copied = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.frame_bytes > 0
+
+    def time_until_deadline(self) -> float | None:
+        """
+        Seconds until the partial frame has waited the maximum delay (0 if it is overdue), or None if there is no
+        partial frame that `flush` could emit, i.e. less than one whole sample is buffered.
+        """
+        if self._partial_since is None or self._fill < self.sample_bytes:
+            return None
+        return max(0.0, self._partial_since + self.max_delay_seconds - time.monotonic())
+
+    def write(self, fragment: bytes) -> Iterator[bytes]:
+        """
+        Adds a fragment and yields all frames completed by it. If the partial frame has waited longer than the maximum
+        delay, it is yielded as well.
+        """
+        if not self.enabled:
+            self.frames_emitted += 1
+            yield fragment
+            return
+
+        fragment_view = memoryview(fragment)
+        offset = 0
+        while offset < len(fragment_view):
+            if self._fill == 0:
+                self._partial_since = time.monotonic()
+            take = min(self.frame_bytes - self._fill, len(fragment_view) - offset)
+            self._view[self._fill : self._fill + take] = fragment_view[offset : offset + take]
+            self._fill += take
+            offset += take
+            self.bytes_copied += take
+            if self._fill == self.frame_bytes:
+                yield self._emit(self.frame_bytes)
+        if self._partial_since is not None and time.monotonic() - self._partial_since >= self.max_delay_seconds:
+            if frame := self.flush():
+                yield frame
+
+    def flush(self) -> bytes | None:
+        """
+        Returns the partial frame, or None if there is none. An incomplete sample at the end is kept in the buffer.
+        """
+        length = self._fill - self._fill % self.sample_bytes
+        if length == 0:
+            return None
+        return self._emit(length)
+
+    def _emit(self, length: int) -> bytes:
+        frame = bytes(self._view[:length])
+        remainder = self._fill - length
+        if remainder:
+            self._view[:remainder] = self._view[length : self._fill]
+        self._fill = remainder
+        self._partial_since = time.monotonic() if remainder else None
+        self.frames_emitted += 1
+        self.bytes_copied += length
+        return frame
+
+
+async def flush_on_deadline(
+    stream: AsyncIterable[T], framer: AudioFramer, send_frame: Callable[[bytes], Awaitable[None]]
+) -> AsyncIterator[T]:
+    """
+    Iterates `stream`. While the framer holds a partial frame and the stream pauses beyond the frame's maximum delay,
+    the partial frame is flushed and passed to `send_frame`. The pending read of the stream is not cancelled by the
+    timeout, so no item is lost.
+    """
+    iterator = stream.__aiter__()
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            timeout = framer.time_until_deadline()
+            if timeout is None and pending is None:
+                # nothing to flush, read directly
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                if timeout is not None:
+                    done, _ = await asyncio.wait({pending}, timeout=timeout)
+                    if not done:
+                        if frame := framer.flush():
+                            await send_frame(frame)
+                        continue
+                try:
+                    item = await pending
+                except StopAsyncIteration:
+                    return
+                finally:
+                    pending = None
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
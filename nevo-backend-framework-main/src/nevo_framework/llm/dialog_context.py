@@ -0,0 +1,122 @@
+"""
+Bounded dialog context for tracker agents.
+
+Tracker agents (routers, intent and detail trackers) send the recent lines of the dialog with every request. A
+`DialogContextWindow` maintains these lines once per session: it follows the message history of the `DialogManager`
+by message index, so each message is rendered once, no matter how often or by how many trackers the window is
+updated. The oldest lines are dropped when the estimated token count exceeds `max_tokens`, so the prompts of the
+trackers stop growing with the length of the conversation. The rendered text is kept and extended incrementally.
+
+Each tracker reads the shared window through a `DialogContextView`, which starts at the tracker's first turn (like
+the dialog lists the trackers used to keep themselves) and can be limited to the last n messages.
+"""
+
+from collections import deque
+from typing import Any
+
+# rough estimate for English text, good enough to bound the prompt size without a tokenizer
+CHARACTERS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+class DialogContextWindow:
+    """
+    Rolling window of rendered dialog lines ("role: content") over the message history of one session.
+
+    Args:
+        max_tokens: Estimated tokens of the lines kept; the latest message is always kept.
+    """
+
+    def __init__(self, max_tokens: int = 1500):
+        self.max_tokens = max_tokens
+        # incremented when the message history was replaced, see update
+        self.generation = 0
+        self._lines: deque[tuple[int, str]] = deque()
+        self._next_index = 0
+        self._tokens = 0
+        self._text = ""
+
+    @property
+    def first_index(self) -> int:
+        """Index of the oldest message in the window (the next message's index if the window is empty)."""
+        return self._lines[0][0] if self._lines else self._next_index
+
+    @property
+    def next_index(self) -> int:
+        """Index of the next message of the history, i.e. the number of messages seen."""
+        return self._next_index
+
+    def update(self, dialog: list[dict[str, Any]]):
+        """Adds the messages of the history which are not in the window yet. Calling it again is a no-op."""
+        if len(dialog) < self._next_index:
+            # the history was replaced (e.g. a restarted dialog): start over
+            self._lines.clear()
+            self._next_index, self._tokens, self._text = 0, 0, ""
+            self.generation += 1
+        for index in range(self._next_index, len(dialog)):
+            line = f"{dialog[index]['role']}: {dialog[index]['content']}"
+            self._lines.append((index, line))
+            self._tokens += estimate_tokens(line)
+            self._text = f"{self._text}\n{line}" if len(self._lines) > 1 else line
+        self._next_index = len(dialog)
+        while self._tokens > self.max_tokens and len(self._lines) > 1:
+            _, line = self._lines.popleft()
+            self._tokens -= estimate_tokens(line)
+            self._text = self._text[len(line) + 1 :]
+
+    def render(self, since: int = 0, max_messages: int | None = None) -> str:
+        """
+        Returns the lines of the window, one per message.
+
+        Args:
+            since: Index of the first message to include.
+            max_messages: Maximum number of (most recent) messages to include.
+        """
+        if max_messages is not None:
+            since = max(since, self._next_index - max_messages)
+        if since <= self.first_index:
+            return self._text
+        offset = 0
+        for index, line in self._lines:
+            if index >= since:
+                return self._text[offset:]
+            offset += len(line) + 1
+        return ""
+
+
+class DialogContextView:
+    """
+    The part of a shared `DialogContextWindow` a tracker sees: the messages from its first update on, including the
+    `lookback` messages before (by default the previous assistant message and the user's message of that turn).
+
+    Args:
+        window: The window of the session.
+        max_messages: Maximum number of (most recent) messages to render; None for all in the window.
+        lookback: Number of messages before the first update to include.
+    """
+
+    def __init__(self, window: DialogContextWindow, max_messages: int | None = None, lookback: int = 2):
+        self.window = window
+        self.max_messages = max_messages
+        self.lookback = lookback
+        self.start: int | None = None
+        self._generation = window.generation
+
+    @property
+    def started(self) -> bool:
+        """Whether the view was updated at least once, i.e. the tracker has seen some dialog."""
+        return self.start is not None
+
+    def update(self, dialog: list[dict[str, Any]]):
+        self.window.update(dialog)
+        if self.start is None or self._generation != self.window.generation:
+            self.start = max(0, len(dialog) - self.lookback)
+            self._generation = self.window.generation
+
+    def render(self) -> str:
+        if self.start is None:
+            return ""
+        return self.window.render(since=self.start, max_messages=self.max_messages)
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Any, Literal
+from typing import Any, BinaryIO, Literal
 
 import nevo_framework.llm.llm_tools as llm_tools
 from nevo_framework.api.server_messages import TextChatResponse
@@ -68,11 +68,21 @@ class DialogManager:
         assert self._output_queue is not None
         logging.info(LogAiDialogStart())
 
-    async def dialog_step(self, recording_file_path: str | None, web_element_message: dict | None) -> None:
-        
-        if recording_file_path:
+    async def dialog_step(
+        self,
+        recording_file_path: str | None,
+        web_element_message: dict | None,
+        recording_buffer: BinaryIO | None = None,
+        transcribed_user_message: str | None = None,
+    ) -> None:
+
+        if transcribed_user_message:
+            # the recording was already transcribed while it was streamed, see streaming_transcription
+            user_message = transcribed_user_message
+            logging.info(LogAiUserMessage(user_message))
+        elif recording_buffer or recording_file_path:
             with TimingLogger("generate_response_openai_streaming:transcribe_recording"):
-                user_message = await llm_tools.transcribe_recording(recording_file_path)
+                user_message = await llm_tools.transcribe_recording(recording_buffer or recording_file_path)
             logging.info(LogAiUserMessage(user_message))
         elif web_element_message and web_element_message.get("type") == "text_chat_response":
             if user_message := web_element_message.get("content"):
@@ -107,9 +117,9 @@ class DialogManager:
 
         if response._web_element_messages:
             for message in response._web_element_messages:
-                self._output_queue.put_nowait(message)
+                await self._output_queue.put(message)
 
-        self.get_output_queue().put_nowait(DIALOG_STEP_ENDED)
+        await self.get_output_queue().put(DIALOG_STEP_ENDED)
 
     def get_output_queue(self) -> asyncio.Queue:
         return self._output_queue
@@ -142,9 +142,9 @@ class DialogManager:
 
             if response._web_element_messages:
                 for message in response._web_element_messages:
-                    self._output_queue.put_nowait(message)
+                    await self._output_queue.put(message)
 
-            self.get_output_queue().put_nowait(DIALOG_STEP_ENDED)
+            await self.get_output_queue().put(DIALOG_STEP_ENDED)
 
     def get_output_queue(self) -> asyncio.Queue:
         return self._output_queue
@@ -0,0 +1,126 @@
+"""
+The HTTP connection pool shared by all OpenAI clients of the process.
+
+Each OpenAI client creates its own connection pool by default, so the "audio", "text" and "stt" clients (and the
+embedding clients of the RAG stores) each open, handshake and keep alive their own connections to the same host.
+Instead, all clients are created with the shared `httpx` clients returned by `shared_async_http_client` and
+`shared_http_client`, configured by `HttpPoolConfig` (`http_pool` in the master config). Timeouts stay per client,
+see `client_timeout`.
+
+At server startup, `prewarm` opens a few connections to every API host, so the first turn of the first sessions
+does not pay for the TCP and TLS handshakes.
+"""
+
+import asyncio
+import importlib.util
+import logging
+from typing import Any, Iterable
+
+import httpx
+import openai
+from pydantic import BaseModel
+
+
+class HttpPoolConfig(BaseModel):
+    # maximum number of connections of the pool, and of idle connections kept alive
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    # seconds an idle connection is kept alive
+    keepalive_expiry_seconds: float = 60
+    # use HTTP/2 (multiplexes requests over one connection); needs the h2 package, otherwise HTTP/1.1 is used
+    http2: bool = False
+    # timeouts in seconds per client ("audio", "text", "stt"); clients without an entry use the defaults
+    connect_timeout_seconds: float = 5
+    read_timeout_seconds: float = 60
+    connect_timeout_seconds_by_client: dict[str, float] = {}
+    read_timeout_seconds_by_client: dict[str, float] = {}
+    # connections opened per API host at startup
+    prewarm_connections: int = 4
+    prewarm_timeout_seconds: float = 10
+
+
+_async_http_client: httpx.AsyncClient | None = None
+_http_client: httpx.Client | None = None
+
+
+def _pool_options(config: HttpPoolConfig) -> dict[str, Any]:
+    http2 = config.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logging.warning("HTTP/2 is configured for the OpenAI clients, but the h2 package is not installed. Using HTTP/1.1.")
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+        "timeout": httpx.Timeout(config.read_timeout_seconds, connect=config.connect_timeout_seconds),
+        "http2": http2,
+    }
+
+
+def shared_async_http_client(config: HttpPoolConfig | None = None) -> httpx.AsyncClient:
+    """
+    Returns the shared async HTTP client, creating it with the given (or the default) configuration on first use.
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        # the OpenAI defaults (e.g. following redirects) with our pool settings
+        _async_http_client = openai.DefaultAsyncHttpxClient(**_pool_options(config or HttpPoolConfig()))
+    return _async_http_client
+
+
+def shared_http_client(config: HttpPoolConfig | None = None) -> httpx.Client:
+    """
+    Returns the shared synchronous HTTP client, for the clients used outside the event loop (e.g. embeddings when
+    building an index).
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = openai.DefaultHttpxClient(**_pool_options(config or HttpPoolConfig()))
+    return _http_client
+
+
+def client_timeout(config: HttpPoolConfig, client_name: str) -> httpx.Timeout:
+    """
+    Returns the timeout for the OpenAI client with the given name ("audio", "text", "stt").
+    """
+    return httpx.Timeout(
+        config.read_timeout_seconds_by_client.get(client_name, config.read_timeout_seconds),
+        connect=config.connect_timeout_seconds_by_client.get(client_name, config.connect_timeout_seconds),
+    )
+
+
+async def prewarm(clients: Iterable[Any], connections: int, timeout: float = 10):
+    """
+    Opens `connections` connections to the API host of each client, using the shared async HTTP client. Failures are
+    logged and otherwise ignored, the connections are then opened by the first requests.
+    """
+    base_urls = {str(client.base_url) for client in clients}
+    http_client = shared_async_http_client()
+
+    async def open_connection(url: str):
+        # any response will do, the connection stays in the pool afterwards
+        await http_client.get(url, timeout=timeout)
+
+    results = await asyncio.gather(
+        *(open_connection(url) for url in base_urls for _ in range(connections)), return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logging.warning(f"Could not prewarm {len(failures)} of {len(results)} connections: {failures[0]!r}")
+    else:
+        logging.info(f"Prewarmed {connections} connection(s) to {', '.join(sorted(base_urls))}")
+
+
+async def close():
+    """
+    Closes the shared HTTP clients.
+    """
+    global _async_http_client, _http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
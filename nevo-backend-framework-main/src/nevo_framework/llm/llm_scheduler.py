@@ -0,0 +1,439 @@
+"""
+Process-wide scheduling of the LLM API calls.
+
+Every session calls the LLM APIs independently, often several calls at once (routing, extraction, RAG, the voice
+response). Without coordination, a burst of sessions runs into the provider's rate limits (429), and a session firing
+many background calls delays the voice response of the others.
+
+The clients in `CONFIG.language_model_config.client` are therefore wrapped in a `ScheduledClient`. Each client
+("audio", "text", "stt") has a `DeploymentScheduler` which
+
+* bounds the number of requests in flight and the request rate (token bucket),
+* grants waiting requests by priority: the user-audible calls (`Priority.INTERACTIVE`, e.g. the streamed voice
+  response and the transcription) before background calls (`Priority.BACKGROUND`, the default),
+* within a priority, grants requests round-robin across sessions, so one busy session cannot starve the others,
+* retries failed requests like the OpenAI SDK does (the wrapped clients have the SDK's retries switched off), and on a
+  429 pauses all requests of the client for the `Retry-After` time, instead of each request retrying on its own,
+* records the time requests spent waiting (`SchedulerMetrics`).
+
+The session and priority of a call are taken from context variables: `set_session` is called by the API for each
+websocket connection, and calls are marked as interactive with `with priority(Priority.INTERACTIVE):`.
+Streamed responses hold their slot until the stream is consumed or closed.
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import enum
+import functools
+import inspect
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import openai
+
+from nevo_framework.helpers.logging_helpers import LogTiming
+
+# queue waits shorter than this are not logged
+LOG_QUEUE_WAIT_SECONDS = 0.05
+# backoff of retries without Retry-After header: initial and maximum seconds
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_BACKOFF_SECONDS = 8.0
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_session_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("llm_scheduler_session_id", default=None)
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("llm_scheduler_priority", default=Priority.BACKGROUND)
+
+
+def set_session(session_id: str | None):
+    """
+    Sets the session of the LLM calls made in the current context, including tasks created from it.
+    """
+    _session_id.set(session_id)
+
+
+@contextlib.contextmanager
+def priority(value: Priority):
+    """
+    Context manager setting the priority of the LLM calls made inside it.
+    """
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class DeploymentLimits:
+    """
+    Limits of one client. `requests_per_minute` 0 means no rate limit; `burst` is the capacity of the token bucket
+    (defaults to the requests per second, at least 1).
+    """
+
+    max_concurrency: int = 16
+    requests_per_minute: float = 0
+    burst: float | None = None
+
+
+@dataclass
+class SchedulerMetrics:
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    queue_wait_by_priority: dict[str, float] = field(default_factory=dict)
+
+    def record_wait(self, wait: float, request_priority: Priority):
+        self.requests += 1
+        self.total_queue_wait += wait
+        self.max_queue_wait = max(self.max_queue_wait, wait)
+        self.queue_wait_by_priority[request_priority.name] = (
+            self.queue_wait_by_priority.get(request_priority.name, 0.0) + wait
+        )
+
+    @property
+    def mean_queue_wait(self) -> float:
+        return self.total_queue_wait / self.requests if self.requests else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"requests={self.requests} retries={self.retries} rate_limited={self.rate_limited} "
+            f"mean_queue_wait={self.mean_queue_wait:.3f}s max_queue_wait={self.max_queue_wait:.3f}s"
+        )
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`. A rate of 0 never runs out of tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    session_id: str | None
+    priority: Priority
+
+
+class DeploymentScheduler:
+    """
+    Schedules the requests of one client, see the module docstring.
+    """
+
+    def __init__(self, name: str, limits: DeploymentLimits, max_retries: int = 2):
+        self.name = name
+        self.limits = limits
+        self.max_retries = max_retries
+        self.metrics = SchedulerMetrics()
+        requests_per_second = limits.requests_per_minute / 60
+        self._bucket = TokenBucket(requests_per_second, limits.burst or max(1.0, requests_per_second))
+        # per priority: session id -> waiting requests of the session, in round-robin order of the sessions
+        self._queues: dict[Priority, collections.OrderedDict[str | None, collections.deque[_Waiter]]] = {
+            value: collections.OrderedDict() for value in Priority
+        }
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for queue in self._queues.values() for waiters in queue.values())
+
+    async def acquire(self) -> float:
+        """
+        Waits until the request of the current context may be sent. Returns the time waited in seconds.
+        `release` must be called when the request is done.
+        """
+        start = time.monotonic()
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), _session_id.get(), _priority.get())
+        self._queues[waiter.priority].setdefault(waiter.session_id, collections.deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # granted, but the caller was cancelled at the same time
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        wait = time.monotonic() - start
+        self.metrics.record_wait(wait, waiter.priority)
+        if wait >= LOG_QUEUE_WAIT_SECONDS:
+            logging.info(
+                LogTiming(f"llm_scheduler:{self.name} queue_wait {wait:.3f}s ({waiter.priority.name}, {waiter.session_id})")
+            )
+        return wait
+
+    def release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float):
+        """Holds back all waiting requests for the given time, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def run(self, create_request: Callable[[], Awaitable[Any]], first_request: Awaitable[Any] | None = None) -> Any:
+        """
+        Sends a request when scheduled and retries it if it fails with a retryable error.
+
+        Args:
+            create_request: Creates the awaitable sending the request, called for every attempt.
+            first_request: Awaitable already created for the first attempt.
+        """
+        request = first_request or create_request()
+        attempt = 0
+        while True:
+            try:
+                await self.acquire()
+            except BaseException:
+                _close(request)
+                raise
+            try:
+                response = await request
+            except openai.APIError as e:
+                self.release()
+                if attempt >= self.max_retries or not _should_retry(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(MAX_RETRY_BACKOFF_SECONDS, RETRY_BACKOFF_SECONDS * 2**attempt) * random.uniform(0.75, 1)
+                if isinstance(e, openai.RateLimitError):
+                    self.metrics.rate_limited += 1
+                    self.pause(delay)
+                    logging.warning(f"LLM scheduler: {self.name} rate limited, pausing requests for {delay:.1f}s.")
+                else:
+                    logging.warning(f"LLM scheduler: {self.name} request failed ({e}), retrying in {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+                self.metrics.retries += 1
+                attempt += 1
+                request = create_request()
+                continue
+            except BaseException:
+                self.release()
+                raise
+            if isinstance(response, openai.AsyncStream):
+                return _ReleasingStream(response, self.release)
+            self.release()
+            return response
+
+    def _drop_finished_waiters(self) -> bool:
+        """
+        Removes the waiters cancelled while waiting from the front of the queues, so the next waiter is one that will
+        be granted. Returns whether a waiter is left.
+        """
+        for value in Priority:
+            queue = self._queues[value]
+            while queue:
+                session_id, waiters = next(iter(queue.items()))
+                if not waiters[0].future.done():
+                    return True
+                waiters.popleft()
+                if not waiters:
+                    del queue[session_id]
+        return False
+
+    def _next_waiter(self) -> _Waiter | None:
+        for value in Priority:
+            queue = self._queues[value]
+            if queue:
+                session_id, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(session_id)
+                else:
+                    del queue[session_id]
+                return waiter
+        return None
+
+    def _remove(self, waiter: _Waiter):
+        waiters = self._queues[waiter.priority].get(waiter.session_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.priority][waiter.session_id]
+
+    def _dispatch(self):
+        if self._wakeup:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._in_flight < self.limits.max_concurrency and self.waiting:
+            now = time.monotonic()
+            if now < self._paused_until:
+                self._schedule_dispatch(self._paused_until - now)
+                return
+            # waiters cancelled while waiting must not use up a token
+            if not self._drop_finished_waiters():
+                return
+            if not self._bucket.take(now):
+                self._schedule_dispatch(self._bucket.seconds_until_token(now))
+                return
+            waiter = self._next_waiter()
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def _schedule_dispatch(self, delay: float):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # released outside the event loop, e.g. by a stream garbage collected at shutdown
+            return
+        self._wakeup = loop.call_later(delay, self._dispatch)
+
+
+class _ReleasingStream:
+    """
+    Wraps a streamed response and releases the scheduler slot when the stream is consumed or closed.
+    """
+
+    def __init__(self, stream: openai.AsyncStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def _release_once(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    async def __aiter__(self):
+        try:
+            async for item in self._stream:
+                yield item
+        finally:
+            self._release_once()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        try:
+            await self._stream.close()
+        finally:
+            self._release_once()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+    def __del__(self):
+        self._release_once()
+
+
+class ScheduledClient:
+    """
+    Wraps an OpenAI async client (or one of its resources, e.g. `client.chat.completions`). Calls that send a
+    request go through the `DeploymentScheduler`; everything else is passed through.
+    """
+
+    def __init__(self, target: Any, scheduler: DeploymentScheduler):
+        self._target = target
+        self.scheduler = scheduler
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if type(attribute).__module__.startswith("openai.resources"):
+            return ScheduledClient(attribute, self.scheduler)
+        if not callable(attribute) or isinstance(attribute, type):
+            return attribute
+
+        @functools.wraps(attribute)
+        def scheduled_call(*args, **kwargs):
+            request = attribute(*args, **kwargs)
+            if not inspect.isawaitable(request):
+                return request
+
+            def create_request():
+                _rewind_files(args, kwargs)
+                return attribute(*args, **kwargs)
+
+            return self.scheduler.run(create_request, request)
+
+        return scheduled_call
+
+    def __repr__(self) -> str:
+        return f"ScheduledClient({self._target!r}, {self.scheduler.name})"
+
+
+def schedule_client(client: Any, name: str, limits: DeploymentLimits, max_retries: int = 2) -> ScheduledClient:
+    """
+    Wraps an OpenAI async client in a `ScheduledClient` with its own scheduler. The SDK's own retries are switched
+    off, the scheduler retries instead.
+    """
+    return ScheduledClient(client.with_options(max_retries=0), DeploymentScheduler(name, limits, max_retries))
+
+
+def _should_retry(error: openai.APIError) -> bool:
+    # the same errors the OpenAI SDK retries
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: openai.APIError) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if retry_after_ms := response.headers.get("retry-after-ms"):
+            return float(retry_after_ms) / 1000
+        if retry_after := response.headers.get("retry-after"):
+            return float(retry_after)
+    except ValueError:
+        pass
+    return None
+
+
+def _rewind_files(args: tuple, kwargs: dict):
+    # uploads (e.g. recordings to transcribe) were read by the failed attempt
+    for value in (*args, *kwargs.values()):
+        if hasattr(value, "seek") and hasattr(value, "read"):
+            value.seek(0)
+
+
+def _close(request: Awaitable[Any]):
+    # avoid "coroutine was never awaited" warnings for requests which were not sent
+    if inspect.iscoroutine(request):
+        request.close()
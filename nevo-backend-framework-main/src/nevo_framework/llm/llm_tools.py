@@ -2,12 +2,13 @@ import asyncio
 from dataclasses import dataclass
 import logging
 import os
-from typing import Any, TypeVar
+from typing import Any, BinaryIO, TypeVar
 
 import openai
 from dotenv import load_dotenv
 from pydantic import BaseModel, ValidationError
 from nevo_framework.config.master_config import get_master_config
+from nevo_framework.llm import llm_scheduler
 
 
 load_dotenv()
@@ -87,21 +88,31 @@ def maybe_get(dictionary: dict[str, Any] | None, pydantic_model_t: T, log_failur
             return None
 
 
-async def transcribe_recording(recording_file_path: str) -> str:
+async def transcribe_recording(recording: str | BinaryIO) -> str:
     """
     Uses and OpenAI model to transcribe a recorded voice audio file.
     Raises a RuntimeError if the recording file is not found.
 
     Args:
-        recording_file_path (str): The path to the audio file to transcribe.
+        recording (str | BinaryIO): The path to the audio file to transcribe, or the recording as a file-like object
+            with a `name` attribute (the file extension tells the API the audio format).
 
     Returns:
         str: The transcription of the audio file.
     """
-    if not os.path.exists(recording_file_path):
-        raise RuntimeError(f"Recording file not found: {recording_file_path}")
+    if not isinstance(recording, str):
+        return await _transcribe(recording)
 
-    with open(recording_file_path, "rb") as audio_file:
+    if not os.path.exists(recording):
+        raise RuntimeError(f"Recording file not found: {recording}")
+
+    with open(recording, "rb") as audio_file:
+        return await _transcribe(audio_file)
+
+
+async def _transcribe(audio_file: BinaryIO) -> str:
+    # the user is waiting for the transcript
+    with llm_scheduler.priority(llm_scheduler.Priority.INTERACTIVE):
         transcript = await CONFIG.language_model_config.client["stt"].audio.transcriptions.create(
             model=CONFIG.language_model_config.model_deployment_name["stt"],
             file=audio_file,
@@ -109,9 +120,7 @@ async def transcribe_recording(recording_file_path: str) -> str:
             timeout=CONFIG.llm_call_timeout,
             # prompt="If the user mentions an email address, always use the '@' symbol in the address."
         )
-        return transcript
-
-    raise RuntimeError("illegal state / no transcript returned")
+    return transcript
 
 
 async def main():
@@ -14,6 +14,18 @@ from nevo_framework.config.audio_config import AudioConfig
 from nevo_framework.llm.agents import save_audio_chunks_as_wav
 
 
+REALTIME_TRANSCRIPTION_URL = "wss://api.openai.com/v1/realtime?intent=transcription"
+
+
+def connect_to_transcriber() -> websockets.connect:
+    """
+    Opens a websocket connection to the OpenAI real-time transcription service. Use as async context manager.
+    """
+    OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "OpenAI-Beta": "realtime=v1"}
+    return websockets.connect(REALTIME_TRANSCRIPTION_URL, additional_headers=headers)
+
+
 async def _stream_client_audio(
     websocket_to_transcriber: websockets_connection.Connection,
     websocket_from_client: starlette_websockets.WebSocket,
@@ -67,10 +79,19 @@ async def _stream_client_audio(
             raise
 
 
-async def _setup_transcriber(websocket_to_transcriber: websockets_connection.Connection) -> bool:
+async def setup_transcriber(
+    websocket_to_transcriber: websockets_connection.Connection, session_overrides: dict | None = None
+) -> bool:
     """
-    Set up the transcriber by connecting to the OpenAI real-time transcription service.
-    This function handles the connection, session creation, and session configuration.
+    Set up the transcriber on a connection opened with `connect_to_transcriber`.
+    This function waits for the session to be created and configures it.
+
+    Args:
+        websocket_to_transcriber: The websocket connection to the OpenAI real-time transcription service.
+        session_overrides: Added to the session configuration, e.g. to change the turn detection.
+
+    Returns:
+        True if the session was created and configured.
     """
     data = await websocket_to_transcriber.recv()
     message = json.loads(data)
@@ -83,6 +104,8 @@ async def _setup_transcriber(websocket_to_transcriber: websockets_connection.Con
         session_update = {
             "input_audio_transcription": {"model": "gpt-4o-mini-transcribe", "prompt": "", "language": "en"}
         }
+        if session_overrides:
+            session_update.update(session_overrides)
         await websocket_to_transcriber.send(
             json.dumps({"type": "transcription_session.update", "session": session_update})
         )
@@ -110,15 +133,10 @@ async def realtime_transcription(
     Connect to the real-time transcription service.
     """
 
-    OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-
-    url = "wss://api.openai.com/v1/realtime?intent=transcription"
-    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "OpenAI-Beta": "realtime=v1"}
-
-    async with websockets.connect(url, additional_headers=headers) as websocket_to_transcriber:
+    async with connect_to_transcriber() as websocket_to_transcriber:
         # Set up the transcriber
         logging.info("Setting up the transcriber...")
-        setup_success = await _setup_transcriber(websocket_to_transcriber)
+        setup_success = await setup_transcriber(websocket_to_transcriber)
         if not setup_success:
             logging.error("Failed to set up the transcriber.")
             return
@@ -138,9 +156,9 @@ async def realtime_transcription(
                     # Full transcription of a speech segment
                     transcription = message["transcript"]
                     logging.info(f"Transcriber: Transcription completed: {transcription}")
-                    client_output_queue.put_nowait(TranscriptionCompletedMessage(content=transcription))
+                    await client_output_queue.put(TranscriptionCompletedMessage(content=transcription))
                     client_input_queue.put_nowait(TranscribedAudio(content=transcription))
-                    client_output_queue.put_nowait(AiStatusMessage(message=f"User said: {transcription}"))
+                    await client_output_queue.put(AiStatusMessage(message=f"User said: {transcription}"))
                 elif message["type"] == "input_audio_buffer.speech_started":
                     logging.info("Transcriber: speech_started Detected")
                 elif message["type"] == "input_audio_buffer.speech_stopped":
@@ -0,0 +1,197 @@
+"""
+Speculative execution of the preparatory work of conversation branches.
+
+An orchestrator typically routes a turn first (an LLM request) and only then starts the work of the chosen branch,
+e.g. a RAG lookup, so the routing latency adds to every turn. A `SpeculativeExecutor` starts the work of the most
+likely branches while the routing is still running, and when the route is known, commits the chosen branch (its
+work is awaited, usually already done) and cancels the others.
+
+The likely branches are predicted from the previous route: the executor counts which route followed which in the
+session so far. The work of a branch is started for a key, e.g. the car model the user talked about last; it is only
+used if the turn turns out to need the same key.
+
+Per branch, the executor records how often its work was started, used, wasted and failed, the latency saved (the time
+the work ran before it was committed) and the time wasted on cancelled work (`BranchMetrics`).
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from nevo_framework.helpers.logging_helpers import LogTiming
+
+
+@dataclass
+class BranchMetrics:
+    """
+    Counters of one branch, accumulated over the lifetime of the executor. Each time the branch is chosen and has
+    work to do, exactly one of `committed`, `failed` and `missed` is counted.
+    """
+
+    # number of times the work of the branch was started speculatively
+    started: int = 0
+    # ... and used, and the time it ran before the branch was chosen
+    committed: int = 0
+    saved_seconds: float = 0.0
+    # ... and not used (another branch or another key was chosen, or the work failed), and the time it ran
+    wasted: int = 0
+    wasted_seconds: float = 0.0
+    # number of times the branch was chosen and its speculative work had failed, so the work was run again (also
+    # counted as wasted)
+    failed: int = 0
+    # number of times the branch was chosen without speculative work for its key
+    missed: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"started {self.started}, committed {self.committed} (saved {self.saved_seconds:.2f}s), "
+            f"wasted {self.wasted} ({self.wasted_seconds:.2f}s), failed {self.failed}, missed {self.missed}"
+        )
+
+
+class _SpeculativeTask:
+    def __init__(self, key: Hashable, work: Callable[[], Awaitable[Any]]):
+        self.key = key
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self.task = asyncio.ensure_future(work())
+        self.task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self.finished = time.perf_counter()
+        if not task.cancelled() and task.exception() is not None:
+            # retrieved here, so that unused failed work is not reported as "exception was never retrieved"
+            logging.debug(f"Speculative work failed: {task.exception()!r}")
+
+    def elapsed(self, until: float) -> float:
+        return (self.finished if self.finished is not None else until) - self.started
+
+
+class Speculation:
+    """The speculative work of one turn, see `SpeculativeExecutor.start`."""
+
+    def __init__(self, executor: "SpeculativeExecutor", tasks: dict[str, _SpeculativeTask]):
+        self._executor = executor
+        self._tasks = tasks
+
+    @property
+    def branches(self) -> list[str]:
+        return list(self._tasks)
+
+    async def commit(
+        self, branch: str, key: Hashable = None, work: Callable[[], Awaitable[Any]] | None = None
+    ) -> Any:
+        """
+        Commits the chosen branch: cancels the work of all other branches and returns the result of the branch's
+        work. The speculative work is used if it was started for the same key and did not fail; otherwise `work`
+        is run now (None: nothing to do, returns None).
+
+        Args:
+            branch: The chosen branch.
+            key: The key the work is needed for.
+            work: Coroutine function doing the work of the branch.
+        """
+        metrics = self._executor.metrics_of(branch)
+        speculative = self._tasks.pop(branch, None)
+        self.cancel()
+        self._executor.record_route(branch)
+        if speculative is not None and speculative.key == key:
+            committed = time.perf_counter()
+            try:
+                result = await speculative.task
+            except Exception as e:
+                logging.warning(f"Speculative work of branch {branch} failed, running it again: {e!r}")
+            else:
+                metrics.committed += 1
+                metrics.saved_seconds += speculative.elapsed(committed)
+                return result
+            metrics.wasted += 1
+            metrics.wasted_seconds += speculative.elapsed(time.perf_counter())
+            metrics.failed += 1
+            return await work() if work is not None else None
+        if speculative is not None:
+            self._discard(branch, speculative)
+        if work is None:
+            return None
+        metrics.missed += 1
+        return await work()
+
+    def cancel(self):
+        """Cancels the work of all remaining branches, e.g. when the turn fails."""
+        for branch, speculative in self._tasks.items():
+            self._discard(branch, speculative)
+        self._tasks.clear()
+
+    def _discard(self, branch: str, speculative: _SpeculativeTask):
+        speculative.task.cancel()
+        metrics = self._executor.metrics_of(branch)
+        metrics.wasted += 1
+        metrics.wasted_seconds += speculative.elapsed(time.perf_counter())
+
+
+class SpeculativeExecutor:
+    """
+    Starts the work of the likely branches of a turn before the route is known, see the module docstring.
+    One executor per session: the route prediction is learned from the routes of the session.
+
+    Args:
+        max_branches: Number of branches whose work is started per turn; 0 disables speculation.
+        default_order: Branches in the order of their likelihood before any route of the session is known.
+    """
+
+    def __init__(self, max_branches: int = 1, default_order: list[str] | None = None):
+        self.max_branches = max_branches
+        self.default_order = default_order or []
+        self.previous_route: str | None = None
+        self._transitions: dict[str | None, Counter] = {}
+        self._routes = Counter()
+        self.metrics: dict[str, BranchMetrics] = {}
+
+    def metrics_of(self, branch: str) -> BranchMetrics:
+        return self.metrics.setdefault(branch, BranchMetrics())
+
+    def record_route(self, route: str):
+        self._transitions.setdefault(self.previous_route, Counter())[route] += 1
+        self._routes[route] += 1
+        self.previous_route = route
+
+    def likely_branches(self, candidates: list[str]) -> list[str]:
+        """
+        Returns the candidates ordered by likelihood: how often they followed the previous route, then how often
+        they were chosen at all, then the previous route itself (users tend to stay on a topic), then the default
+        order.
+        """
+        following = self._transitions.get(self.previous_route, Counter())
+        default_rank = {branch: rank for rank, branch in enumerate(self.default_order)}
+        return sorted(
+            candidates,
+            key=lambda branch: (
+                -following[branch],
+                -self._routes[branch],
+                branch != self.previous_route,
+                default_rank.get(branch, len(default_rank)),
+            ),
+        )
+
+    def start(self, work: dict[str, tuple[Hashable, Callable[[], Awaitable[Any]]]]) -> Speculation:
+        """
+        Starts the work of the `max_branches` most likely branches among those given.
+
+        Args:
+            work: By branch, the key the work is done for and a coroutine function doing it; branches with key None
+                are not started (e.g. no car model known yet).
+        """
+        candidates = [branch for branch, (key, _) in work.items() if key is not None]
+        tasks = {}
+        for branch in self.likely_branches(candidates)[: self.max_branches]:
+            key, branch_work = work[branch]
+            tasks[branch] = _SpeculativeTask(key, branch_work)
+            self.metrics_of(branch).started += 1
+        return Speculation(self, tasks)
+
+    def log_metrics(self, event: str):
+        for branch, metrics in self.metrics.items():
+            logging.info(LogTiming(f"{event}:speculation:{branch} {metrics}"))
@@ -67,7 +67,7 @@ class SentenceWatcher:
         if self.buffer:
             sentence = self.buffer
             await self.callback(sentence, self.sentences, self.output_queue)
-        self.output_queue.put_nowait(SentenceWatcher.END_OF_STREAM)
+        await self.output_queue.put(SentenceWatcher.END_OF_STREAM)
         self.buffer = ""
         self.sentences = []
 
@@ -84,20 +84,20 @@ async def watch_timed_message_queue(timed_message_queue: asyncio.Queue, output_q
             break
         elif isinstance(message, BaseModel):
             logging.debug(f"Output queue, no timing: {message}")
-            output_queue.put_nowait(message)
+            await output_queue.put(message)
         # You must pass the TimedWebElementMessage(s) to the queue inside a list, even if it's a single object
         # this enables us to pass one or more sequentially timed messaged easily into the queue
         elif isinstance(message, TimedWebElementMessage):
             current_time = datetime.now() - t_start
             if current_time.total_seconds() > message.time_delta:
                 logging.warning(f"Timed message is late: {message.message}")
-                output_queue.put_nowait(message.message)
+                await output_queue.put(message.message)
             else:
                 delay = message.time_delta - current_time.total_seconds()
-                logging.info(f"Output queue: waiting for {delay} seconds to send message: {message.message}")
+                logging.debug(f"Output queue: waiting for {delay} seconds to send message: {message.message}")
                 await asyncio.sleep(delay)
-                output_queue.put_nowait(message.message)
-                logging.info(f"{datetime.now()} Output queue, {message}, current time is: {datetime.now() - t_start}")
+                await output_queue.put(message.message)
+                logging.debug(f"{datetime.now()} Output queue, {message}, current time is: {datetime.now() - t_start}")
         else:
             logging.error(
                 f"Timed message queue - unknown message type, expecting BaseModel or list[TimedWebElementMessage]: {type(message)} / {message}"
@@ -117,7 +117,7 @@ class TestSentenceAction:
 
     async def print_sentence(self, sentence: str, sentences: list[str], output_queue: asyncio.Queue) -> bool:
         message = TestMessage(content=sentence, sentence_count=self.sentence_count)
-        output_queue.put_nowait(TimedWebElementMessage(message=message, time_delta=1.0 + 2.0 * self.sentence_count))
+        await output_queue.put(TimedWebElementMessage(message=message, time_delta=1.0 + 2.0 * self.sentence_count))
         self.sentence_count += 1
         if self.sentence_limit and self.sentence_count == self.sentence_limit:
             return False
@@ -0,0 +1,220 @@
+"""
+Transcription of the user's speech while it is being recorded.
+
+Instead of uploading the whole recording after the user stopped talking, the frontend streams the audio over the
+websocket as binary messages (PCM16 mono at `STREAMING_AUDIO_CONFIG.sample_rate`) and sends an `end_of_speech`
+message when the user stops. The audio is fed to a `StreamingTranscriber` as it arrives, so when the user stops,
+only the end of the transcription is left to wait for.
+
+Two implementations are available, selected by `streaming_transcription` in the master config:
+
+* "realtime": the OpenAI real-time transcription service. Audio is transcribed while it is streamed; the transcript is
+  ready shortly after the final commit.
+* "buffered": collects the audio in memory and transcribes it with the regular speech-to-text model at the end of
+  speech. This saves the upload, but not the transcription round trip. Also useful as a local stand-in in tests,
+  with a custom `transcribe` function.
+
+The audio of one utterance is limited like an uploaded recording, by `max_audio_upload_bytes` and
+`max_audio_upload_seconds`: `append` raises `UtteranceTooLong` when a chunk would exceed the limit.
+"""
+
+import abc
+import asyncio
+import base64
+import io
+import json
+import logging
+import wave
+from typing import Awaitable, Callable
+
+import websockets
+
+from nevo_framework.config.audio_config import AudioConfig
+from nevo_framework.llm import llm_tools, openai_realtime
+
+# format of the audio streamed by the frontend; the real-time API expects 24 kHz PCM16 mono
+STREAMING_AUDIO_CONFIG = AudioConfig(sample_rate=24000, channels=1, sample_width=2)
+
+# maximum number of seconds to wait for the transcript after the end of speech
+TRANSCRIPT_TIMEOUT_SECONDS = 30
+
+
+class UtteranceTooLong(Exception):
+    """Raised by `StreamingTranscriber.append` when the audio of the utterance exceeds the limit."""
+
+
+def utterance_limit_bytes(max_bytes: int, max_seconds: float, config: AudioConfig = STREAMING_AUDIO_CONFIG) -> int:
+    """The number of bytes of streamed audio allowed by a limit in bytes and one in seconds."""
+    return min(max_bytes, int(max_seconds * config.bytes_per_second))
+
+
+class StreamingTranscriber(abc.ABC):
+    """
+    Transcribes one utterance whose audio arrives in chunks.
+
+    Args:
+        max_bytes: Maximum number of bytes of audio per utterance, None for no limit.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.received_bytes = 0
+
+    def _count(self, audio: bytes):
+        """Counts a chunk towards the limit. Call at the beginning of `append`."""
+        if self.max_bytes is not None and self.received_bytes + len(audio) > self.max_bytes:
+            raise UtteranceTooLong(f"The streamed audio exceeds the limit of {self.max_bytes} bytes.")
+        self.received_bytes += len(audio)
+
+    @abc.abstractmethod
+    async def start(self):
+        """Prepares the transcription, e.g. connects to a service. Called before the first chunk."""
+
+    @abc.abstractmethod
+    async def append(self, audio: bytes):
+        """Adds a chunk of audio."""
+
+    @abc.abstractmethod
+    async def finish(self) -> str:
+        """Called at the end of speech. Returns the transcript of all audio appended."""
+
+    async def close(self):
+        """Releases resources. Safe to call more than once, and without `finish`."""
+
+
+class BufferedStreamingTranscriber(StreamingTranscriber):
+    """
+    Collects the audio in memory and transcribes it as a WAV file at the end of speech.
+
+    Args:
+        transcribe: Function that transcribes a named file-like WAV recording. Defaults to the speech-to-text model.
+        config: Format of the streamed audio.
+        max_bytes: Maximum number of bytes of audio per utterance, None for no limit.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[io.BytesIO], Awaitable[str]] = llm_tools.transcribe_recording,
+        config: AudioConfig = STREAMING_AUDIO_CONFIG,
+        max_bytes: int | None = None,
+    ):
+        super().__init__(max_bytes=max_bytes)
+        self._transcribe = transcribe
+        self._config = config
+        self._pcm = bytearray()
+
+    async def start(self):
+        self._pcm.clear()
+        self.received_bytes = 0
+
+    async def append(self, audio: bytes):
+        self._count(audio)
+        self._pcm += audio
+
+    async def finish(self) -> str:
+        recording = io.BytesIO()
+        with wave.open(recording, "wb") as wav_file:
+            wav_file.setnchannels(self._config.channels)
+            wav_file.setsampwidth(self._config.sample_width)
+            wav_file.setframerate(self._config.sample_rate)
+            wav_file.writeframes(self._pcm)
+        self._pcm = bytearray()
+        recording.seek(0)
+        recording.name = "recording.wav"
+        return await self._transcribe(recording)
+
+    async def close(self):
+        self._pcm = bytearray()
+
+
+class RealtimeStreamingTranscriber(StreamingTranscriber):
+    """
+    Streams the audio to the OpenAI real-time transcription service. The service's turn detection is switched off;
+    the utterance ends when `finish` commits the audio buffer.
+
+    Args:
+        max_bytes: Maximum number of bytes of audio per utterance, None for no limit.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        super().__init__(max_bytes=max_bytes)
+        self._connection = None
+        self._websocket = None
+        self._receive_task: asyncio.Task | None = None
+        self._transcript: asyncio.Future[str] | None = None
+
+    async def start(self):
+        connection = openai_realtime.connect_to_transcriber()
+        # only a connection that was entered successfully is exited in `close`
+        self._websocket = await connection.__aenter__()
+        self._connection = connection
+        try:
+            ready = await openai_realtime.setup_transcriber(self._websocket, session_overrides={"turn_detection": None})
+        except BaseException:
+            await self.close()
+            raise
+        if not ready:
+            await self.close()
+            raise RuntimeError("Failed to set up the real-time transcriber.")
+        self._transcript = asyncio.get_running_loop().create_future()
+        self._receive_task = asyncio.create_task(self._receive())
+
+    async def append(self, audio: bytes):
+        self._count(audio)
+        message = {"type": "input_audio_buffer.append", "audio": base64.b64encode(audio).decode("utf-8")}
+        await self._websocket.send(json.dumps(message))
+
+    async def finish(self) -> str:
+        await self._websocket.send(json.dumps({"type": "input_audio_buffer.commit"}))
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._transcript), timeout=TRANSCRIPT_TIMEOUT_SECONDS)
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._receive_task:
+            self._receive_task.cancel()
+            self._receive_task = None
+        if self._transcript is not None:
+            if not self._transcript.done():
+                self._transcript.cancel()
+            elif not self._transcript.cancelled():
+                # an error nobody waited for, e.g. after the utterance was rejected; retrieve it to avoid a warning
+                self._transcript.exception()
+        if self._connection:
+            connection, self._connection = self._connection, None
+            await connection.__aexit__(None, None, None)
+
+    async def _receive(self):
+        try:
+            async for data in self._websocket:
+                message = json.loads(data)
+                if message["type"] == "conversation.item.input_audio_transcription.completed":
+                    if not self._transcript.done():
+                        self._transcript.set_result(message["transcript"])
+                elif message["type"] == "error":
+                    logging.error(f"Real-time transcriber error: {message}")
+                    if not self._transcript.done():
+                        self._transcript.set_exception(RuntimeError(f"Transcription failed: {message}"))
+        except websockets.ConnectionClosed:
+            if not self._transcript.done():
+                self._transcript.set_exception(RuntimeError("Connection to the real-time transcriber closed."))
+        except Exception as e:
+            # e.g. a malformed event; fail `finish` now instead of at the timeout
+            if not self._transcript.done():
+                self._transcript.set_exception(RuntimeError(f"Real-time transcriber failed: {e!r}"))
+
+
+def create_streaming_transcriber(mode: str, max_bytes: int | None = None) -> StreamingTranscriber:
+    """
+    Creates a transcriber for the `streaming_transcription` mode of the master config.
+
+    Args:
+        mode: "realtime" or "buffered".
+        max_bytes: Maximum number of bytes of audio per utterance, see `utterance_limit_bytes`.
+    """
+    if mode == "realtime":
+        return RealtimeStreamingTranscriber(max_bytes=max_bytes)
+    if mode == "buffered":
+        return BufferedStreamingTranscriber(max_bytes=max_bytes)
+    raise ValueError(f"Unknown streaming transcription mode: {mode}")
@@ -0,0 +1,100 @@
+"""
+Batching of the vector searches of concurrent sessions.
+
+A single vector search is a matrix-vector product; when several sessions run RAG lookups at about the same time, it
+is much cheaper to score all their queries with one matrix-matrix product. A `SearchBatcher` collects the searches
+submitted within a short window (see `MicroBatcher`) and runs them with one `search_many` call of the index, in a
+worker thread so the event loop is not blocked meanwhile.
+
+The index must have a method `search_many(query_embeddings, num_results=..., **filters)` which returns one list of
+(document, score) tuples per query. Searches are only batched with searches for the same number of results and
+filters. A search can be pinned to a given version of the index (`index`), e.g. to combine its results with a lexical
+search of the same version while the shared index may be reloaded in between.
+
+Use `get_search_batcher(shared_index)` to get the batcher shared by all sessions of the process.
+"""
+
+import asyncio
+from typing import Any, Callable, Hashable
+
+import numpy as np
+
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.retrieval.index_registry import SharedIndex
+from nevo_framework.retrieval.micro_batcher import MicroBatcher
+
+
+class SearchBatcher:
+    """
+    Runs vector searches in batches, see the module docstring.
+
+    Args:
+        get_index: Returns the index to search, called for every search (e.g. `SharedIndex.get`, to pick up reloads).
+        max_batch_size: Maximum number of queries per batch.
+        max_batch_delay_seconds: How long a search waits for others to share the batch with.
+    """
+
+    def __init__(self, get_index: Callable[[], Any], max_batch_size: int = 64, max_batch_delay_seconds: float = 0.002):
+        self._get_index = get_index
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay_seconds = max_batch_delay_seconds
+        self._batchers: dict[Hashable, MicroBatcher] = {}
+
+    async def search(
+        self, query_embedding: list[float] | np.ndarray, num_results: int = 5, index: Any = None, **filters: Any
+    ) -> list[tuple[Any, float]]:
+        """
+        Returns the (document, score) tuples of the best `num_results` documents for the query.
+
+        Args:
+            query_embedding: The embedding of the query.
+            num_results: The number of results.
+            index: The index to search; None for the current one of `get_index`.
+            filters: Passed to `search_many` of the index.
+        """
+        key = (num_results, tuple(sorted(filters.items())))
+        if (batcher := self._batchers.get(key)) is None:
+            batcher = MicroBatcher(
+                lambda queries: asyncio.to_thread(self._search_many, queries, num_results, filters),
+                self.max_batch_size,
+                self.max_batch_delay_seconds,
+            )
+            self._batchers[key] = batcher
+        index = index if index is not None else self._get_index()
+        return await batcher.submit((index, np.asarray(query_embedding, dtype=np.float32)))
+
+    def _search_many(self, queries: list[tuple[Any, np.ndarray]], num_results: int, filters: dict[str, Any]):
+        # normally all queries of a batch search the same index; after a reload, some may still search the old one
+        results: list = [None] * len(queries)
+        for index in {id(index): index for index, _ in queries}.values():
+            positions = [position for position, (query_index, _) in enumerate(queries) if query_index is index]
+            batch = np.stack([queries[position][1] for position in positions])
+            for position, result in zip(positions, index.search_many(batch, num_results=num_results, **filters)):
+                results[position] = result
+        return results
+
+    @property
+    def batches(self) -> int:
+        return sum(batcher.batches for batcher in self._batchers.values())
+
+    @property
+    def mean_batch_size(self) -> float:
+        batches = self.batches
+        return sum(batcher.items for batcher in self._batchers.values()) / batches if batches else 0.0
+
+
+_batchers: dict[str, SearchBatcher] = {}
+
+
+def get_search_batcher(shared_index: SharedIndex) -> SearchBatcher:
+    """
+    Returns the search batcher for the shared index, shared by all sessions of the process.
+    """
+    if shared_index.path not in _batchers:
+        config = get_master_config()
+        _batchers[shared_index.path] = SearchBatcher(
+            shared_index.get,
+            max_batch_size=config.search_batch_max_size,
+            max_batch_delay_seconds=config.search_batch_max_delay_ms / 1000,
+        )
+    return _batchers[shared_index.path]
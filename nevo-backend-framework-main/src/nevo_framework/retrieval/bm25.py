@@ -0,0 +1,175 @@
+"""
+Lexical search (BM25) with an in-process inverted index, and reciprocal rank fusion of several rankings.
+
+Many knowledge base questions are keyword lookups ("what is the boot volume of the A6"). A lexical index answers
+them without the query rewrite and the query embedding, which are network round trips; fused with the vector
+ranking it also helps on model names and technical terms that embeddings blur.
+
+The index is stored as arrays (sorted vocabulary, postings by term, document lengths) with the vectors of an index
+directory (`index_format`, see `arrays()` and `from_arrays()`) and opened memory-mapped like them: terms are looked
+up by binary search in the vocabulary array, no dictionary is built on load.
+
+Scores are normalized by the upper bound of the score, idf * (k1 + 1) summed over the query terms (the limit for a
+term occurring very often in a short document), so they lie in [0, 1] and can be compared against a fixed threshold,
+independently of the length of the query. A document of average length containing each query term once scores
+1 / (k1 + 1), about 0.45.
+"""
+
+import re
+
+import numpy as np
+
+ARRAY_NAMES = ("bm25_terms", "bm25_offsets", "bm25_documents", "bm25_frequencies", "bm25_lengths")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# frequent English words which carry no meaning for a lookup, and the remains of contractions ("what's", "I'd")
+STOPWORDS = frozenset(
+    "a about an and are as at be by can could do does for from has have how i in is it its me my of on or please "
+    "should tell than that the their them there they this to was what when where which who why will with would you "
+    "your d ll m re s t ve like want yes no ok okay".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words and numbers of the text, without stopwords; "A6" and "e-tron" give "a6", "e", "tron"."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int = 60) -> list[tuple]:
+    """
+    Fuses rankings of (hashable) items: each item scores the sum of 1 / (k + rank) over the rankings it appears in.
+    Returns the items and their scores, best first.
+
+    Args:
+        rankings: Items ordered best first, one list per ranking (e.g. vector and lexical search).
+        k: Damping of the rank; the common value 60 keeps single top ranks from dominating.
+    """
+    scores: dict = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class Bm25Index:
+    """
+    Okapi BM25 over a list of documents, see the module docstring.
+
+    Args:
+        terms: Sorted vocabulary.
+        offsets: The postings of term t are at `offsets[t]:offsets[t + 1]` of `documents` and `frequencies`.
+        documents: Document (row) ids of the postings.
+        frequencies: Number of occurrences of the term in the document.
+        lengths: Number of tokens per document.
+        k1: Saturation of the term frequency.
+        b: Strength of the document length normalization.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        documents: np.ndarray,
+        frequencies: np.ndarray,
+        lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.documents = documents
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        document_frequencies = np.diff(np.asarray(offsets))
+        self.idf = np.log(1 + (len(lengths) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        self._length_norm = k1 * (1 - b + b * np.asarray(lengths) / max(float(np.mean(lengths)), 1.0))
+
+    @staticmethod
+    def build(texts: list[str]) -> "Bm25Index":
+        """Builds the index of the texts, one document per text."""
+        postings: dict[str, dict[int, int]] = {}
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for document, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[document] = len(tokens)
+            for token in tokens:
+                term_postings = postings.setdefault(token, {})
+                term_postings[document] = term_postings.get(document, 0) + 1
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in terms], out=offsets[1:])
+        documents = np.fromiter(
+            (document for term in terms for document in postings[term]), dtype=np.int32, count=offsets[-1]
+        )
+        frequencies = np.fromiter(
+            (frequency for term in terms for frequency in postings[term].values()), dtype=np.float32, count=offsets[-1]
+        )
+        return Bm25Index(np.array(terms, dtype=str), offsets, documents, frequencies, lengths)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The arrays to store in an index directory."""
+        return dict(zip(ARRAY_NAMES, (self.terms, self.offsets, self.documents, self.frequencies, self.lengths)))
+
+    @staticmethod
+    def from_arrays(arrays: dict[str, np.ndarray]) -> "Bm25Index":
+        return Bm25Index(*(arrays[name] for name in ARRAY_NAMES))
+
+    def _term_ids(self, tokens: list[str]) -> np.ndarray:
+        """Ids of the tokens in the vocabulary; unknown tokens are left out, repeated ones count repeatedly."""
+        if not tokens or not len(self.terms):
+            return np.zeros(0, dtype=np.int64)
+        tokens = np.array(tokens, dtype=str)
+        positions = np.searchsorted(self.terms, tokens).clip(max=len(self.terms) - 1)
+        return positions[self.terms[positions] == tokens]
+
+    def search(
+        self, query: str, k: int, allowed: slice | np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the row ids and normalized scores (see the module docstring) of the best k documents containing
+        at least one query term, best first.
+
+        Args:
+            query: The query text.
+            k: Maximum number of results.
+            allowed: Only these rows (a range as slice, or row ids) are returned, None for all.
+        """
+        tokens = tokenize(query)
+        term_ids = self._term_ids(tokens)
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in term_ids:
+            rows = np.asarray(self.documents[self.offsets[term] : self.offsets[term + 1]])
+            frequencies = np.asarray(self.frequencies[self.offsets[term] : self.offsets[term + 1]])
+            scores[rows] += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + self._length_norm[rows])
+        if allowed is not None:
+            allowed_scores = np.zeros_like(scores)
+            allowed_scores[allowed] = scores[allowed]
+            scores = allowed_scores
+        # the upper bound of the score of a document containing every query term (known or not); unknown terms count
+        # with the highest idf, so a query about something the index does not know is not confident
+        best_possible = (self.k1 + 1) * (
+            (len(tokens) - len(term_ids)) * float(np.max(self.idf, initial=1.0)) + float(np.sum(self.idf[term_ids]))
+        )
+        rows = np.flatnonzero(scores)
+        k = min(k, len(rows))
+        if k <= 0 or best_possible <= 0:
+            return rows[:0], scores[:0]
+        top = rows[np.argpartition(-scores[rows], k - 1)[:k]] if k < len(rows) else rows
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top] / best_possible
+
+    def matched_terms(self, query: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the number of distinct query terms each of the rows contains.
+
+        Args:
+            query: The query text.
+            rows: Document (row) ids.
+        """
+        rows = np.asarray(rows)
+        counts = np.zeros(len(rows), dtype=np.int64)
+        for term in np.unique(self._term_ids(tokenize(query))):
+            counts += np.isin(rows, self.documents[self.offsets[term] : self.offsets[term + 1]])
+        return counts
@@ -0,0 +1,195 @@
+"""
+Asynchronous, cached computation of embeddings, e.g. of the search queries of RAG lookups.
+
+Embedding a query with the synchronous OpenAI client blocks the event loop, and with it the audio streaming of all
+sessions, for a whole HTTP round trip. The `EmbeddingService` instead
+
+* uses the async "embedding" client of the master config,
+* caches embeddings by normalized text in an LRU cache, optionally backed by an SQLite file which survives restarts
+  (`embedding_cache_path` in the master config),
+* coalesces concurrent requests for the same text into one,
+* micro-batches the requests of different sessions arriving at about the same time into one `embeddings.create` call.
+
+Use `get_embedding_service(model)` to get the service shared by all sessions of the process.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from typing import Any
+
+import numpy as np
+from cachetools import LRUCache
+
+from nevo_framework.config.master_config import get_master_config
+from nevo_framework.retrieval.micro_batcher import MicroBatcher
+
+CONFIG = get_master_config()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes the text used as cache key and sent to the embedding model: Unicode NFC, whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingDiskCache:
+    """
+    Embeddings stored in an SQLite file, keyed by model and text (or another key, e.g. a hash of the text).
+
+    The connection is opened on first use, and again in a process forked after that: services are created at import
+    time, before the workers are forked (see `nevo_framework.api.workers`), and an SQLite connection must not be
+    used across a fork.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._connection_pid: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection of this process, opening it if needed. Call with the lock held."""
+        if self._connection is None or self._connection_pid != os.getpid():
+            # a connection inherited from the parent process is dropped without closing it, the parent still uses it
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection_pid = os.getpid()
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings "
+                    "(model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))"
+                )
+        return self._connection
+
+    def get(self, model: str, text: str) -> np.ndarray | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND text = ?", (model, text)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def put_many(self, model: str, items: list[tuple[str, np.ndarray]]):
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                [(model, text, vector.tobytes()) for text, vector in items],
+            )
+
+
+class EmbeddingService:
+    """
+    Computes embeddings with `model`, see the module docstring. The returned embeddings are read-only float32 arrays
+    shared between callers.
+
+    Args:
+        client: Async OpenAI client (or `ScheduledClient`) used for the `embeddings.create` calls.
+        model: Name of the embedding model.
+        cache_size: Number of embeddings kept in memory.
+        cache_path: SQLite file to persist the embeddings in, or None to only cache in memory.
+        max_batch_size: Maximum number of texts embedded in one call.
+        max_batch_delay_seconds: How long a request waits for others to share the call with.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        cache_size: int = 10_000,
+        cache_path: str | None = None,
+        max_batch_size: int = 64,
+        max_batch_delay_seconds: float = 0.005,
+    ):
+        self._client = client
+        self.model = model
+        self._cache: LRUCache[str, np.ndarray] = LRUCache(maxsize=cache_size)
+        self._disk_cache = EmbeddingDiskCache(cache_path) if cache_path else None
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._batcher = MicroBatcher(self._embed_batch, max_batch_size, max_batch_delay_seconds)
+        self.hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Returns the embedding of the text.
+        """
+        key = normalize_text(text)
+        if (embedding := self._cache.get(key)) is not None:
+            self.hits += 1
+            return embedding
+        if task := self._in_flight.get(key):
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(self._compute(key))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._computed, key))
+        # a cancelled caller must not cancel the computation others are waiting for
+        return await asyncio.shield(task)
+
+    def _computed(self, key: str, task: asyncio.Task):
+        del self._in_flight[key]
+        if not task.cancelled() and task.exception():
+            # also raised to the callers still waiting; retrieved here in case all of them were cancelled
+            logging.debug(f"Computing an embedding failed: {task.exception()}")
+
+    async def embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        """
+        Returns the embeddings of the texts, in the same order.
+        """
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    async def _compute(self, key: str) -> np.ndarray:
+        embedding = None
+        if self._disk_cache:
+            embedding = await asyncio.to_thread(self._disk_cache.get, self.model, key)
+            if embedding is not None:
+                self.disk_hits += 1
+        if embedding is None:
+            self.misses += 1
+            embedding = await self._batcher.submit(key)
+        embedding.flags.writeable = False
+        self._cache[key] = embedding
+        return embedding
+
+    async def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
+        response = await self._client.embeddings.create(input=texts, model=self.model)
+        data = sorted(response.data, key=lambda item: item.index)
+        embeddings = [np.asarray(item.embedding, dtype=np.float32) for item in data]
+        if self._disk_cache:
+            try:
+                await asyncio.to_thread(self._disk_cache.put_many, self.model, list(zip(texts, embeddings)))
+            except sqlite3.Error as e:
+                logging.warning(f"Could not store embeddings in the disk cache: {e}")
+        return embeddings
+
+    @property
+    def stats(self) -> str:
+        return (
+            f"hits={self.hits} disk_hits={self.disk_hits} coalesced={self.coalesced} misses={self.misses} "
+            f"batches={self._batcher.batches} mean_batch_size={self._batcher.mean_batch_size:.1f}"
+        )
+
+
+_services: dict[str, EmbeddingService] = {}
+
+
+def get_embedding_service(model: str = "text-embedding-3-small") -> EmbeddingService:
+    """
+    Returns the embedding service for the model, shared by all sessions of the process.
+    """
+    if model not in _services:
+        _services[model] = EmbeddingService(
+            CONFIG.language_model_config.client["embedding"],
+            model,
+            cache_size=CONFIG.embedding_cache_size,
+            cache_path=CONFIG.embedding_cache_path,
+            max_batch_size=CONFIG.embedding_batch_max_size,
+            max_batch_delay_seconds=CONFIG.embedding_batch_max_delay_ms / 1000,
+        )
+    return _services[model]
@@ -0,0 +1,163 @@
+"""
+Incremental computation of the embeddings of a knowledge base, for building vector indexes offline.
+
+Building an index used to embed every snippet in one `embeddings.create` call, on the first request after the index
+file went missing. `embed_incrementally` instead
+
+* hashes the text of every snippet and reuses the embeddings of unchanged snippets from the previous index,
+* embeds the remaining texts in batches (bounded by number of texts and characters per request), with at most
+  `max_concurrency` requests in flight,
+* stores every embedded batch in a checkpoint file, so an interrupted build resumes where it stopped.
+
+The caller writes the index with `index_format.write_index`, which publishes it atomically. The checkpoint can be
+deleted afterwards (`remove_checkpoint`).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from nevo_framework.retrieval.embedding_service import EmbeddingDiskCache
+
+# limits of one embeddings request: the API accepts up to 2048 inputs and 300k tokens (about 4 characters each)
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_BATCH_CHARACTERS = 600_000
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the hash identifying the embedding of a text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class BuildStats:
+    total: int = 0
+    # embeddings taken from the previous index
+    reused: int = 0
+    # embeddings taken from the checkpoint of an interrupted build
+    resumed: int = 0
+    embedded: int = 0
+    requests: int = 0
+    failed_batches: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.total} texts: {self.reused} reused, {self.resumed} resumed, {self.embedded} embedded "
+            f"in {self.requests} requests"
+        )
+
+
+def batches(texts: list[str], batch_size: int, max_batch_characters: int) -> list[list[str]]:
+    """
+    Splits texts into batches of at most `batch_size` texts and `max_batch_characters` characters (a longer text gets
+    a batch of its own).
+    """
+    result: list[list[str]] = []
+    batch: list[str] = []
+    characters = 0
+    for text in texts:
+        if batch and (len(batch) >= batch_size or characters + len(text) > max_batch_characters):
+            result.append(batch)
+            batch, characters = [], 0
+        batch.append(text)
+        characters += len(text)
+    if batch:
+        result.append(batch)
+    return result
+
+
+async def embed_incrementally(
+    texts: list[str],
+    client: Any,
+    model: str,
+    previous: dict[str, np.ndarray] | None = None,
+    checkpoint_path: str | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_characters: int = DEFAULT_MAX_BATCH_CHARACTERS,
+    max_concurrency: int = 4,
+) -> tuple[np.ndarray, BuildStats]:
+    """
+    Returns the embeddings of the texts (float32, one row per text) and statistics of the build.
+
+    Args:
+        texts: The texts to embed.
+        client: Async OpenAI client (or `ScheduledClient`) for the `embeddings.create` calls.
+        model: Name of the embedding model.
+        previous: Embeddings of the previous index by `text_hash`; they must have been computed with `model`.
+        checkpoint_path: SQLite file the embedded batches are stored in; an interrupted build resumes from it.
+        batch_size: Maximum number of texts per request.
+        max_batch_characters: Maximum number of characters per request.
+        max_concurrency: Maximum number of requests in flight.
+
+    Raises:
+        RuntimeError: If batches failed to embed. The embedded batches are in the checkpoint, run the build again.
+    """
+    previous = previous or {}
+    checkpoint = EmbeddingDiskCache(checkpoint_path) if checkpoint_path else None
+    stats = BuildStats(total=len(texts))
+    hashes = [text_hash(text) for text in texts]
+    embeddings: dict[str, np.ndarray] = {}
+
+    missing: dict[str, str] = {}
+    for key, text in zip(hashes, texts):
+        if key in embeddings or key in missing:
+            continue
+        if (embedding := previous.get(key)) is not None:
+            embeddings[key] = embedding
+            stats.reused += 1
+        elif checkpoint and (embedding := checkpoint.get(model, key)) is not None:
+            embeddings[key] = embedding
+            stats.resumed += 1
+        else:
+            missing[key] = text
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embed_batch(batch: list[str]):
+        async with semaphore:
+            try:
+                response = await client.embeddings.create(input=batch, model=model)
+            except Exception as e:
+                logging.error(f"Embedding a batch of {len(batch)} texts failed: {e}")
+                stats.failed_batches.append(str(e))
+                return
+        stats.requests += 1
+        data = sorted(response.data, key=lambda item: item.index)
+        batch_embeddings = [
+            (text_hash(text), np.asarray(item.embedding, dtype=np.float32)) for text, item in zip(batch, data)
+        ]
+        embeddings.update(batch_embeddings)
+        stats.embedded += len(batch)
+        if checkpoint:
+            await asyncio.to_thread(checkpoint.put_many, model, batch_embeddings)
+        logging.info(f"Embedded {stats.embedded} of {len(missing)} texts")
+
+    await asyncio.gather(
+        *(embed_batch(batch) for batch in batches(list(missing.values()), batch_size, max_batch_characters))
+    )
+    if stats.failed_batches:
+        raise RuntimeError(
+            f"{len(stats.failed_batches)} batches failed to embed ({stats.failed_batches[0]}); {stats}. "
+            "Run the build again to resume."
+        )
+    dimension = len(next(iter(embeddings.values()))) if embeddings else 0
+    matrix = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, key in enumerate(hashes):
+        matrix[row] = embeddings[key]
+    return matrix, stats
+
+
+def remove_checkpoint(checkpoint_path: str):
+    """
+    Deletes the checkpoint file of a build, once the index is written.
+    """
+    for path in (checkpoint_path, f"{checkpoint_path}-journal"):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,166 @@
+"""
+On-disk format of vector indexes.
+
+An index is a directory with three files:
+
+* `header.json`: format version, embedding model, dimension, number of rows, and a hash of the content,
+* `vectors.npy`: the embedding matrix (float32, one row per record), opened memory-mapped,
+* `records.json`: one JSON object (or string) per row, e.g. the knowledge base snippet the row was computed from.
+
+and optionally further arrays of search structures (e.g. the inverted lists of an `ivf.IvfIndex`), one `<name>.npy`
+each, also opened memory-mapped (`read_array`).
+
+Loading maps the matrix instead of reading it: startup does not depend on the size of the index, and all worker
+processes share the same pages through the page cache. Unlike a pickled object, the format does not depend on class
+or module names of the code that wrote it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.json"
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index directory is missing, incomplete or incompatible."""
+
+
+@dataclass
+class IndexHeader:
+    format_version: int
+    embedding_model: str
+    dimension: int
+    count: int
+    # hash of the records, to tell whether an index was built from the current knowledge base
+    content_hash: str
+    # rows are scaled to unit length
+    normalized: bool = True
+    # names of the additional arrays
+    arrays: list[str] = field(default_factory=list)
+
+
+def content_hash(records: list[Any]) -> str:
+    """
+    Returns a hash of the records, independent of key order.
+    """
+    canonical = json.dumps(records, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def write_index(
+    path: str,
+    vectors: np.ndarray,
+    records: list[Any],
+    embedding_model: str,
+    normalized: bool = True,
+    arrays: dict[str, np.ndarray] | None = None,
+) -> IndexHeader:
+    """
+    Writes an index directory. The directory is written next to `path` and then swapped in, so readers never see a
+    partially written index; memory maps of the replaced version stay valid until they are closed.
+
+    Args:
+        path: The index directory.
+        vectors: Matrix with one row per record.
+        records: JSON-serializable record per row.
+        embedding_model: Name of the model which computed the vectors.
+        normalized: Whether the rows are scaled to unit length.
+        arrays: Additional arrays to store, by name.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(records):
+        raise IndexFormatError(f"Expected one vector per record, got {vectors.shape} for {len(records)} records.")
+    header = IndexHeader(
+        format_version=FORMAT_VERSION,
+        embedding_model=embedding_model,
+        dimension=vectors.shape[1],
+        count=len(records),
+        content_hash=content_hash(records),
+        normalized=normalized,
+        arrays=sorted(arrays or {}),
+    )
+
+    path = os.path.normpath(path)
+    temporary_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+    np.save(os.path.join(temporary_path, VECTORS_FILE), vectors)
+    for name, array in (arrays or {}).items():
+        np.save(os.path.join(temporary_path, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(temporary_path, RECORDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+    # the header is written last: a directory with a header is complete
+    with open(os.path.join(temporary_path, HEADER_FILE), "w", encoding="utf-8") as f:
+        json.dump(asdict(header), f, indent=2)
+
+    if os.path.exists(path):
+        old_path = f"{path}.old-{os.getpid()}"
+        os.rename(path, old_path)
+        os.rename(temporary_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(temporary_path, path)
+    return header
+
+
+def read_header(path: str) -> IndexHeader:
+    """
+    Reads the header of an index directory.
+    """
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise IndexFormatError(f"No index at {path} ({HEADER_FILE} missing).")
+    with open(header_path, encoding="utf-8") as f:
+        values = json.load(f)
+    # fields added by later versions of the same format version are ignored
+    header = IndexHeader(**{key.name: values[key.name] for key in fields(IndexHeader) if key.name in values})
+    if header.format_version > FORMAT_VERSION:
+        raise IndexFormatError(
+            f"Index at {path} has format version {header.format_version}, this code reads up to {FORMAT_VERSION}."
+        )
+    return header
+
+
+def read_index(path: str, embedding_model: str | None = None) -> tuple[IndexHeader, np.ndarray, list[Any]]:
+    """
+    Opens an index directory. The returned matrix is a read-only memory map of the vectors file.
+
+    Args:
+        path: The index directory.
+        embedding_model: If given, the index must have been built with this model.
+    """
+    header = read_header(path)
+    if embedding_model is not None and header.embedding_model != embedding_model:
+        raise IndexFormatError(
+            f"Index at {path} was built with {header.embedding_model}, but {embedding_model} is used for queries."
+        )
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    if vectors.shape != (header.count, header.dimension) or vectors.dtype != np.float32:
+        raise IndexFormatError(
+            f"Vectors of index at {path} are {vectors.dtype} {vectors.shape}, expected float32 "
+            f"{(header.count, header.dimension)}."
+        )
+    with open(os.path.join(path, RECORDS_FILE), encoding="utf-8") as f:
+        records = json.load(f)
+    if len(records) != header.count:
+        raise IndexFormatError(f"Index at {path} has {len(records)} records, expected {header.count}.")
+    return header, vectors, records
+
+
+def read_array(path: str, header: IndexHeader, name: str) -> np.ndarray | None:
+    """
+    Opens an additional array of an index directory memory-mapped, or returns None if the index has none of the name.
+    """
+    if name not in header.arrays:
+        return None
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
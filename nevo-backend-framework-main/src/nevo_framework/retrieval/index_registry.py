@@ -0,0 +1,146 @@
+"""
+A process-wide registry for read-only indexes (vector stores, lookup tables, ...) which are loaded from a file.
+
+Agents are typically created once per session, but the data they search is the same for every session. Instead of
+loading an index in each agent's constructor, agents ask the registry for a `SharedIndex` handle. The index is loaded
+once per process, and every handle for the same file points to the same in-memory object.
+
+The registry watches the source file. When the file changes, the index is reloaded in a background thread and swapped
+in atomically: callers either get the old or the new index, never a half-loaded one.
+
+Indexes handed out by the registry are shared between all sessions and must be treated as read-only.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+# default number of seconds between two checks whether the source file of an index has changed
+DEFAULT_CHECK_INTERVAL_SECONDS = 10.0
+
+
+def _file_signature(path: str) -> tuple[int, int] | None:
+    """Returns (modification time, size) of a file or directory, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SharedIndex(Generic[T]):
+    """
+    Handle for an index that is loaded from `path` using `loader` and shared by all users in the process.
+
+    Use `get()` every time the index is needed rather than keeping a reference to the returned object,
+    so that a reloaded index is picked up.
+    """
+
+    def __init__(self, path: str, loader: Callable[[str], T], check_interval_seconds: float) -> None:
+        self.path = path
+        self._loader = loader
+        self._check_interval_seconds = check_interval_seconds
+        self._index: T | None = None
+        self._signature: tuple[int, int] | None = None
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._reloading = False
+
+    def is_loaded(self) -> bool:
+        return self._index is not None
+
+    def get(self) -> T:
+        """
+        Returns the current version of the index, loading it if this is the first access in the process.
+        If the source file has changed, a reload is started in the background and the current version is returned.
+        """
+        index = self._index
+        if index is None:
+            return self.load()
+        self._maybe_reload()
+        return index
+
+    def load(self) -> T:
+        """
+        Loads the index (blocking) unless it is already loaded. Concurrent callers wait for the same load.
+        """
+        with self._load_lock:
+            if self._index is None:
+                self._index, self._signature = self._load()
+                self._last_check = time.monotonic()
+            return self._index
+
+    def _load(self) -> tuple[T, tuple[int, int] | None]:
+        # take the signature before loading, so a change during loading triggers another reload
+        signature = _file_signature(self.path)
+        start = time.perf_counter()
+        index = self._loader(self.path)
+        logging.info(f"SharedIndex: loaded {self.path} in {time.perf_counter() - start:.2f}s")
+        return index, signature
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._reloading or now - self._last_check < self._check_interval_seconds:
+            return
+        self._last_check = now
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            # a missing file is not a reason to drop an index we already have
+            return
+        self._reloading = True
+        threading.Thread(target=self._reload, name=f"reload-{os.path.basename(self.path)}", daemon=True).start()
+
+    def _reload(self):
+        try:
+            index, signature = self._load()
+            with self._load_lock:
+                # a single reference assignment, so readers see either the old or the new index
+                self._index, self._signature = index, signature
+        except Exception as e:
+            logging.error(f"SharedIndex: reloading {self.path} failed, keeping the previous version: {e}")
+        finally:
+            self._reloading = False
+
+
+_registry: dict[str, SharedIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_shared_index(
+    path: str,
+    loader: Callable[[str], T],
+    check_interval_seconds: float = DEFAULT_CHECK_INTERVAL_SECONDS,
+) -> SharedIndex[T]:
+    """
+    Returns the process-wide handle for the index stored at `path`. The first call registers the index with
+    the given `loader`, later calls for the same path return the same handle. The index itself is loaded lazily
+    on the first `get()`, or up front by `preload_registered_indexes`.
+
+    Args:
+        path: Path to the file (or directory) the index is loaded from.
+        loader: Function that loads the index from the path.
+        check_interval_seconds: Minimum number of seconds between two checks whether the file has changed.
+    """
+    key = os.path.abspath(path)
+    with _registry_lock:
+        if (shared_index := _registry.get(key)) is None:
+            shared_index = SharedIndex(path=path, loader=loader, check_interval_seconds=check_interval_seconds)
+            _registry[key] = shared_index
+        return shared_index
+
+
+def preload_registered_indexes():
+    """
+    Loads all registered indexes that are not loaded yet. Blocking; run it in a thread when called from async code.
+    """
+    with _registry_lock:
+        shared_indexes = list(_registry.values())
+    for shared_index in shared_indexes:
+        try:
+            shared_index.load()
+        except Exception as e:
+            logging.error(f"Preloading index {shared_index.path} failed: {e}")
@@ -0,0 +1,158 @@
+"""
+Approximate nearest-neighbour search with an inverted file index (IVF), in numpy.
+
+Brute-force search scores every row of the embedding matrix, which is fine for a few thousand snippets but not for a
+catalogue of millions. An `IvfIndex` clusters the rows with (spherical) k-means; a query is only scored against the
+rows of the `nprobe` clusters whose centroids are closest to it. `nprobe` trades recall for speed.
+
+The index consists of three arrays (centroids, row ids ordered by cluster, start of each cluster in that order), which
+are stored with the vectors of an index directory (`index_format`, see `arrays()` and `from_arrays()`) and opened
+memory-mapped like them.
+
+Searches can be restricted to a subset of the rows (e.g. the rows of one vehicle model). If the probed clusters
+contain fewer than the requested number of allowed rows, the allowed rows are searched exhaustively instead.
+"""
+
+import math
+
+import numpy as np
+
+ARRAY_NAMES = ("ivf_centroids", "ivf_order", "ivf_offsets")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, chunk_rows: int = 65536) -> np.ndarray:
+    """Returns the index of the closest centroid of each row, scoring the rows in chunks."""
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), chunk_rows):
+        chunk = np.asarray(matrix[start : start + chunk_rows], dtype=np.float32)
+        assignments[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(
+    matrix: np.ndarray, num_clusters: int, iterations: int = 10, sample_size: int = 100_000, seed: int = 0
+) -> np.ndarray:
+    """
+    Returns `num_clusters` unit-length centroids of the rows (unit-length embeddings), trained on a sample of rows.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(max(sample_size, num_clusters), len(matrix))
+    sample_rows = np.sort(rng.choice(len(matrix), sample_size, replace=False))
+    sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=num_clusters) == 0
+        # re-seed empty clusters with random rows
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class IvfIndex:
+    """
+    Inverted file index over the rows of an embedding matrix, see the module docstring.
+
+    Args:
+        centroids: Unit-length cluster centroids, one per row.
+        order: Row ids of the matrix, ordered by cluster.
+        offsets: The rows of cluster c are `order[offsets[c]:offsets[c + 1]]`.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @staticmethod
+    def build(
+        matrix: np.ndarray,
+        num_clusters: int | None = None,
+        iterations: int = 10,
+        sample_size: int = 100_000,
+        seed: int = 0,
+    ) -> "IvfIndex":
+        """
+        Clusters the rows of the matrix (unit-length embeddings).
+
+        Args:
+            matrix: The embeddings, may be memory-mapped.
+            num_clusters: Number of clusters; default about 4 * sqrt(rows).
+            iterations: Iterations of k-means.
+            sample_size: Number of rows k-means is trained on; all rows are assigned afterwards.
+            seed: Seed of the random sampling.
+        """
+        num_clusters = min(num_clusters or max(1, round(4 * math.sqrt(len(matrix)))), len(matrix))
+        centroids = kmeans(matrix, num_clusters, iterations, sample_size, seed)
+        assignments = _assign(matrix, centroids)
+        order = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.zeros(num_clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=num_clusters), out=offsets[1:])
+        return IvfIndex(centroids, order, offsets)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The arrays to store in an index directory."""
+        return dict(zip(ARRAY_NAMES, (self.centroids, self.order, self.offsets)))
+
+    @staticmethod
+    def from_arrays(arrays: dict[str, np.ndarray]) -> "IvfIndex":
+        return IvfIndex(*(arrays[name] for name in ARRAY_NAMES))
+
+    @property
+    def num_clusters(self) -> int:
+        return len(self.centroids)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Returns the (sorted) row ids of the `nprobe` clusters closest to the query."""
+        nprobe = min(nprobe, self.num_clusters)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.num_clusters:
+            clusters = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            clusters = np.arange(self.num_clusters)
+        rows = np.concatenate([self.order[self.offsets[c] : self.offsets[c + 1]] for c in clusters])
+        # sorted rows read a memory-mapped matrix more sequentially
+        return np.sort(rows)
+
+    def search(
+        self,
+        query: np.ndarray,
+        matrix: np.ndarray,
+        k: int,
+        nprobe: int,
+        allowed: slice | np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the row ids and scores of the (approximately) best k rows for the query, best first.
+
+        Args:
+            query: Unit-length query embedding.
+            matrix: The embeddings the index was built for.
+            k: Number of results.
+            nprobe: Number of clusters searched.
+            allowed: Only these rows (a range as slice, or sorted row ids) are returned, None for all.
+        """
+        rows = self.candidates(query, nprobe)
+        if isinstance(allowed, slice):
+            rows = rows[(rows >= allowed.start) & (rows < allowed.stop)]
+        elif allowed is not None:
+            positions = np.searchsorted(allowed, rows).clip(max=max(len(allowed) - 1, 0))
+            rows = rows[allowed[positions] == rows] if len(allowed) else rows[:0]
+        if len(rows) < k:
+            # too few (allowed) rows in the probed clusters, e.g. for a rare filter value
+            rows = np.arange(len(matrix)) if allowed is None else np.arange(len(matrix))[allowed]
+        scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+        k = min(k, len(rows))
+        if k <= 0:
+            return rows[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
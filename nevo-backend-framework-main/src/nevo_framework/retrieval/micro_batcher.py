@@ -0,0 +1,85 @@
+"""
+Micro-batching of concurrent requests.
+
+Many sessions may need the same kind of remote call at the same moment (e.g. embedding a query for a RAG lookup).
+A `MicroBatcher` collects the items submitted within a short window (or until the batch is full) and processes them
+with a single call, while each caller simply awaits its own result.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects submitted items into batches and processes each batch with one call to `process_batch`.
+
+    Args:
+        process_batch: Processes a batch of items, returning one result per item in the same order.
+        max_batch_size: A batch is processed as soon as it has this many items.
+        max_delay_seconds: A batch is processed at the latest this long after its first item was submitted.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list[T]], Awaitable[list[R]]],
+        max_batch_size: int = 64,
+        max_delay_seconds: float = 0.005,
+    ):
+        self._process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self._pending: list[tuple[T, asyncio.Future[R]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        """
+        Adds the item to the next batch and returns its result once the batch was processed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future[R]]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self._process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch of {len(batch)} items returned {len(results)} results.")
+        except Exception as e:
+            logging.error(f"Processing a batch of {len(batch)} items failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # the caller may have been cancelled in the meantime
+            if not future.done():
+                future.set_result(result)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
@@ -0,0 +1,115 @@
+"""
+Quantized and truncated embedding matrices for the coarse stage of a vector search.
+
+A float32 embedding matrix of `text-embedding-3-small` takes 6 KB per snippet. A quantized copy takes half
+("float16") or a quarter ("int8", scalar quantization with one scale per dimension) of that. The copy can also keep
+only a prefix of the dimensions, re-normalized: `text-embedding-3-*` models are trained so that a prefix (e.g. 256
+of 1536 dimensions) is still a good embedding, and scoring it is correspondingly faster.
+
+The search scores all rows on the copy, then re-ranks the best candidates exactly on the full-precision matrix,
+which can stay memory-mapped (`index_format`): only the rows of the candidates are read from it.
+
+The quantized matrix is dequantized in chunks of rows while scoring, so scoring needs little more memory than the
+quantized matrix itself.
+"""
+
+from typing import Literal
+
+import numpy as np
+
+# "float32" keeps the precision, for a truncated copy only
+Quantization = Literal["float32", "float16", "int8"]
+
+# rows dequantized at a time while scoring
+CHUNK_ROWS = 4096
+
+
+class QuantizedMatrix:
+    """
+    A quantized (and possibly truncated) copy of an embedding matrix, see `quantize`.
+    """
+
+    def __init__(
+        self, kind: Quantization, data: np.ndarray, scale: np.ndarray | None = None, dimensions: int | None = None
+    ):
+        self.kind = kind
+        self.data = data
+        # per dimension, int8 only
+        self.scale = scale
+        # number of leading dimensions kept, None for all
+        self.dimensions = dimensions
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, rows: slice | np.ndarray) -> "QuantizedMatrix":
+        return QuantizedMatrix(self.kind, self.data[rows], self.scale, self.dimensions)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Returns the approximate dot products of the queries (one per row) with all rows, shape (queries, rows).
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.dimensions is not None:
+            queries = _normalize(queries[:, : self.dimensions])
+        if self.scale is not None:
+            # (q * s) . x_quantized == q . (s * x_quantized)
+            queries = queries * self.scale
+        if self.data.dtype == np.float32:
+            return queries @ self.data.T
+        scores = np.empty((len(queries), len(self.data)), dtype=np.float32)
+        for start in range(0, len(self.data), CHUNK_ROWS):
+            chunk = self.data[start : start + CHUNK_ROWS].astype(np.float32)
+            scores[:, start : start + len(chunk)] = queries @ chunk.T
+        return scores
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def quantize(matrix: np.ndarray, kind: Quantization, dimensions: int | None = None) -> QuantizedMatrix:
+    """
+    Returns a quantized copy of the matrix (one embedding per row).
+
+    Args:
+        matrix: The embeddings.
+        kind: "float32" (only with `dimensions`), "float16" or "int8".
+        dimensions: Keep only this many leading dimensions, re-normalized; None keeps all.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dimensions is not None:
+        if dimensions >= matrix.shape[1]:
+            dimensions = None
+        else:
+            matrix = _normalize(matrix[:, :dimensions])
+    if kind == "float32" and dimensions is not None:
+        return QuantizedMatrix(kind, np.ascontiguousarray(matrix), dimensions=dimensions)
+    if kind == "float16":
+        return QuantizedMatrix(kind, matrix.astype(np.float16), dimensions=dimensions)
+    if kind == "int8":
+        scale = np.abs(matrix).max(axis=0) / 127 if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+        scale[scale == 0] = 1
+        data = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+        return QuantizedMatrix(kind, data, scale.astype(np.float32), dimensions)
+    raise ValueError(f"Unknown quantization {kind!r} for {dimensions} dimensions, expected 'float16' or 'int8'.")
+
+
+def rerank(queries: np.ndarray, matrix: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """
+    Returns the exact dot products of each query with its candidate rows of the full-precision matrix.
+
+    Args:
+        queries: One query per row.
+        matrix: The full-precision matrix (may be memory-mapped; only the candidate rows are read).
+        candidates: Row indices of the candidates, one row of candidates per query.
+    """
+    unique_rows, positions = np.unique(candidates, return_inverse=True)
+    exact = np.asarray(queries, dtype=np.float32) @ np.asarray(matrix[unique_rows], dtype=np.float32).T
+    return np.take_along_axis(exact, positions.reshape(candidates.shape), axis=1)
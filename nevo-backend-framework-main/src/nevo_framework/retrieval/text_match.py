@@ -0,0 +1,75 @@
+"""
+Matching a sentence to one of a few candidate texts by word overlap, in the process.
+
+Used to choose what to show for a spoken sentence among a handful of retrieved snippets, where a model round trip
+per sentence takes about as long as speaking the sentence. Candidates and sentence are compared as TF-IDF vectors
+(cosine similarity). The IDF is computed over the candidates themselves, so words all of them share (e.g. "driver",
+"vehicle") carry little weight and the words that tell them apart carry most. Matching a sentence against a few
+candidates takes well below a millisecond.
+
+The caller decides by the score of the best candidate and its margin over the second best whether the match is
+clear, or whether to ask a model instead.
+"""
+
+import math
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+from nevo_framework.retrieval.bm25 import tokenize
+
+
+@dataclass
+class Match:
+    # index of the best candidate, None if no candidate shares a word with the sentence
+    index: int | None
+    # cosine similarity of the best candidate
+    score: float
+    # score of the best candidate divided by the score of the second best (inf if no other candidate scores)
+    margin: float
+
+    def is_clear(self, min_score: float, min_margin: float) -> bool:
+        return self.index is not None and self.score >= min_score and self.margin >= min_margin
+
+
+class TextMatcher:
+    """
+    TF-IDF matcher over candidate texts, see the module docstring.
+
+    Args:
+        texts: The candidate texts, e.g. question and response of each retrieved snippet.
+    """
+
+    def __init__(self, texts: list[str]):
+        counts = [Counter(tokenize(text)) for text in texts]
+        document_frequencies = Counter(token for count in counts for token in count)
+        self.vocabulary = {token: column for column, token in enumerate(document_frequencies)}
+        self.idf = np.array(
+            [math.log((len(texts) + 1) / document_frequencies[token]) for token in self.vocabulary], dtype=np.float32
+        )
+        self.vectors = np.stack([self._vector(count) for count in counts]) if texts else np.zeros((0, 0))
+
+    def _vector(self, count: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token, frequency in count.items():
+            column = self.vocabulary.get(token)
+            if column is not None:
+                vector[column] = (1 + math.log(frequency)) * self.idf[column]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def scores(self, sentence: str) -> np.ndarray:
+        """Cosine similarity of the sentence with each candidate; words no candidate contains are ignored."""
+        if not len(self.vectors):
+            return np.zeros(0, dtype=np.float32)
+        return self.vectors @ self._vector(Counter(tokenize(sentence)))
+
+    def match(self, sentence: str) -> Match:
+        scores = self.scores(sentence)
+        if not len(scores) or scores.max() <= 0:
+            return Match(index=None, score=0.0, margin=0.0)
+        order = np.argsort(-scores)
+        best = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(scores) > 1 else 0.0
+        return Match(index=int(order[0]), score=best, margin=best / second if second > 0 else math.inf)
@@ -222,7 +222,7 @@ class AudioChatAgentGPT4VoiceWithHistory:
                 if self.pyaudio_stream:
                     self.pyaudio_stream.write(audio_chunk)
                 if self.audio_output_queue:
-                    self.audio_output_queue.put_nowait(audio_chunk)
+                    await self.audio_output_queue.put(audio_chunk)
 
         assert audio_id is not None, "No audio ID found in response stream."
 
@@ -306,7 +306,7 @@ class AudioChatAgentGPT4Voice:
                 if self.pyaudio_stream:
                     self.pyaudio_stream.write(audio_chunk)
                 if self.audio_output_queue:
-                    self.audio_output_queue.put_nowait(audio_chunk)
+                    await self.audio_output_queue.put(audio_chunk)
 
         assert audio_id is not None, "No audio ID found in response stream."
 
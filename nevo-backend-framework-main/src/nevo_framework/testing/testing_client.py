@@ -19,6 +19,7 @@ from websockets.exceptions import InvalidStatus
 import nevo_framework.api.server_messages as server_messages
 import nevo_framework.testing.test_helpers as test_helpers
 from nevo_framework.config.audio_config import AudioConfig
+from nevo_framework.llm import http_pool
 from nevo_framework.testing.testing_bot import TestingAudioAgent
 
 
@@ -36,6 +37,7 @@ AUDIO_UPLOAD_TEST_FILE = "src/testing/audio_input/looking-for-a-car.wav"
 
 async_openai_client = openai.AsyncOpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=http_pool.shared_async_http_client(),
 )
 
 
@@ -77,9 +79,7 @@ class Client:
         self.pyaudio = None
         self.pyaudio_stream = None
 
-        self.async_openai_client = openai.AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-        )
+        self.async_openai_client = async_openai_client
 
         if audio_output_path is not None:
             self.audio_output_path = audio_output_path